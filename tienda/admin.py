@@ -1,38 +1,140 @@
 from django.contrib import admin
-from .models import Libro, Pedido, Carrito, Perfil, ItemPedido, Autor, Coleccion, Resena
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+from .models import Libro, Pedido, Carrito, Perfil, ItemPedido, Autor, Coleccion, Resena, Proveedor
 
 
+# Por debajo de esto se cuenta exacto: con pocas filas COUNT(*) es barato y la
+# estimación de la base puede estar desactualizada
+UMBRAL_CONTEO_ESTIMADO = 10_000
+
+
+# ==========================================
+# CONTEO ESTIMADO PARA TABLAS GRANDES
+# ==========================================
+
+def filas_estimadas(modelo, alias):
+    # Número aproximado de filas sin recorrer la tabla, o None si la base no lo sabe
+    conexion = connections[alias]
+    tabla = modelo._meta.db_table
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'postgresql':
+            # Lo mantiene ANALYZE / autovacuum; -1 si la tabla nunca se analizó
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [tabla])
+            fila = cursor.fetchone()
+            return fila[0] if fila and fila[0] >= 0 else None
+        if conexion.vendor == 'mysql':
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [tabla],
+            )
+            fila = cursor.fetchone()
+            return fila[0] if fila else None
+    # SQLite: el mayor id sale del índice de la clave primaria (cuenta de más si hubo borrados)
+    return modelo._default_manager.using(alias).aggregate(maximo=Max('pk'))['maximo'] or 0
+
+
+class PaginadorEstimado(Paginator):
+    @cached_property
+    def count(self):
+        consulta = self.object_list
+        # Solo la lista completa (sin filtros ni búsqueda) usa el estimado
+        if not consulta.query.where:
+            estimado = filas_estimadas(consulta.model, consulta.db)
+            if estimado is not None and estimado >= UMBRAL_CONTEO_ESTIMADO:
+                return estimado
+        return super().count
+
+
+class AdminTablaGrande(admin.ModelAdmin):
+    paginator = PaginadorEstimado
+    # Sin el segundo COUNT(*) de la tabla completa al filtrar ("3 de 1.000.000")
+    show_full_result_count = False
+
+
+# ==========================================
+# PEDIDOS
+# ==========================================
+
 class ItemPedidoInline(admin.TabularInline):
     model = ItemPedido
     extra = 0
+    autocomplete_fields = ('libro',)
+
+    def get_queryset(self, request):
+        # ItemPedido.__str__ muestra el título del libro
+        return super().get_queryset(request).select_related('libro')
 
 @admin.register(Pedido)
-class PedidoAdmin(admin.ModelAdmin):
+class PedidoAdmin(AdminTablaGrande):
     list_display = ('id', 'usuario', 'fecha_pedido', 'total_final', 'estado')
     list_filter = ('estado', 'fecha_pedido')
+    list_select_related = ('usuario',)
+    search_fields = ('=usuario__username',)
+    raw_id_fields = ('usuario',)
+    date_hierarchy = 'fecha_pedido'
+    # Mismo orden que el índice pedido_orden_fecha
+    ordering = ('-fecha_pedido', '-id')
     inlines = [ItemPedidoInline]
 
+
+# ==========================================
+# CATÁLOGO
+# ==========================================
+
 @admin.register(Libro)
-class LibroAdmin(admin.ModelAdmin):
-    
-    list_display = ('titulo', 'precio', 'stock', 'coleccion') 
-    search_fields = ('titulo', 'autor__nombre') 
-    list_filter = ('coleccion',) 
+class LibroAdmin(AdminTablaGrande):
 
-@admin.register(Perfil)
-class PerfilAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'telefono', 'direccion')
+    list_display = ('titulo', 'precio', 'stock', 'coleccion')
+    search_fields = ('titulo', 'autor__nombre')
+    list_filter = ('coleccion', 'es_recomendado')
+    list_select_related = ('coleccion',)
+    autocomplete_fields = ('autor', 'coleccion', 'proveedor')
 
 @admin.register(Autor)
-class AutorAdmin(admin.ModelAdmin):
+class AutorAdmin(AdminTablaGrande):
     list_display = ('nombre',)
+    search_fields = ('nombre',)
 
 @admin.register(Coleccion)
 class ColeccionAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'icono')
+    search_fields = ('nombre',)
+
+@admin.register(Proveedor)
+class ProveedorAdmin(admin.ModelAdmin):
+    list_display = ('empresa', 'contacto', 'telefono', 'email')
+    search_fields = ('empresa', 'contacto', 'email')
 
 @admin.register(Resena)
-class ResenaAdmin(admin.ModelAdmin):
+class ResenaAdmin(AdminTablaGrande):
     list_display = ('libro', 'usuario', 'calificacion', 'fecha')
+    list_filter = ('calificacion',)
+    list_select_related = ('libro', 'usuario')
+    search_fields = ('=usuario__username',)
+    raw_id_fields = ('usuario',)
+    autocomplete_fields = ('libro',)
+    date_hierarchy = 'fecha'
+    # Mismo orden que el índice resena_orden_fecha
+    ordering = ('-fecha', '-id')
+
+
+# ==========================================
+# CLIENTES
+# ==========================================
+
+@admin.register(Perfil)
+class PerfilAdmin(AdminTablaGrande):
+    list_display = ('usuario', 'telefono', 'direccion')
+    list_select_related = ('usuario',)
+    search_fields = ('=usuario__username',)
+    raw_id_fields = ('usuario',)
 
-admin.site.register(Carrito)
\ No newline at end of file
+@admin.register(Carrito)
+class CarritoAdmin(AdminTablaGrande):
+    list_display = ('id', 'usuario', 'creado_en')
+    list_select_related = ('usuario',)
+    search_fields = ('=usuario__username',)
+    raw_id_fields = ('usuario',)
@@ -0,0 +1,210 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.db.models.fields.files import FieldFile
+
+from .consultas import ORDEN_RESENAS, ORDENES_CATALOGO, entero_id, paginar_por_cursor
+from .models import Autor, Coleccion, Libro, Resena
+
+
+VERSION_API = 'v1'
+TAMANO_PAGINA_API = 50
+TAMANO_MAXIMO_API = 200
+
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí'}
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+# ==========================================
+# RECURSOS
+# ==========================================
+# Cada recurso: modelo, campos públicos (nombre -> ruta en el modelo), filtros
+# de ?parametro=valor y órdenes para la paginación por cursor.
+
+def _filtro_si_no(campo):
+    def filtrar(queryset, valor):
+        return queryset.filter(**{campo: valor.casefold() in VALORES_VERDADEROS})
+    return filtrar
+
+
+def _filtro_id(campo):
+    def filtrar(queryset, valor):
+        numero = entero_id(valor)
+        if numero is None:
+            raise ParametroInvalido(f"'{valor}' no es un id válido.")
+        return queryset.filter(**{campo: numero})
+    return filtrar
+
+
+def _filtro_stock(queryset, valor):
+    if valor == 'disponible':
+        return queryset.filter(stock__gt=0)
+    if valor == 'agotado':
+        return queryset.filter(stock=0)
+    raise ParametroInvalido("stock debe ser 'disponible' o 'agotado'.")
+
+
+RECURSOS_API = {
+    'libros': {
+        'modelo': Libro,
+        'campos': {
+            'id': 'id',
+            'titulo': 'titulo',
+            'autor_id': 'autor_id',
+            'autor': 'autor__nombre',
+            'coleccion_id': 'coleccion_id',
+            'coleccion': 'coleccion__nombre',
+            'precio': 'precio',
+            'stock': 'stock',
+            'descripcion': 'descripcion',
+            'imagen': 'imagen',
+            'es_recomendado': 'es_recomendado',
+            'promedio_calificacion': 'promedio_calificacion',
+            'num_resenas': 'num_resenas',
+            'actualizado': 'actualizado',
+        },
+        'filtros': {
+            'coleccion': _filtro_id('coleccion_id'),
+            'autor': _filtro_id('autor_id'),
+            'recomendado': _filtro_si_no('es_recomendado'),
+            'stock': _filtro_stock,
+        },
+        'ordenes': {'id': ('id',), **ORDENES_CATALOGO},
+    },
+    'autores': {
+        'modelo': Autor,
+        'campos': {
+            'id': 'id',
+            'nombre': 'nombre',
+            'biografia': 'biografia',
+            'foto': 'foto',
+            'actualizado': 'actualizado',
+        },
+        'filtros': {},
+        'ordenes': {'id': ('id',)},
+    },
+    'colecciones': {
+        'modelo': Coleccion,
+        'campos': {
+            'id': 'id',
+            'nombre': 'nombre',
+            'descripcion': 'descripcion',
+            'icono': 'icono',
+            'color_fondo': 'color_fondo',
+            'actualizado': 'actualizado',
+        },
+        'filtros': {},
+        'ordenes': {'id': ('id',)},
+    },
+    'resenas': {
+        'modelo': Resena,
+        'campos': {
+            'id': 'id',
+            'libro_id': 'libro_id',
+            'usuario': 'usuario__username',
+            'calificacion': 'calificacion',
+            'comentario': 'comentario',
+            'fecha': 'fecha',
+            'actualizado': 'actualizado',
+        },
+        'filtros': {
+            'libro': _filtro_id('libro_id'),
+            'autor': _filtro_id('libro__autor_id'),
+            'coleccion': _filtro_id('libro__coleccion_id'),
+        },
+        'ordenes': {'fecha': ORDEN_RESENAS},
+    },
+}
+
+
+# ==========================================
+# CONSULTA A PARTIR DE LA QUERY STRING
+# ==========================================
+
+def _campos_pedidos(recurso, parametros):
+    # ?campos=titulo,precio -> solo esas columnas (y las que necesita el cursor)
+    campos = recurso['campos']
+    pedidos = [campo for campo in parametros.get('campos', '').split(',') if campo]
+    desconocidos = [campo for campo in pedidos if campo not in campos]
+    if desconocidos:
+        raise ParametroInvalido(f"Campos desconocidos: {', '.join(desconocidos)}.")
+    return pedidos or list(campos)
+
+
+def _orden(recurso, parametros):
+    ordenes = recurso['ordenes']
+    nombre = parametros.get('orden') or next(iter(ordenes))
+    if nombre not in ordenes:
+        raise ParametroInvalido(f"Orden desconocido: {nombre}.")
+    return ordenes[nombre]
+
+
+def consulta_api(recurso, parametros):
+    # Devuelve (queryset filtrado, campos públicos a mostrar, orden del cursor)
+    queryset = recurso['modelo'].objects.all()
+    for nombre, filtrar in recurso['filtros'].items():
+        if parametros.get(nombre):
+            queryset = filtrar(queryset, parametros[nombre])
+
+    campos = _campos_pedidos(recurso, parametros)
+    orden = _orden(recurso, parametros)
+    rutas = {recurso['campos'][campo] for campo in campos} | {campo.lstrip('-') for campo in orden}
+    rutas.add('actualizado')  # para el ETag
+    # Los campos de otra tabla (autor__nombre) llegan en el mismo JOIN, solo si se piden
+    relaciones = {ruta.split('__')[0] for ruta in rutas if '__' in ruta}
+    return queryset.select_related(*relaciones).only(*rutas), campos, orden
+
+
+def tamano_pagina(parametros):
+    valor = parametros.get('limite') or str(TAMANO_PAGINA_API)
+    if not valor.isdigit() or not 1 <= int(valor) <= TAMANO_MAXIMO_API:
+        raise ParametroInvalido(f"limite debe estar entre 1 y {TAMANO_MAXIMO_API}.")
+    return int(valor)
+
+
+def pagina_api(queryset, orden, parametros):
+    return paginar_por_cursor(
+        queryset, orden, despues=parametros.get('despues'), tamano=tamano_pagina(parametros),
+    )
+
+
+# ==========================================
+# SERIALIZACIÓN
+# ==========================================
+
+def _valor(objeto, ruta):
+    for parte in ruta.split('__'):
+        objeto = getattr(objeto, parte)
+    if isinstance(objeto, FieldFile):
+        # ImageField: la URL, o None si no hay archivo
+        return objeto.url if objeto else None
+    return objeto
+
+
+def serializar(recurso, objeto, campos):
+    rutas = recurso['campos']
+    return {campo: _valor(objeto, rutas[campo]) for campo in campos}
+
+
+# ==========================================
+# VALIDACIÓN CONDICIONAL (ETAG / LAST-MODIFIED)
+# ==========================================
+
+def _etag(*partes):
+    # ETag fuerte: cambia con cualquier parámetro de la petición o con los datos
+    return '"' + hashlib.sha1('|'.join(str(parte) for parte in partes).encode()).hexdigest() + '"'
+
+
+def version_listado(nombre, queryset, parametros):
+    # Una sola consulta agregada: si no cambió ninguna fila (ni se borró ninguna, por
+    # eso el conteo), el ETag es el mismo y se responde 304 sin leer la página.
+    datos = queryset.order_by().aggregate(total=Count('id'), ultimo=Max('actualizado'))
+    etag = _etag(VERSION_API, nombre, sorted(parametros.lists()), datos['total'], datos['ultimo'])
+    return etag, datos['ultimo']
+
+
+def version_objeto(nombre, objeto, campos):
+    return _etag(VERSION_API, nombre, objeto.id, campos, objeto.actualizado), objeto.actualizado
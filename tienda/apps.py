@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TiendaConfig(AppConfig):
     name = 'tienda'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,184 @@
+import math
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Autor, ItemCarrito, Libro, Pedido, Resena
+from .servicios import carrito_de
+
+
+# Libros que se ponen en el carrito del cliente de prueba
+LIBROS_EN_CARRITO = 5
+
+
+# ==========================================
+# ESCENARIOS
+# ==========================================
+
+class Escenario:
+    def __init__(self, nombre, url, usuario=None, metodo='get', datos=None, preparar=None):
+        self.nombre = nombre
+        self.url = url
+        self.usuario = usuario          # None (anónimo), 'cliente' o 'staff'
+        self.metodo = metodo
+        self.datos = datos or {}
+        self.preparar = preparar        # se llama antes de cada petición, fuera de la medición
+
+
+def preparar_contexto():
+    # Usuarios y carrito de prueba. Se crea dentro de la transacción que el
+    # benchmark deshace al terminar, así que la base queda como estaba.
+    cliente = User.objects.create_user('benchmark_cliente', password='benchmark')
+    staff = User.objects.create_user('benchmark_staff', password='benchmark', is_staff=True)
+
+    libro = Libro.objects.order_by('-num_resenas', 'id').first()
+    if libro is None:
+        raise ValueError("No hay libros; ejecuta primero generar_datos.")
+
+    en_carrito = list(Libro.objects.order_by('id').values_list('id', flat=True)[:LIBROS_EN_CARRITO])
+    Libro.objects.filter(id__in=en_carrito).update(stock=F('stock') + 1_000_000)
+    carrito = carrito_de(cliente, crear=True)
+
+    def llenar_carrito():
+        if not carrito.items.exists():
+            ItemCarrito.objects.bulk_create([ItemCarrito(carrito=carrito, libro_id=libro_id) for libro_id in en_carrito])
+
+    llenar_carrito()
+    palabra = libro.titulo.split()[0]
+    return {
+        'usuarios': {'cliente': cliente, 'staff': staff},
+        'libro': libro,
+        'autor_id': libro.autor_id,
+        'palabra': palabra,
+        'llenar_carrito': llenar_carrito,
+    }
+
+
+def escenarios(contexto):
+    libro = contexto['libro']
+    return [
+        Escenario('index', reverse('index')),
+        Escenario('catalogo', reverse('catalogo')),
+        Escenario('catalogo_calificacion', reverse('catalogo') + '?orden=calificacion'),
+        Escenario('buscar', reverse('buscar') + f"?q={contexto['palabra']}"),
+        Escenario('detalle_libro', reverse('detalle_libro', args=[libro.id])),
+        Escenario('resenas_libro', reverse('resenas_libro', args=[libro.id])),
+        Escenario('lista_autores', reverse('lista_autores')),
+        Escenario('detalle_autor', reverse('detalle_autor', args=[contexto['autor_id']])),
+        Escenario('resenas', reverse('resenas')),
+        Escenario('ver_carrito', reverse('ver_carrito'), usuario='cliente'),
+        Escenario('procesar_pedido', reverse('procesar_pedido'), usuario='cliente'),
+        Escenario(
+            'confirmar_pedido', reverse('procesar_pedido'), usuario='cliente', metodo='post',
+            datos={'direccion': 'Calle Falsa 123', 'metodo_pago': 'tarjeta'},
+            preparar=contexto['llenar_carrito'],
+        ),
+        Escenario('dashboard_admin', reverse('dashboard_admin'), usuario='staff'),
+        Escenario('panel_pedidos', reverse('panel_dashboard', args=['pedidos']), usuario='staff'),
+        Escenario('panel_resenas', reverse('panel_dashboard', args=['resenas']), usuario='staff'),
+    ]
+
+
+def volumenes():
+    return {
+        'libros': Libro.objects.count(),
+        'autores': Autor.objects.count(),
+        'resenas': Resena.objects.count(),
+        'pedidos': Pedido.objects.count(),
+        'usuarios': User.objects.count(),
+    }
+
+
+# ==========================================
+# MEDICIÓN
+# ==========================================
+
+def _percentil(valores, percentil):
+    # Rango más cercano: el valor que deja por debajo al `percentil`% de las muestras
+    ordenados = sorted(valores)
+    posicion = max(math.ceil(percentil / 100 * len(ordenados)) - 1, 0)
+    return ordenados[posicion]
+
+
+def _peticion(cliente, escenario):
+    if escenario.preparar:
+        escenario.preparar()
+    respuesta = getattr(cliente, escenario.metodo)(escenario.url, escenario.datos)
+    # Las respuestas en streaming se consumen completas: es parte del costo
+    if respuesta.streaming:
+        b''.join(respuesta.streaming_content)
+    return respuesta
+
+
+def medir(cliente, escenario, repeticiones, calentamiento=1):
+    for _ in range(calentamiento):
+        _peticion(cliente, escenario)
+
+    tiempos, consultas, estado = [], [], None
+    for _ in range(repeticiones):
+        if escenario.preparar:
+            escenario.preparar()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = getattr(cliente, escenario.metodo)(escenario.url, escenario.datos)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(len(capturadas))
+        estado = respuesta.status_code
+
+    # La memoria se mide aparte: tracemalloc vuelve más lenta cada petición
+    tracemalloc.start()
+    try:
+        _peticion(cliente, escenario)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'url': escenario.url,
+        'metodo': escenario.metodo.upper(),
+        'estado': estado,
+        'p50_ms': round(_percentil(tiempos, 50), 2),
+        'p95_ms': round(_percentil(tiempos, 95), 2),
+        'consultas': max(consultas),
+        'memoria_pico_kb': round(pico / 1024, 1),
+    }
+
+
+def ejecutar(repeticiones, solo=None, al_medir=None):
+    contexto = preparar_contexto()
+    clientes = {None: Client()}
+    for tipo, usuario in contexto['usuarios'].items():
+        clientes[tipo] = Client()
+        clientes[tipo].force_login(usuario)
+
+    resultados = {}
+    for escenario in escenarios(contexto):
+        if solo and escenario.nombre not in solo:
+            continue
+        resultados[escenario.nombre] = medir(clientes[escenario.usuario], escenario, repeticiones)
+        if al_medir:
+            al_medir(escenario.nombre, resultados[escenario.nombre])
+    return resultados
+
+
+def comparar(resultados, base, tolerancia):
+    # Regresión: más consultas que la base, o tiempo/memoria por encima de la tolerancia
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior:
+            continue
+        if actual['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: consultas {anterior['consultas']} -> {actual['consultas']}")
+        for metrica in ('p50_ms', 'p95_ms', 'memoria_pico_kb'):
+            if actual[metrica] > anterior[metrica] * (1 + tolerancia):
+                regresiones.append(f"{nombre}: {metrica} {anterior[metrica]} -> {actual[metrica]}")
+    return regresiones
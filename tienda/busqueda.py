@@ -0,0 +1,115 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+
+TABLA_FTS = 'tienda_libro_fts'
+
+# Pesos BM25 por columna: titulo, descripcion, autor, coleccion
+PESOS_BM25 = (10.0, 1.0, 5.0, 2.0)
+
+# ?pagina= más allá de esto se recorta: un OFFSET enorme desborda el parámetro SQL
+# y de todos modos obligaría a recorrer todos los resultados anteriores
+PAGINA_MAXIMA_BUSQUEDA = 1000
+
+SQL_CREAR = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5("
+    "titulo, descripcion, autor, coleccion, tokenize='unicode61 remove_diacritics 2')"
+)
+
+SQL_BORRAR_TABLA = f"DROP TABLE IF EXISTS {TABLA_FTS}"
+
+# El rowid del índice es el id del libro
+SQL_INDEXAR = f"""
+    INSERT OR REPLACE INTO {TABLA_FTS} (rowid, titulo, descripcion, autor, coleccion)
+    SELECT l.id, l.titulo, l.descripcion, a.nombre, c.nombre
+    FROM tienda_libro l
+    JOIN tienda_autor a ON a.id = l.autor_id
+    JOIN tienda_coleccion c ON c.id = l.coleccion_id
+"""
+
+
+def disponible():
+    return connection.vendor == 'sqlite'
+
+
+def _ejecutar(sql, parametros=()):
+    if not disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+
+
+# ==========================================
+# MANTENIMIENTO DEL ÍNDICE
+# ==========================================
+
+def indexar_libro(libro_id):
+    _ejecutar(SQL_INDEXAR + " WHERE l.id = %s", [libro_id])
+
+
+def indexar_libros(libro_ids):
+    # Para cargas masivas (bulk_create/bulk_update no disparan señales)
+    libro_ids = list(libro_ids)
+    if libro_ids:
+        marcadores = ', '.join(['%s'] * len(libro_ids))
+        _ejecutar(SQL_INDEXAR + f" WHERE l.id IN ({marcadores})", libro_ids)
+
+
+def indexar_autor(autor_id):
+    _ejecutar(SQL_INDEXAR + " WHERE l.autor_id = %s", [autor_id])
+
+
+def indexar_coleccion(coleccion_id):
+    _ejecutar(SQL_INDEXAR + " WHERE l.coleccion_id = %s", [coleccion_id])
+
+
+def quitar_libro(libro_id):
+    _ejecutar(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [libro_id])
+
+
+def reconstruir_indice():
+    _ejecutar(SQL_BORRAR_TABLA)
+    _ejecutar(SQL_CREAR)
+    _ejecutar(SQL_INDEXAR)
+    _ejecutar(f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}) VALUES ('optimize')")
+
+
+# ==========================================
+# CONSULTA
+# ==========================================
+
+def _consulta_fts(texto):
+    # Cada palabra se cita (para que el usuario no pueda inyectar sintaxis FTS)
+    # y se busca como prefijo: "garc" encuentra "García".
+    palabras = re.findall(r'\w+', texto)
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar_ids(texto, limite, desplazamiento=0):
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s "
+            f"ORDER BY bm25({TABLA_FTS}, {', '.join(str(peso) for peso in PESOS_BM25)}) "
+            "LIMIT %s OFFSET %s",
+            [consulta, limite, desplazamiento],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def buscar_libros(texto, queryset, limite, desplazamiento=0):
+    # Devuelve los libros de `queryset` ordenados por relevancia (BM25)
+    if not disponible():
+        # Sin FTS5 (otro motor de base de datos) se recurre a LIKE
+        filtro = Q(titulo__icontains=texto) | Q(autor__nombre__icontains=texto)
+        return list(queryset.filter(filtro).order_by('titulo', 'id')[desplazamiento:desplazamiento + limite])
+
+    ids = buscar_ids(texto, limite, desplazamiento)
+    if not ids:
+        return []
+    por_id = queryset.in_bulk(ids)
+    return [por_id[libro_id] for libro_id in ids if libro_id in por_id]
@@ -0,0 +1,164 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+
+# Cuánto vive una página completa en caché (las etiquetas la invalidan antes si cambia algo)
+SEGUNDOS_CACHE_PAGINA = 600
+
+# Todas las páginas llevan el menú de colecciones de base.html
+ETIQUETAS_COMUNES = ('colecciones',)
+
+# Cabeceras de la vista que no se guardan con la página
+CABECERAS_NO_CACHEABLES = {'set-cookie', 'x-cache'}
+
+
+# ==========================================
+# VERSIONES POR ETIQUETA
+# ==========================================
+# Cada etiqueta ("libro:5", "libros", "autor:3"...) tiene un número de versión en la
+# caché. Lo que se guarda en caché recuerda las versiones de sus etiquetas y deja
+# de servirse en cuanto alguna cambia. Invalidar es solo incrementar la versión.
+
+def _clave_etiqueta(etiqueta):
+    return f'etiqueta:{etiqueta}'
+
+
+def _version_nueva():
+    # Si la caché perdió la clave no se vuelve a 1: una entrada vieja guardada con
+    # versión 1 volvería a parecer válida.
+    return time.time_ns()
+
+
+def versiones(etiquetas):
+    claves = {_clave_etiqueta(etiqueta): etiqueta for etiqueta in etiquetas}
+    encontradas = cache.get_many(claves)
+    faltantes = {clave: _version_nueva() for clave in claves if clave not in encontradas}
+    if faltantes:
+        cache.set_many(faltantes, timeout=None)
+        encontradas.update(faltantes)
+    return {claves[clave]: version for clave, version in encontradas.items()}
+
+
+def clave_version(etiquetas):
+    # Cadena corta que cambia si cambia cualquiera de las etiquetas; sirve como
+    # argumento vary_on de {% cache %}
+    actuales = versiones(etiquetas)
+    texto = '|'.join(f'{etiqueta}={actuales[etiqueta]}' for etiqueta in sorted(actuales))
+    return hashlib.md5(texto.encode()).hexdigest()
+
+
+def invalidar(*etiquetas):
+    for etiqueta in etiquetas:
+        try:
+            cache.incr(_clave_etiqueta(etiqueta))
+        except ValueError:
+            cache.set(_clave_etiqueta(etiqueta), _version_nueva(), timeout=None)
+
+
+def etiquetas_listados(coleccion_id, autor_id, es_recomendado):
+    # Listados en los que un libro entra o sale según estos campos: los de su colección,
+    # su autor y "recomendados". El contenido de cada tarjeta va aparte, con libro:<id>.
+    etiquetas = [f'coleccion:{coleccion_id}', f'autor:{autor_id}']
+    if es_recomendado:
+        etiquetas.append('recomendados')
+    return etiquetas
+
+
+def invalidar_al_confirmar(*etiquetas):
+    # Dentro de una transacción se espera al COMMIT; si no, otra petición podría
+    # volver a guardar en caché los datos viejos antes de que se escriban los nuevos.
+    transaction.on_commit(lambda: invalidar(*etiquetas))
+
+
+# ==========================================
+# CACHÉ DE PÁGINA COMPLETA (VISITANTES ANÓNIMOS)
+# ==========================================
+
+def etiquetar(request, *etiquetas):
+    # Una vista agrega las etiquetas que solo conoce después de consultar
+    # (p. ej. el autor de un libro)
+    request.etiquetas_cache = getattr(request, 'etiquetas_cache', set()) | set(etiquetas)
+
+
+def etiquetas_de_libros(request, etiquetas, cargar_ids):
+    # Etiquetas de una grilla: las del filtro (`etiquetas`: cambian si un libro entra o
+    # sale) más libro:<id> de cada libro mostrado, así editar un libro solo invalida
+    # las grillas que lo muestran. Los ids se recuerdan por versión de las primeras:
+    # una grilla en caché (p. ej. {% cache %} de un usuario con sesión) no toca la base.
+    actuales = versiones(etiquetas)
+    texto = f'{request.get_full_path()}|{sorted(actuales.items())}'
+    clave = 'ids_grilla:' + hashlib.md5(texto.encode()).hexdigest()
+    ids = cache.get(clave)
+    if ids is None:
+        ids = list(cargar_ids())
+        cache.set(clave, ids, SEGUNDOS_CACHE_PAGINA)
+    return [*etiquetas, *(f'libro:{libro_id}' for libro_id in ids)]
+
+
+def _hay_mensajes(request):
+    almacen = get_messages(request)
+    hay = bool(list(almacen))
+    almacen.used = False  # no consumirlos: se mostrarán en la página
+    return hay
+
+
+def _se_puede_cachear(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not _hay_mensajes(request)
+    )
+
+
+def _clave_pagina(request):
+    # La clave incluye la ruta y la query string ordenada (filtros, cursor, búsqueda)
+    parametros = sorted(request.GET.lists())
+    texto = f'{request.path}?{parametros}'
+    return 'pagina:' + hashlib.md5(texto.encode()).hexdigest()
+
+
+def cache_publica(*etiquetas_fijas):
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not _se_puede_cachear(request):
+                return vista(request, *args, **kwargs)
+
+            clave = _clave_pagina(request)
+            guardada = cache.get(clave)
+            if guardada is not None:
+                versiones_guardadas, contenido, cabeceras = guardada
+                if versiones(versiones_guardadas) == versiones_guardadas:
+                    respuesta = HttpResponse(contenido)
+                    for nombre, valor in cabeceras:
+                        respuesta[nombre] = valor
+                    respuesta['X-Cache'] = 'HIT'
+                    return respuesta
+
+            etiquetas = set(etiquetas_fijas) | set(ETIQUETAS_COMUNES)
+            # Las versiones se leen antes de consultar la base: si algo cambia mientras
+            # se genera la página, se guarda con la versión vieja y no se sirve.
+            versiones_actuales = versiones(etiquetas)
+            request.etiquetas_cache = set()
+            respuesta = vista(request, *args, **kwargs)
+
+            if respuesta.status_code == 200 and not respuesta.streaming:
+                if request.etiquetas_cache - etiquetas:
+                    versiones_actuales.update(versiones(request.etiquetas_cache - etiquetas))
+                # Todas las cabeceras de la vista (Content-Type, Vary, Content-Language...)
+                # menos las propias de cada visitante
+                cabeceras = [
+                    (nombre, valor) for nombre, valor in respuesta.items()
+                    if nombre.lower() not in CABECERAS_NO_CACHEABLES
+                ]
+                cache.set(clave, (versiones_actuales, respuesta.content, cabeceras), SEGUNDOS_CACHE_PAGINA)
+                respuesta['X-Cache'] = 'MISS'
+            return respuesta
+        return envoltura
+    return decorador
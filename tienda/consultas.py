@@ -0,0 +1,365 @@
+import base64
+import datetime
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Libro, Autor, Coleccion, Pedido, Proveedor, Resena, VentaDiaria, VentaDiariaLibro
+
+
+TAMANO_PAGINA_CATALOGO = 24
+# Mayor id que cabe en la columna (BigAutoField); uno más grande desborda el parámetro
+ID_MAXIMO = 2**63 - 1
+ORDEN_CATALOGO = ('id',)
+
+# ?orden=... -> orden del cursor (usa el índice libro_orden_calificacion)
+ORDENES_CATALOGO = {
+    'calificacion': ('-promedio_calificacion', '-num_resenas', 'id'),
+}
+
+# Solo las columnas que usan las tarjetas del catálogo
+CAMPOS_TARJETA = (
+    'id', 'titulo', 'precio', 'stock', 'imagen', 'es_recomendado',
+    'promedio_calificacion', 'num_resenas',
+    'autor__nombre', 'coleccion__nombre',
+)
+
+
+def entero_id(valor):
+    # '12' -> 12; None si no puede ser un id (texto, vacío, '²', fuera de rango)
+    valor = (valor or '').strip()
+    if not (valor.isascii() and valor.isdigit()) or int(valor) > ID_MAXIMO:
+        return None
+    return int(valor)
+
+
+def libros_catalogo(coleccion_id=None, recomendados=False):
+    libros = Libro.objects.select_related('autor', 'coleccion').only(*CAMPOS_TARJETA)
+    if coleccion_id:
+        libros = libros.filter(coleccion_id=coleccion_id)
+    if recomendados:
+        libros = libros.filter(es_recomendado=True)
+    return libros
+
+
+# ==========================================
+# TAMBIÉN COMPRARON (LibroRelacionado)
+# ==========================================
+
+RELACIONADOS_A_MOSTRAR = 4
+
+
+def libros_relacionados(libro_id, limite=RELACIONADOS_A_MOSTRAR):
+    # Una consulta: el JOIN con LibroRelacionado filtra por su índice (libro, posicion)
+    return libros_catalogo().filter(relacionado_en__libro_id=libro_id).order_by('relacionado_en__posicion')[:limite]
+
+
+def relacionados_de_carrito(libro_ids, limite=RELACIONADOS_A_MOSTRAR):
+    # Los más comprados junto con todo el carrito, sin repetir lo que ya tiene
+    return (
+        libros_catalogo().filter(relacionado_en__libro_id__in=libro_ids).exclude(id__in=libro_ids)
+        .annotate(veces_juntos=Sum('relacionado_en__veces')).order_by('-veces_juntos', 'id')[:limite]
+    )
+
+
+# ==========================================
+# RESEÑAS PÚBLICAS
+# ==========================================
+
+ORDEN_RESENAS = ('-fecha', '-id')
+TAMANO_PAGINA_RESENAS = 10
+
+
+def resenas_publicas(libro_id=None, autor_id=None, coleccion_id=None):
+    # Usuario y libro llegan en el mismo JOIN; solo las columnas que se muestran
+    resenas = Resena.objects.select_related('usuario', 'libro').only(
+        'id', 'fecha', 'calificacion', 'comentario', 'usuario__username',
+        'libro__id', 'libro__titulo', 'libro__imagen',
+    )
+    if libro_id:
+        resenas = resenas.filter(libro_id=libro_id)
+    if autor_id:
+        resenas = resenas.filter(libro__autor_id=autor_id)
+    if coleccion_id:
+        resenas = resenas.filter(libro__coleccion_id=coleccion_id)
+    return resenas
+
+
+# ==========================================
+# PANELES DEL DASHBOARD ADMIN
+# ==========================================
+
+def pedidos_panel(filtros):
+    return Pedido.objects.select_related('usuario').only(
+        'id', 'fecha_pedido', 'total_final', 'estado', 'usuario__username',
+    )
+
+
+def usuarios_panel(filtros):
+    return User.objects.filter(is_superuser=False).only('id', 'username', 'email', 'is_staff', 'date_joined')
+
+
+def resenas_panel(filtros):
+    resenas = Resena.objects.select_related('usuario', 'libro__autor', 'libro__coleccion').only(
+        'id', 'fecha', 'calificacion', 'comentario', 'usuario__username',
+        'libro__id', 'libro__titulo', 'libro__autor__nombre', 'libro__coleccion__nombre',
+    )
+    # Ids no numéricos se ignoran, como en el feed público
+    campos = {'filtro_libro': 'libro_id', 'filtro_autor': 'libro__autor_id', 'filtro_coleccion': 'libro__coleccion_id'}
+    for parametro, campo in campos.items():
+        valor = entero_id(filtros.get(parametro))
+        if valor is not None:
+            resenas = resenas.filter(**{campo: valor})
+    return resenas
+
+
+def inventario_panel(filtros):
+    return Libro.objects.select_related('autor').only('id', 'titulo', 'stock', 'autor__nombre')
+
+
+def autores_panel(filtros):
+    return Autor.objects.only('id', 'nombre', 'foto').annotate(num_libros=Count('libros'))
+
+
+def colecciones_panel(filtros):
+    return Coleccion.objects.only('id', 'nombre', 'icono', 'color_fondo')
+
+
+def proveedores_panel(filtros):
+    return Proveedor.objects.all()
+
+
+# Sección -> (consulta, orden estable para el cursor)
+PANELES_DASHBOARD = {
+    'pedidos': (pedidos_panel, ('-fecha_pedido', '-id')),
+    'usuarios': (usuarios_panel, ('-date_joined', '-id')),
+    'resenas': (resenas_panel, ('-fecha', '-id')),
+    'inventario': (inventario_panel, ('titulo', 'id')),
+    'autores': (autores_panel, ('nombre', 'id')),
+    'colecciones': (colecciones_panel, ('nombre', 'id')),
+    'proveedores': (proveedores_panel, ('empresa', 'id')),
+}
+
+TAMANO_PAGINA_PANEL = 25
+
+
+# Tarjetas del resumen: el conteo de cada tabla se guarda un rato en lugar de
+# recorrerla en cada visita al panel
+SEGUNDOS_CONTEO_DASHBOARD = 300
+
+
+def totales_dashboard():
+    # Los pedidos salen de VentaDiaria (una fila por día y estado)
+    totales = cache.get('totales_dashboard')
+    if totales is None:
+        totales = {
+            'total_usuarios': User.objects.filter(is_superuser=False).count(),
+            'total_libros': Libro.objects.count(),
+            'total_resenas': Resena.objects.count(),
+        }
+        cache.set('totales_dashboard', totales, SEGUNDOS_CONTEO_DASHBOARD)
+    return {'total_pedidos': VentaDiaria.objects.aggregate(total=Sum('pedidos'))['total'] or 0, **totales}
+
+
+# ==========================================
+# PANEL DE VENTAS (SOLO RESÚMENES DIARIOS)
+# ==========================================
+
+RANGOS_VENTAS = (7, 30, 90, 365)
+
+# Por defecto solo cuenta lo cobrado
+ESTADOS_COBRADOS = ('pagado', 'enviado')
+
+
+def resumen_ventas(dias=30, estados=ESTADOS_COBRADOS, top=10):
+    # Todo sale de VentaDiaria / VentaDiariaLibro: el costo depende de los días
+    # y libros del rango, no de cuántos pedidos hay en la historia.
+    desde = timezone.localdate() - datetime.timedelta(days=dias - 1)
+    diarias = VentaDiaria.objects.filter(fecha__gte=desde, estado__in=estados)
+    por_libro = VentaDiariaLibro.objects.filter(fecha__gte=desde, estado__in=estados)
+
+    totales = diarias.aggregate(pedidos=Sum('pedidos'), subtotal=Sum('subtotal'), total=Sum('total'))
+    por_dia = list(diarias.values('fecha').annotate(pedidos=Sum('pedidos'), total=Sum('total')).order_by('fecha'))
+    maximo = max((dia['total'] for dia in por_dia), default=0) or 1
+    for dia in por_dia:
+        dia['porcentaje'] = round(dia['total'] / maximo * 100)
+
+    return {
+        'desde': desde,
+        'totales': totales,
+        'por_dia': por_dia,
+        'top_libros': list(
+            por_libro.values('libro_id', 'libro__titulo')
+            .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'))
+            .order_by('-unidades', 'libro_id')[:top]
+        ),
+        'top_colecciones': list(
+            por_libro.values('coleccion_id', 'coleccion__nombre')
+            .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'))
+            .order_by('-ingresos', 'coleccion_id')[:top]
+        ),
+    }
+
+
+# ==========================================
+# PAGINACIÓN POR CURSOR (KEYSET / SEEK)
+# ==========================================
+
+class _CodificadorCursor(DjangoJSONEncoder):
+    # DjangoJSONEncoder recorta las fechas a milisegundos; el cursor necesita el valor
+    # exacto o se saltaría filas con la misma fecha al milisegundo.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(valores, cls=_CodificadorCursor, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _campo_orden(modelo, campo):
+    # '-fecha' / 'libro__titulo' -> el Field del modelo que ordena
+    partes = campo.lstrip('-').split('__')
+    for parte in partes[:-1]:
+        modelo = modelo._meta.get_field(parte).related_model
+    return modelo._meta.get_field(partes[-1])
+
+
+def decodificar_cursor(cursor, campos=None):
+    # Un cursor manipulado o viejo se trata como "sin cursor" (primera página). Con
+    # `campos` (los Field del orden) cada valor pasa por to_python y los validadores
+    # del campo, así a la consulta nunca llega un tipo o un rango que la rompa.
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list):
+        return None
+    if campos is None:
+        return valores
+    if len(valores) != len(campos) or None in valores:
+        return None
+    convertidos = []
+    try:
+        for campo, valor in zip(campos, valores):
+            valor = campo.to_python(valor)
+            campo.run_validators(valor)
+            convertidos.append(valor)
+    except (ValidationError, TypeError, ValueError):
+        return None
+    return convertidos
+
+
+def _filtro_seek(orden, valores, hacia_atras=False):
+    # (a, b, c) > (x, y, z)  =>  a > x  OR  (a = x AND b > y)  OR  ...
+    filtro = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        descendente = campo.startswith('-') != hacia_atras
+        lookup = 'lt' if descendente else 'gt'
+        filtro |= Q(**iguales, **{f'{nombre}__{lookup}': valor})
+        iguales[nombre] = valor
+    return filtro
+
+
+def _valor_de(objeto, campo):
+    for parte in campo.lstrip('-').split('__'):
+        objeto = getattr(objeto, parte)
+    return objeto
+
+
+def _invertir(orden):
+    return [campo[1:] if campo.startswith('-') else '-' + campo for campo in orden]
+
+
+class PaginaCursor:
+    # La consulta se hace al usarse la página por primera vez (no al crearla), así
+    # una plantilla que sirve el listado desde la caché de fragmentos no toca la base.
+    def __init__(self, queryset, orden, despues=None, antes=None, tamano=TAMANO_PAGINA_CATALOGO):
+        # El último campo de `orden` debe ser único (normalmente 'id') para que el orden sea estable.
+        self.queryset = queryset
+        self.orden = list(orden)
+        self.campos = [_campo_orden(queryset.model, campo) for campo in self.orden]
+        self.despues = despues
+        self.antes = antes
+        self.tamano = tamano
+        self._objetos = None
+
+    def _cargar(self):
+        # Cada página cuesta una sola consulta: se pide una fila de más para saber si hay otra página.
+        if self._objetos is not None:
+            return
+        orden, tamano = self.orden, self.tamano
+        valores_despues = decodificar_cursor(self.despues, self.campos)
+        valores_antes = decodificar_cursor(self.antes, self.campos) if valores_despues is None else None
+
+        if valores_antes is not None:
+            filas = list(
+                self.queryset.filter(_filtro_seek(orden, valores_antes, hacia_atras=True))
+                .order_by(*_invertir(orden))[:tamano + 1]
+            )
+            self._hay_anterior = len(filas) > tamano
+            self._hay_siguiente = True
+            self._objetos = filas[:tamano][::-1]
+            return
+
+        queryset = self.queryset
+        self._hay_anterior = False
+        if valores_despues is not None:
+            queryset = queryset.filter(_filtro_seek(orden, valores_despues))
+            self._hay_anterior = True
+
+        filas = list(queryset.order_by(*orden)[:tamano + 1])
+        self._hay_siguiente = len(filas) > tamano
+        self._objetos = filas[:tamano]
+
+    @property
+    def objetos(self):
+        self._cargar()
+        return self._objetos
+
+    @property
+    def hay_anterior(self):
+        self._cargar()
+        return self._hay_anterior
+
+    @property
+    def hay_siguiente(self):
+        self._cargar()
+        return self._hay_siguiente
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def _cursor_de(self, objeto):
+        return codificar_cursor([_valor_de(objeto, campo) for campo in self.orden])
+
+    @property
+    def cursor_siguiente(self):
+        if self.hay_siguiente and self.objetos:
+            return self._cursor_de(self.objetos[-1])
+        return None
+
+    @property
+    def cursor_anterior(self):
+        if self.hay_anterior and self.objetos:
+            return self._cursor_de(self.objetos[0])
+        return None
+
+
+def paginar_por_cursor(queryset, orden, despues=None, antes=None, tamano=TAMANO_PAGINA_CATALOGO):
+    return PaginaCursor(queryset, orden, despues=despues, antes=antes, tamano=tamano)
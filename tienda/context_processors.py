@@ -1,5 +1,33 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .cache_etiquetas import SEGUNDOS_CACHE_PAGINA, versiones
 from .models import Coleccion
+from .servicios import resumen_carrito
+
+CLAVE_MENU = 'menu_colecciones'
+
+
+def obtener_menu_colecciones():
+    # La entrada se guarda con la versión de la etiqueta "colecciones", que se
+    # incrementa cada vez que cambia una colección (ver signals.py). Con la caché en
+    # memoria de cada proceso esa invalidación solo llega al worker que guardó: el
+    # plazo acota cuánto puede durar un menú viejo en los demás, igual que las páginas.
+    version = versiones(['colecciones'])['colecciones']
+    menu = cache.get(CLAVE_MENU, version=version)
+    if menu is None:
+        menu = list(Coleccion.objects.all())
+        cache.set(CLAVE_MENU, menu, SEGUNDOS_CACHE_PAGINA, version=version)
+    return menu
+
 
 def menu_colecciones(request):
-    
-    return {'colecciones_menu': Coleccion.objects.all()}
\ No newline at end of file
+    # Perezoso: solo se consulta la caché si la plantilla usa el menú
+    return {'colecciones_menu': SimpleLazyObject(obtener_menu_colecciones)}
+
+
+def unidades_carrito(request):
+    # Contador del 🛒 en base.html; perezoso para no consultar en páginas que no lo pintan
+    if not request.user.is_authenticated:
+        return {}
+    return {'unidades_carrito': SimpleLazyObject(lambda: resumen_carrito(request.user)[0])}
@@ -0,0 +1,107 @@
+import random
+import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Las lecturas solo van a una réplica dentro de una petición GET/HEAD que no haya
+# escrito nada (lo activa ReplicasMiddleware). Comandos, shell y tareas leen del primario.
+class _Estado:
+    # Objeto mutable: los cambios se ven aunque la vista corra en una copia del contexto
+    __slots__ = ('replica', 'escribio')
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.escribio = False
+
+
+_estado = ContextVar('estado_replicas', default=None)
+
+
+# Datos que deben leerse siempre frescos: la sesión y el usuario recién creados o
+# cambiados en el POST anterior, y el carrito / pedidos / perfil de cada cliente
+APPS_SOLO_PRIMARIO = {'sessions', 'auth', 'admin', 'contenttypes'}
+MODELOS_SOLO_PRIMARIO = {
+    'tienda.carrito', 'tienda.itemcarrito', 'tienda.reserva',
+    'tienda.pedido', 'tienda.itempedido', 'tienda.perfil',
+}
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def lecturas_en_replica(activar=True):
+    estado = _Estado(activar)
+    marca = _estado.set(estado)
+    try:
+        yield estado
+    finally:
+        _estado.reset(marca)
+
+
+def fijar_primario():
+    # Desde aquí hasta el final de la petición todo se lee del primario
+    estado = _estado.get()
+    if estado is not None:
+        estado.replica = False
+        estado.escribio = True
+
+
+def _solo_primario(model):
+    opciones = model._meta
+    return opciones.app_label in APPS_SOLO_PRIMARIO or opciones.label_lower in MODELOS_SOLO_PRIMARIO
+
+
+class EnrutadorReplicas:
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or not estado.replica or _solo_primario(model):
+            return DEFAULT_DB_ALIAS
+        # Dentro de una transacción del primario se lee de la misma conexión
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        disponibles = replicas()
+        return random.choice(disponibles) if disponibles else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        fijar_primario()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Todas las bases tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas se copian del primario, no se migran
+        return db == DEFAULT_DB_ALIAS
+
+
+# ==========================================
+# RÉPLICAS SQLITE LOCALES (COPIA DEL ARCHIVO)
+# ==========================================
+
+def sincronizar_replicas():
+    # Copia consistente del primario con la API de backup de SQLite (no bloquea a
+    # los escritores más que lo que tarda cada paso). Devuelve los alias copiados.
+    primario = settings.DATABASES[DEFAULT_DB_ALIAS]
+    copiadas = []
+    for alias in replicas():
+        destino = settings.DATABASES[alias]
+        if primario['ENGINE'] != 'django.db.backends.sqlite3' or destino['ENGINE'] != primario['ENGINE']:
+            continue
+        # Se cierra la conexión del proceso a la réplica para que no lea a medias
+        connections[alias].close()
+        origen = sqlite3.connect(primario['NAME'])
+        copia = sqlite3.connect(destino['NAME'])
+        try:
+            origen.backup(copia)
+        finally:
+            copia.close()
+            origen.close()
+        copiadas.append(alias)
+    return copiadas
@@ -0,0 +1,208 @@
+import gzip
+import mimetypes
+import re
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # opcional: sin el paquete solo se generan y sirven los .gz
+    brotli = None
+
+
+# Los nombres con hash no cambian nunca de contenido: un año y `immutable`
+CACHE_CON_HASH = 'public, max-age=31536000, immutable'
+# El resto (originales sin hash que algún CSS de terceros pide por su nombre)
+CACHE_SIN_HASH = 'public, max-age=300'
+
+EXTENSIONES_COMPRIMIBLES = {'.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf'}
+# Por debajo de esto las cabeceras pesan más que lo que se ahorra
+TAMANO_MINIMO_COMPRESION = 256
+
+# Variante precomprimida por codificación, en orden de preferencia
+CODIFICACIONES = [('br', '.br'), ('gzip', '.gz')]
+
+
+# ==========================================
+# ALMACENAMIENTO CON HASH
+# ==========================================
+
+class AlmacenEstaticos(ManifestStaticFilesStorage):
+    # Sin manifest (collectstatic aún no se corrió: desarrollo y tests) se usan los
+    # nombres sin hash en vez de fallar en cada {% static %}
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+# ==========================================
+# PRECOMPRESIÓN (GZIP / BROTLI)
+# ==========================================
+
+def _gzip(datos):
+    # mtime=0: el mismo archivo siempre produce los mismos bytes
+    return gzip.compress(datos, compresslevel=9, mtime=0)
+
+
+def _brotli(datos):
+    return brotli.compress(datos, quality=11)
+
+
+def compresores():
+    disponibles = {'.gz': _gzip}
+    if brotli is not None:
+        disponibles['.br'] = _brotli
+    return disponibles
+
+
+def comprimir_estaticos(raiz=None):
+    # Deja junto a cada archivo de texto su .gz (y .br si está el paquete brotli).
+    # Solo recomprime lo que cambió desde la última vez. Devuelve cuántos escribió.
+    raiz = Path(raiz or settings.STATIC_ROOT)
+    escritos = 0
+    for ruta in raiz.rglob('*'):
+        if not ruta.is_file() or ruta.suffix.lower() not in EXTENSIONES_COMPRIMIBLES:
+            continue
+        modificado = ruta.stat().st_mtime
+        datos = None
+        for extension, comprimir in compresores().items():
+            destino = ruta.with_name(ruta.name + extension)
+            if destino.exists() and destino.stat().st_mtime >= modificado:
+                continue
+            datos = datos if datos is not None else ruta.read_bytes()
+            if len(datos) < TAMANO_MINIMO_COMPRESION:
+                break
+            comprimido = comprimir(datos)
+            if len(comprimido) >= len(datos):
+                continue
+            destino.write_bytes(comprimido)
+            escritos += 1
+    return escritos
+
+
+# ==========================================
+# FUENTES PROPIAS (SIN fonts.googleapis.com)
+# ==========================================
+
+URL_FUENTES = (
+    'https://fonts.googleapis.com/css2?family=Cinzel+Decorative:wght@700'
+    '&family=Playfair+Display:ital,wght@0,400;0,700;1,400&family=Lato:wght@300;400;700&display=swap'
+)
+# El sitio está en español: basta el subconjunto latino (incluye á, é, ñ, ¿, ¡)
+SUBCONJUNTOS_FUENTES = {'latin'}
+# Con un navegador moderno Google responde con woff2
+AGENTE_FUENTES = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+
+_REGLA_FUENTE = re.compile(r'/\*\s*([\w-]+)\s*\*/\s*@font-face\s*\{(.*?)\}', re.S)
+
+
+def _descargar(url):
+    peticion = urllib.request.Request(url, headers={'User-Agent': AGENTE_FUENTES})
+    with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+        return respuesta.read()
+
+
+def _propiedad(regla, nombre):
+    coincidencia = re.search(rf'{nombre}:\s*([^;]+);', regla)
+    return coincidencia.group(1).strip() if coincidencia else None
+
+
+def descargar_fuentes(destino=None):
+    # Baja los woff2 de Google Fonts a ESTATICOS_GENERADOS y escribe ahí un
+    # tienda/css/fuentes.css que apunta a ellos; como los finders miran ese directorio
+    # antes que la app, reemplaza al fuentes.css de respaldo (solo local()).
+    destino = Path(destino or settings.ESTATICOS_GENERADOS) / 'tienda'
+    (destino / 'fuentes').mkdir(parents=True, exist_ok=True)
+    (destino / 'css').mkdir(parents=True, exist_ok=True)
+
+    reglas = []
+    for subconjunto, regla in _REGLA_FUENTE.findall(_descargar(URL_FUENTES).decode()):
+        if subconjunto not in SUBCONJUNTOS_FUENTES:
+            continue
+        familia = _propiedad(regla, 'font-family').strip("'\"")
+        estilo = _propiedad(regla, 'font-style')
+        peso = _propiedad(regla, 'font-weight')
+        url = re.search(r'url\(([^)]+)\)', regla).group(1)
+        archivo = f"{familia.lower().replace(' ', '-')}-{peso}{'-italic' if estilo == 'italic' else ''}.woff2"
+        (destino / 'fuentes' / archivo).write_bytes(_descargar(url))
+        reglas.append(
+            "@font-face {\n"
+            f"    font-family: '{familia}';\n"
+            f"    font-style: {estilo};\n"
+            f"    font-weight: {peso};\n"
+            "    font-display: swap;\n"
+            f"    src: url('../fuentes/{archivo}') format('woff2');\n"
+            f"    unicode-range: {_propiedad(regla, 'unicode-range')};\n"
+            "}\n"
+        )
+    (destino / 'css' / 'fuentes.css').write_text(
+        "/* Generado por manage.py construir_estaticos --fuentes */\n" + '\n'.join(reglas), encoding='utf-8',
+    )
+    return len(reglas)
+
+
+# ==========================================
+# SERVIR STATIC_ROOT (VER EstaticosMiddleware)
+# ==========================================
+
+def _codificaciones_aceptadas(cabecera):
+    # "br;q=1.0, gzip, *;q=0" -> {'br', 'gzip'}
+    aceptadas = set()
+    for parte in cabecera.split(','):
+        nombre, _, parametros = parte.partition(';')
+        try:
+            if parametros and float(parametros.strip().removeprefix('q=')) == 0:
+                continue
+        except ValueError:
+            pass
+        if nombre.strip():
+            aceptadas.add(nombre.strip().lower())
+    return aceptadas
+
+
+def nombres_con_hash():
+    # Nombres que collectstatic generó con hash (vacío si no hay manifest)
+    return set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def respuesta_estatico(request, nombre, con_hash):
+    # FileResponse del archivo de STATIC_ROOT, o None si no existe
+    try:
+        ruta = Path(safe_join(settings.STATIC_ROOT, nombre))
+    except SuspiciousFileOperation:
+        return None
+    if not ruta.is_file():
+        return None
+
+    inmutable = nombre in con_hash
+    modificado = ruta.stat().st_mtime
+    if not inmutable and not was_modified_since(request.headers.get('If-Modified-Since'), modificado):
+        return HttpResponseNotModified()
+
+    archivo, codificacion = ruta, None
+    aceptadas = _codificaciones_aceptadas(request.headers.get('Accept-Encoding', ''))
+    for nombre_codificacion, extension in CODIFICACIONES:
+        variante = ruta.with_name(ruta.name + extension)
+        if nombre_codificacion in aceptadas and variante.is_file():
+            archivo, codificacion = variante, nombre_codificacion
+            break
+
+    tipo, _ = mimetypes.guess_type(ruta.name)
+    respuesta = FileResponse(archivo.open('rb'), content_type=tipo or 'application/octet-stream')
+    del respuesta['Content-Disposition']
+    if codificacion:
+        respuesta['Content-Encoding'] = codificacion
+    patch_vary_headers(respuesta, ['Accept-Encoding'])
+    respuesta['Last-Modified'] = http_date(modificado)
+    respuesta['Cache-Control'] = CACHE_CON_HASH if inmutable else CACHE_SIN_HASH
+    return respuesta
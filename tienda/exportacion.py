@@ -0,0 +1,106 @@
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import ItemPedido, Pedido
+
+
+TAMANO_LOTE_EXPORTACION = 2000
+
+# Una fila por libro vendido; los datos del pedido se repiten en cada línea
+COLUMNAS_PEDIDOS = (
+    ('pedido', 'pedido_id'),
+    ('fecha', 'pedido__fecha_pedido'),
+    ('estado', 'pedido__estado'),
+    ('usuario', 'pedido__usuario__username'),
+    ('email', 'pedido__usuario__email'),
+    ('metodo_pago', 'pedido__metodo_pago'),
+    ('direccion_envio', 'pedido__direccion_envio'),
+    ('subtotal_pedido', 'pedido__subtotal'),
+    ('impuestos_pedido', 'pedido__impuestos'),
+    ('total_pedido', 'pedido__total_final'),
+    ('libro_id', 'libro_id'),
+    ('titulo', 'libro__titulo'),
+    ('cantidad', 'cantidad'),
+    ('precio_unitario', 'precio_unitario'),
+)
+
+ESTADOS_PEDIDO = {clave for clave, _ in Pedido.ESTADOS}
+
+
+class FiltroInvalido(ValueError):
+    pass
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def filtros_exportacion(desde=None, hasta=None, estado=None):
+    # Fechas AAAA-MM-DD, ambas inclusive. Se comparan contra la columna tal cual
+    # (sin __date) para que la base pueda usar el índice de fecha_pedido.
+    filtros = {}
+    for nombre, valor in (('desde', desde), ('hasta', hasta)):
+        if not valor:
+            continue
+        try:
+            fecha = parse_date(valor)
+        except ValueError:
+            fecha = None
+        if fecha is None:
+            raise FiltroInvalido(f"Fecha '{nombre}' inválida: {valor} (formato AAAA-MM-DD).")
+        if nombre == 'desde':
+            filtros['pedido__fecha_pedido__gte'] = _inicio_del_dia(fecha)
+        else:
+            filtros['pedido__fecha_pedido__lt'] = _inicio_del_dia(fecha + datetime.timedelta(days=1))
+    if estado:
+        if estado not in ESTADOS_PEDIDO:
+            raise FiltroInvalido(f"Estado inválido: {estado}.")
+        filtros['pedido__estado'] = estado
+    return filtros
+
+
+def filas_pedidos(filtros, tamano_lote=TAMANO_LOTE_EXPORTACION):
+    # Un solo SELECT con los JOIN a pedido, usuario y libro, leído por bloques:
+    # la memoria no depende de cuántos pedidos haya.
+    campos = [campo for _, campo in COLUMNAS_PEDIDOS]
+    return (
+        ItemPedido.objects.filter(**filtros)
+        .order_by('pedido__fecha_pedido', 'pedido_id', 'id')
+        .values_list(*campos)
+        .iterator(chunk_size=tamano_lote)
+    )
+
+
+# ==========================================
+# FORMATOS
+# ==========================================
+
+class _Eco:
+    # csv.writer escribe en un "archivo" que solo devuelve la línea
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow([nombre for nombre, _ in COLUMNAS_PEDIDOS])
+    for fila in filas:
+        yield escritor.writerow(valor.isoformat() if isinstance(valor, datetime.datetime) else valor for valor in fila)
+
+
+def lineas_jsonl(filas):
+    nombres = [nombre for nombre, _ in COLUMNAS_PEDIDOS]
+    for fila in filas:
+        yield json.dumps(dict(zip(nombres, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+# Formato -> (generador de líneas, content type)
+FORMATOS_EXPORTACION = {
+    'csv': (lineas_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (lineas_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,220 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import busqueda
+from .cache_etiquetas import etiquetas_listados, invalidar_al_confirmar
+from .models import Libro, Autor, Coleccion, Proveedor
+
+
+TAMANO_LOTE_IMPORTACION = 500
+
+# Columnas de Libro que una fila puede traer además de titulo y autor
+CAMPOS_LIBRO = ('coleccion', 'proveedor', 'precio', 'stock', 'descripcion', 'es_recomendado')
+
+VALORES_VERDADEROS = {'1', 'true', 'si', 'sí', 'x', 'yes'}
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+# ==========================================
+# LECTURA EN STREAMING
+# ==========================================
+
+def leer_filas(archivo, formato):
+    # Generador: nunca hay más de una línea del archivo en memoria
+    if formato == 'csv':
+        yield from csv.DictReader(archivo)
+        return
+    for linea in archivo:
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as error:
+            fila = error
+        yield fila
+
+
+def _en_lotes(filas, tamano):
+    filas = iter(filas)
+    while lote := list(islice(filas, tamano)):
+        yield lote
+
+
+# ==========================================
+# AUTORES, COLECCIONES Y PROVEEDORES
+# ==========================================
+
+def _clave(nombre):
+    return nombre.strip().casefold()
+
+
+class Referencias:
+    # Nombre -> id de las tablas pequeñas, cargadas una sola vez. Lo que no existe
+    # se crea en el momento y se agrega al mapa.
+    def __init__(self):
+        self.autores = {_clave(nombre): pk for pk, nombre in Autor.objects.values_list('id', 'nombre')}
+        self.colecciones = {_clave(nombre): pk for pk, nombre in Coleccion.objects.values_list('id', 'nombre')}
+        self.proveedores = {_clave(nombre): pk for pk, nombre in Proveedor.objects.values_list('id', 'empresa')}
+
+    def autor(self, nombre):
+        clave = _clave(nombre)
+        if clave not in self.autores:
+            self.autores[clave] = Autor.objects.create(nombre=nombre.strip()).id
+        return self.autores[clave]
+
+    def coleccion(self, nombre):
+        clave = _clave(nombre)
+        if clave not in self.colecciones:
+            self.colecciones[clave] = Coleccion.objects.create(nombre=nombre.strip(), descripcion='').id
+        return self.colecciones[clave]
+
+    def proveedor(self, nombre):
+        clave = _clave(nombre)
+        if clave not in self.proveedores:
+            self.proveedores[clave] = Proveedor.objects.create(
+                empresa=nombre.strip(), contacto='', telefono='', email=''
+            ).id
+        return self.proveedores[clave]
+
+
+# ==========================================
+# FILAS -> LIBROS
+# ==========================================
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    return '' if valor is None else str(valor).strip()
+
+
+def limpiar_fila(fila, referencias):
+    # Devuelve (titulo, autor_id, {campo: valor}) solo con las columnas presentes
+    if not isinstance(fila, dict):
+        raise FilaInvalida(f"JSON inválido: {fila}")
+
+    titulo, autor = _texto(fila, 'titulo'), _texto(fila, 'autor')
+    if not titulo or not autor:
+        raise FilaInvalida("faltan titulo o autor")
+
+    datos = {}
+    if _texto(fila, 'coleccion'):
+        datos['coleccion_id'] = referencias.coleccion(_texto(fila, 'coleccion'))
+    if 'proveedor' in fila:
+        datos['proveedor_id'] = referencias.proveedor(_texto(fila, 'proveedor')) if _texto(fila, 'proveedor') else None
+    if _texto(fila, 'precio'):
+        try:
+            precio = Decimal(_texto(fila, 'precio'))
+            # NaN pasa por quantize y recién falla al compararlo
+            if not precio.is_finite():
+                raise InvalidOperation()
+            datos['precio'] = precio.quantize(Decimal('0.01'))
+            negativo = datos['precio'] < 0
+        except InvalidOperation:
+            raise FilaInvalida(f"precio inválido: {fila['precio']!r}")
+        if negativo:
+            raise FilaInvalida("precio negativo")
+    if _texto(fila, 'stock'):
+        try:
+            datos['stock'] = int(_texto(fila, 'stock'))
+        except ValueError:
+            raise FilaInvalida(f"stock inválido: {fila['stock']!r}")
+        if datos['stock'] < 0:
+            raise FilaInvalida("stock negativo")
+    if 'descripcion' in fila:
+        datos['descripcion'] = _texto(fila, 'descripcion')
+    if _texto(fila, 'es_recomendado'):
+        datos['es_recomendado'] = _texto(fila, 'es_recomendado').casefold() in VALORES_VERDADEROS
+
+    return titulo, referencias.autor(autor), datos
+
+
+def _guardar_lote(filas):
+    # `filas`: {(titulo, autor_id): (numero, datos)}. Los libros existentes del lote se
+    # buscan con una consulta; el resto se crea. Devuelve (creados, actualizados, errores).
+    existentes = {
+        (libro.titulo, libro.autor_id): libro
+        for libro in Libro.objects.filter(
+            titulo__in={titulo for titulo, _ in filas},
+            autor_id__in={autor_id for _, autor_id in filas},
+        )
+    }
+
+    nuevos, modificados, campos, errores = [], [], {'actualizado'}, []
+    etiquetas = set()
+    ahora = timezone.now()  # bulk_update no aplica auto_now
+    for (titulo, autor_id), (numero, datos) in filas.items():
+        libro = existentes.get((titulo, autor_id))
+        if libro is None:
+            if 'coleccion_id' not in datos or 'precio' not in datos:
+                errores.append((numero, FilaInvalida(f"{titulo}: un libro nuevo necesita coleccion y precio")))
+                continue
+            nuevos.append(Libro(titulo=titulo, autor_id=autor_id, **{'stock': 0, 'descripcion': '', **datos}))
+        else:
+            # Listados de los que puede salir (colección o recomendado cambian)
+            etiquetas.update(etiquetas_listados(libro.coleccion_id, libro.autor_id, libro.es_recomendado))
+            for campo, valor in datos.items():
+                setattr(libro, campo, valor)
+            libro.actualizado = ahora
+            campos.update(datos)
+            modificados.append(libro)
+
+    Libro.objects.bulk_create(nuevos)
+    if modificados:
+        Libro.objects.bulk_update(modificados, sorted(campos))
+
+    # Sin señales: el índice de búsqueda y la caché se actualizan aquí
+    ids = [libro.id for libro in nuevos + modificados]
+    busqueda.indexar_libros(ids)
+    for libro in nuevos + modificados:
+        etiquetas.update(etiquetas_listados(libro.coleccion_id, libro.autor_id, libro.es_recomendado))
+    if nuevos:
+        etiquetas.add('libros')
+    invalidar_al_confirmar(*etiquetas, *[f'libro:{libro_id}' for libro_id in ids])
+    return len(nuevos), len(modificados), errores
+
+
+def importar_catalogo(filas, tamano_lote=TAMANO_LOTE_IMPORTACION, al_terminar_lote=None, al_fallar_fila=None):
+    # Cada lote va en su propia transacción; si algo falla a mitad de archivo, lo
+    # importado hasta el lote anterior queda guardado.
+    referencias = Referencias()
+    resumen = {'leidas': 0, 'creados': 0, 'actualizados': 0, 'errores': 0}
+    inicio = time.perf_counter()
+
+    def fallo(numero, error):
+        resumen['errores'] += 1
+        if al_fallar_fila:
+            al_fallar_fila(numero, error)
+
+    for lote in _en_lotes(filas, tamano_lote):
+        with transaction.atomic():
+            limpias = {}
+            for fila in lote:
+                resumen['leidas'] += 1
+                try:
+                    titulo, autor_id, datos = limpiar_fila(fila, referencias)
+                except FilaInvalida as error:
+                    fallo(resumen['leidas'], error)
+                    continue
+                # Si el mismo libro aparece dos veces en el lote se combinan (gana la última)
+                anteriores = limpias.get((titulo, autor_id), (None, {}))[1]
+                limpias[(titulo, autor_id)] = (resumen['leidas'], {**anteriores, **datos})
+
+            creados, actualizados, errores = _guardar_lote(limpias)
+
+        resumen['creados'] += creados
+        resumen['actualizados'] += actualizados
+        for numero, error in errores:
+            fallo(numero, error)
+        if al_terminar_lote:
+            al_terminar_lote(resumen, time.perf_counter() - inicio)
+
+    resumen['segundos'] = time.perf_counter() - inicio
+    return resumen
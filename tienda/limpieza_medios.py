@@ -0,0 +1,174 @@
+import logging
+import os
+import posixpath
+import re
+import time
+from pathlib import Path
+
+from django.utils import timezone
+
+from .cache_etiquetas import invalidar_al_confirmar
+from .medios import es_por_contenido
+from .miniaturas import generar_miniaturas
+from .models import Autor, Libro, Perfil
+
+logger = logging.getLogger(__name__)
+
+
+# Modelo -> campo de imagen
+IMAGENES = (
+    (Libro, 'imagen'),
+    (Autor, 'foto'),
+    (Perfil, 'foto'),
+)
+
+# Etiquetas de caché de las páginas que muestran la imagen de estos registros
+ETIQUETAS_IMAGENES = {
+    Libro: lambda ids: [f'libro:{pk}' for pk in ids],
+    Autor: lambda ids: ['autores', *[f'autor:{pk}' for pk in ids]],
+}
+
+TAMANO_LOTE_MEDIOS = 1000
+# Un archivo recién escrito puede no tener aún su registro (la subida se guarda antes
+# que la fila, o la transacción no se confirmó): no se borra hasta pasado este margen.
+# Es mayor que la vida de las páginas en caché, que pueden seguir apuntando a él.
+MARGEN_RECOLECCION = 24 * 3600
+
+# libros/ab/miniaturas/<hash>-320.webp -> <hash>
+_MINIATURA = re.compile(r'^(?P<base>.+)-\d+\.[0-9a-z]+$')
+
+
+def _con_imagen(modelo, nombre_campo):
+    return modelo.objects.exclude(**{nombre_campo: ''}).exclude(**{f'{nombre_campo}__isnull': True})
+
+
+# ==========================================
+# MIGRACIÓN A NOMBRES POR CONTENIDO
+# ==========================================
+
+def _guardar_lote(modelo, registros, campos):
+    modelo.objects.bulk_update(registros, campos)
+    if modelo in ETIQUETAS_IMAGENES:
+        invalidar_al_confirmar(*ETIQUETAS_IMAGENES[modelo]([registro.id for registro in registros]))
+    return len(registros)
+
+
+def migrar_a_contenido(tamano_lote=TAMANO_LOTE_MEDIOS, miniaturas=True):
+    # Copia cada imagen con nombre antiguo (gabo_M6u2BFA.jpg) a su nombre por contenido
+    # y reescribe las columnas con bulk_update por lotes. Los duplicados quedan en un
+    # solo archivo. Los originales no se tocan: los borra recolectar_medios cuando ya
+    # nadie los referencia. Devuelve (registros reescritos, archivos faltantes).
+    reescritos = faltantes = 0
+    for modelo, nombre_campo in IMAGENES:
+        almacen = modelo._meta.get_field(nombre_campo).storage
+        con_fecha = any(campo.name == 'actualizado' for campo in modelo._meta.concrete_fields)
+        campos = [nombre_campo, 'actualizado'] if con_fecha else [nombre_campo]
+        nuevos = {}  # nombre antiguo -> nombre por contenido (varios registros, una imagen)
+        lote = []
+        ahora = timezone.now()
+
+        registros = _con_imagen(modelo, nombre_campo).only('id', *campos).iterator(chunk_size=tamano_lote)
+        for registro in registros:
+            nombre = getattr(registro, nombre_campo).name
+            if es_por_contenido(nombre):
+                continue
+            primera_vez = nombre not in nuevos
+            if primera_vez:
+                if not almacen.exists(nombre):
+                    faltantes += 1
+                    continue
+                with almacen.open(nombre, 'rb') as archivo:
+                    nuevos[nombre] = almacen.save(nombre, archivo)
+            setattr(registro, nombre_campo, nuevos[nombre])
+            if primera_vez and miniaturas:
+                # bulk_update no dispara post_save (crear_miniaturas)
+                try:
+                    generar_miniaturas(getattr(registro, nombre_campo))
+                except (OSError, ValueError):
+                    logger.exception("No se pudieron generar miniaturas de %s", nuevos[nombre])
+            if con_fecha:
+                registro.actualizado = ahora
+            lote.append(registro)
+            if len(lote) >= tamano_lote:
+                reescritos += _guardar_lote(modelo, lote, campos)
+                lote = []
+
+        if lote:
+            reescritos += _guardar_lote(modelo, lote, campos)
+    return reescritos, faltantes
+
+
+# ==========================================
+# RECOLECCIÓN DE ARCHIVOS HUÉRFANOS
+# ==========================================
+
+def _referenciados(tamano_lote):
+    # Nombres en uso y sus (carpeta, base) para reconocer las miniaturas de cada uno
+    nombres = set()
+    for modelo, nombre_campo in IMAGENES:
+        filas = _con_imagen(modelo, nombre_campo).values_list(nombre_campo, flat=True)
+        nombres.update(filas.iterator(chunk_size=tamano_lote))
+    bases = {(posixpath.dirname(nombre), posixpath.splitext(posixpath.basename(nombre))[0]) for nombre in nombres}
+    return nombres, bases
+
+
+def _en_uso(nombre, nombres, bases):
+    if nombre in nombres:
+        return True
+    carpeta, archivo = posixpath.split(nombre)
+    if posixpath.basename(carpeta) != 'miniaturas':
+        return False
+    coincidencia = _MINIATURA.match(archivo)
+    return coincidencia is not None and (posixpath.dirname(carpeta), coincidencia.group('base')) in bases
+
+
+def _borrar(rutas, simular):
+    borrados = liberados = 0
+    for ruta in rutas:
+        try:
+            tamano = ruta.stat().st_size
+            if not simular:
+                ruta.unlink()
+        except FileNotFoundError:
+            continue
+        borrados += 1
+        liberados += tamano
+    return borrados, liberados
+
+
+def recolectar_medios(tamano_lote=TAMANO_LOTE_MEDIOS, margen=MARGEN_RECOLECCION, simular=False):
+    # Borra de las carpetas de subida (autores/, libros/, perfiles/) los archivos que
+    # ningún registro usa, con sus miniaturas, de a `tamano_lote`. Con dedup un archivo
+    # puede ser de varios registros: por eso nunca se borra al cambiar una imagen, solo
+    # aquí. Devuelve (revisados, borrados, bytes liberados).
+    nombres, bases = _referenciados(tamano_lote)
+    limite = time.time() - margen
+    revisados = borrados = liberados = 0
+    lote = []
+
+    carpetas = {}
+    for modelo, nombre_campo in IMAGENES:
+        campo = modelo._meta.get_field(nombre_campo)
+        carpetas[Path(campo.storage.path(campo.upload_to))] = Path(campo.storage.location)
+
+    for carpeta, raiz in carpetas.items():
+        if not carpeta.is_dir():
+            continue
+        for directorio, _, archivos in os.walk(carpeta):
+            for archivo in archivos:
+                ruta = Path(directorio, archivo)
+                revisados += 1
+                if _en_uso(ruta.relative_to(raiz).as_posix(), nombres, bases) or ruta.stat().st_mtime > limite:
+                    continue
+                lote.append(ruta)
+                if len(lote) >= tamano_lote:
+                    cantidad, tamano = _borrar(lote, simular)
+                    borrados += cantidad
+                    liberados += tamano
+                    lote = []
+
+    if lote:
+        cantidad, tamano = _borrar(lote, simular)
+        borrados += cantidad
+        liberados += tamano
+    return revisados, borrados, liberados
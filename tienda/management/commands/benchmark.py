@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from tienda.benchmark import comparar, ejecutar, volumenes
+
+
+SIN_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las vistas principales con el cliente de pruebas (p50/p95, consultas y memoria pico) "
+        "sobre la base configurada, guarda el resultado en JSON y lo compara con una base anterior. "
+        "Todo lo que escribe se deshace al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--solo', nargs='+', help="Nombres de escenarios a medir.")
+        parser.add_argument('--salida', default='benchmark.json')
+        parser.add_argument('--base', help="JSON de una ejecución anterior para comparar.")
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help="Aumento de tiempo o memoria aceptado respecto de la base (0.25 = 25%%).")
+        parser.add_argument('--con-cache', action='store_true',
+                            help="Usa la caché configurada; por defecto se mide sin caché para ver las consultas.")
+
+    def handle(self, *args, **options):
+        base = None
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"No se pudo leer la base {options['base']}: {error}")
+
+        def mostrar(nombre, resultado):
+            self.stdout.write(
+                f"{nombre:<24} {resultado['estado']:>3}  p50 {resultado['p50_ms']:>8.1f} ms  "
+                f"p95 {resultado['p95_ms']:>8.1f} ms  {resultado['consultas']:>4} consultas  "
+                f"{resultado['memoria_pico_kb']:>9.1f} KB"
+            )
+
+        ajustes = {'ALLOWED_HOSTS': ['testserver']}
+        if not options['con_cache']:
+            ajustes['CACHES'] = SIN_CACHE
+
+        with override_settings(**ajustes), transaction.atomic():
+            informe = {
+                'fecha': timezone.now().isoformat(),
+                'repeticiones': options['repeticiones'],
+                'con_cache': options['con_cache'],
+                'volumenes': volumenes(),
+                'resultados': ejecutar(options['repeticiones'], solo=options['solo'], al_medir=mostrar),
+            }
+            transaction.set_rollback(True)
+
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(f"Resultados en {options['salida']}.")
+
+        if base is not None:
+            regresiones = comparar(informe['resultados'], base.get('resultados', {}), options['tolerancia'])
+            if regresiones:
+                raise CommandError("Regresiones respecto de la base:\n  " + "\n  ".join(regresiones))
+            self.stdout.write(self.style.SUCCESS("Sin regresiones respecto de la base."))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tienda.recomendaciones import RELACIONADOS_POR_LIBRO, TAMANO_LOTE_RELACIONADOS, calcular_relacionados
+
+
+class Command(BaseCommand):
+    help = "Recalcula los libros comprados juntos (pedidos pagados o enviados) para 'también compraron'."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=RELACIONADOS_POR_LIBRO, help="Relacionados por libro.")
+        parser.add_argument('--minimo', type=int, default=1, help="Pedidos en común para contar un par.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_RELACIONADOS, help="Filas por lectura / bulk_create.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        libros, filas = calcular_relacionados(top=options['top'], minimo=options['minimo'], tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{filas} relacionados para {libros} libros en {time.perf_counter() - inicio:.1f} s."
+        ))
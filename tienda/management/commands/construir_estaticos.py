@@ -0,0 +1,32 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.estaticos import compresores, comprimir_estaticos, descargar_fuentes
+
+
+class Command(BaseCommand):
+    help = "Recolecta los estáticos con hash en STATIC_ROOT y genera sus versiones gzip/brotli."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fuentes', action='store_true',
+            help="Descarga antes las fuentes de Google Fonts para servirlas desde el sitio.",
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['fuentes']:
+            try:
+                reglas = descargar_fuentes()
+            except OSError as error:
+                raise CommandError(f"No se pudieron descargar las fuentes: {error}")
+            self.stdout.write(f"{reglas} fuentes descargadas.")
+
+        call_command('collectstatic', interactive=False, verbosity=0)
+        escritos = comprimir_estaticos()
+        formatos = ', '.join(extension.lstrip('.') for extension in compresores())
+        self.stdout.write(self.style.SUCCESS(
+            f"Estáticos listos; {escritos} archivos comprimidos ({formatos}) en {time.perf_counter() - inicio:.1f} s."
+        ))
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.exportacion import FORMATOS_EXPORTACION, FiltroInvalido, filas_pedidos, filtros_exportacion
+
+
+class Command(BaseCommand):
+    help = "Exporta las líneas de pedido (pedido + cliente + libro) en CSV o JSONL para contabilidad."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=sorted(FORMATOS_EXPORTACION), default='csv')
+        parser.add_argument('--desde', help="Fecha inicial AAAA-MM-DD (inclusive).")
+        parser.add_argument('--hasta', help="Fecha final AAAA-MM-DD (inclusive).")
+        parser.add_argument('--estado', help="pendiente, pagado o enviado.")
+        parser.add_argument('--salida', default='-', help="Archivo de salida, o '-' para la salida estándar.")
+
+    def handle(self, *args, **options):
+        try:
+            filtros = filtros_exportacion(options['desde'], options['hasta'], options['estado'])
+        except FiltroInvalido as error:
+            raise CommandError(str(error))
+
+        generar_lineas = FORMATOS_EXPORTACION[options['formato']][0]
+        if options['salida'] == '-':
+            salida = sys.stdout
+        else:
+            salida = open(options['salida'], 'w', newline='', encoding='utf-8')
+
+        lineas = 0
+        try:
+            for linea in generar_lineas(filas_pedidos(filtros)):
+                salida.write(linea)
+                lineas += 1
+        finally:
+            if salida is not sys.stdout:
+                salida.close()
+
+        if salida is not sys.stdout:
+            self.stdout.write(self.style.SUCCESS(f"{lineas} líneas escritas en {options['salida']}."))
@@ -0,0 +1,210 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from tienda import busqueda
+from tienda.cache_etiquetas import invalidar
+from tienda.models import (
+    Autor, Coleccion, ItemPedido, Libro, Pedido, Proveedor, Resena,
+)
+from tienda.recomendaciones import calcular_relacionados
+from tienda.servicios import TASA_IMPUESTO, reconciliar_calificaciones, reconstruir_lectores
+from tienda.ventas import reconstruir_ventas
+
+
+PALABRAS = (
+    'sombra', 'mar', 'noche', 'jardín', 'ciudad', 'memoria', 'viento', 'fuego', 'silencio', 'río',
+    'espejo', 'tiempo', 'luna', 'camino', 'casa', 'invierno', 'sueño', 'piedra', 'voz', 'desierto',
+)
+NOMBRES = ('Ana', 'Luis', 'María', 'José', 'Elena', 'Jorge', 'Lucía', 'Pablo', 'Sofía', 'Diego')
+APELLIDOS = ('García', 'López', 'Martínez', 'Rojas', 'Fuentes', 'Castro', 'Vega', 'Ortiz', 'Ramos', 'Silva')
+
+
+@contextmanager
+def _fecha_manual(modelo, campo):
+    # auto_now_add pisa la fecha incluso en bulk_create; se apaga para repartir
+    # los registros en el tiempo
+    field = modelo._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _siguiente_id(modelo):
+    return (modelo.objects.aggregate(maximo=Max('id'))['maximo'] or 0) + 1
+
+
+def _ids_desde(modelo, primer_id):
+    return list(modelo.objects.filter(id__gte=primer_id).order_by('id').values_list('id', flat=True))
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos con inserciones masivas para pruebas de rendimiento, p. ej. "
+        "--libros 100000 --autores 10000 --resenas 1000000 --pedidos 200000. Los datos se agregan "
+        "a los existentes. Usar sobre una base de pruebas, no sobre la de producción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--autores', type=int, default=1000)
+        parser.add_argument('--colecciones', type=int, default=20)
+        parser.add_argument('--proveedores', type=int, default=50)
+        parser.add_argument('--libros', type=int, default=10000)
+        parser.add_argument('--usuarios', type=int, default=5000)
+        parser.add_argument('--resenas', type=int, default=100000)
+        parser.add_argument('--pedidos', type=int, default=20000)
+        parser.add_argument('--items-por-pedido', type=int, default=3, help="Máximo de libros distintos por pedido.")
+        parser.add_argument('--dias', type=int, default=365, help="Las fechas se reparten en los últimos N días.")
+        parser.add_argument('--lote', type=int, default=5000, help="Filas por bulk_create.")
+        parser.add_argument('--semilla', type=int, default=1, help="Misma semilla, mismos datos.")
+
+    def handle(self, *args, **options):
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.ahora = timezone.now()
+        self.dias = options['dias']
+        inicio = time.perf_counter()
+
+        autores = self._paso("autores", self._autores, options['autores'])
+        colecciones = self._paso("colecciones", self._colecciones, options['colecciones'])
+        proveedores = self._paso("proveedores", self._proveedores, options['proveedores'])
+        libros = self._paso("libros", self._libros, options['libros'], autores, colecciones, proveedores)
+        usuarios = self._paso("usuarios", self._usuarios, options['usuarios'])
+        self._paso("reseñas", self._resenas, options['resenas'], usuarios, libros)
+        self._paso("pedidos", self._pedidos, options['pedidos'], usuarios, libros, options['items_por_pedido'])
+
+        # bulk_create no dispara señales: agregados, resúmenes, índice y caché se ponen al día aquí
+        self._paso("calificaciones", reconciliar_calificaciones)
+        self._paso("resúmenes de ventas", reconstruir_ventas)
+        self._paso("libros comprados por usuario", reconstruir_lectores)
+        self._paso("también compraron", calcular_relacionados)
+        self._paso("índice de búsqueda", busqueda.reconstruir_indice)
+        invalidar('libros', 'autores', 'colecciones')
+
+        self.stdout.write(self.style.SUCCESS(f"Datos generados en {time.perf_counter() - inicio:.1f} s."))
+
+    def _paso(self, nombre, funcion, *args):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        self.stdout.write(f"  {nombre}: {time.perf_counter() - inicio:.1f} s")
+        return resultado
+
+    def _crear(self, modelo, objetos):
+        # Inserta por lotes y devuelve los ids nuevos (sirve en motores sin RETURNING)
+        primer_id = _siguiente_id(modelo)
+        with transaction.atomic():
+            modelo.objects.bulk_create(objetos, batch_size=self.lote)
+        return _ids_desde(modelo, primer_id)
+
+    def _fecha(self):
+        return self.ahora - timedelta(seconds=self.azar.randrange(self.dias * 86400))
+
+    def _titulo(self):
+        return ' '.join(self.azar.choice(PALABRAS) for _ in range(self.azar.randint(2, 4))).capitalize()
+
+    def _nombre(self):
+        return f"{self.azar.choice(NOMBRES)} {self.azar.choice(APELLIDOS)} {self.azar.choice(APELLIDOS)}"
+
+    def _autores(self, total):
+        return self._crear(Autor, [Autor(nombre=self._nombre(), biografia=self._titulo()) for _ in range(total)])
+
+    def _colecciones(self, total):
+        return self._crear(Coleccion, [
+            Coleccion(nombre=f"Colección {self._titulo()}", descripcion=self._titulo()) for _ in range(total)
+        ])
+
+    def _proveedores(self, total):
+        return self._crear(Proveedor, [
+            Proveedor(empresa=f"Editorial {self._titulo()}", contacto=self._nombre(), telefono='5550000000',
+                      email=f'proveedor{n}@example.com')
+            for n in range(total)
+        ])
+
+    def _libros(self, total, autores, colecciones, proveedores):
+        ids = []
+        for inicio in range(0, total, self.lote):
+            ids += self._crear(Libro, [
+                Libro(
+                    titulo=self._titulo(),
+                    autor_id=self.azar.choice(autores),
+                    coleccion_id=self.azar.choice(colecciones),
+                    proveedor_id=self.azar.choice(proveedores) if proveedores else None,
+                    precio=Decimal(self.azar.randint(500, 5000)) / 100,
+                    stock=self.azar.choice((0, 1, 5, 20, 100)),
+                    descripcion=' '.join(self._titulo() for _ in range(5)),
+                    es_recomendado=self.azar.random() < 0.05,
+                )
+                for _ in range(min(self.lote, total - inicio))
+            ])
+        return ids
+
+    def _usuarios(self, total):
+        # Un solo hash para todos: calcular PBKDF2 por usuario tardaría horas
+        clave = make_password('demo1234')
+        base = _siguiente_id(User)
+        ids = []
+        for inicio in range(0, total, self.lote):
+            nuevos = self._crear(User, [
+                User(username=f'lector{base + n}', email=f'lector{base + n}@example.com', password=clave)
+                for n in range(inicio, min(inicio + self.lote, total))
+            ])
+            ids += nuevos
+        return ids
+
+    def _resenas(self, total, usuarios, libros):
+        with _fecha_manual(Resena, 'fecha'):
+            for inicio in range(0, total, self.lote):
+                with transaction.atomic():
+                    Resena.objects.bulk_create([
+                        Resena(
+                            libro_id=self.azar.choice(libros),
+                            usuario_id=self.azar.choice(usuarios),
+                            calificacion=self.azar.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 5, 4))[0],
+                            comentario=self._titulo(),
+                            fecha=self._fecha(),
+                        )
+                        for _ in range(min(self.lote, total - inicio))
+                    ])
+
+    def _pedidos(self, total, usuarios, libros, items_por_pedido):
+        precios = dict(Libro.objects.filter(id__in=libros).values_list('id', 'precio'))
+        with _fecha_manual(Pedido, 'fecha_pedido'):
+            for inicio in range(0, total, self.lote):
+                lineas_por_pedido = []
+                pedidos = []
+                for _ in range(min(self.lote, total - inicio)):
+                    lineas = [
+                        (libro_id, self.azar.randint(1, 3), precios[libro_id])
+                        for libro_id in self.azar.sample(libros, self.azar.randint(1, items_por_pedido))
+                    ]
+                    subtotal = sum(precio * cantidad for _, cantidad, precio in lineas)
+                    impuestos = (subtotal * TASA_IMPUESTO).quantize(Decimal('0.01'))
+                    pedidos.append(Pedido(
+                        usuario_id=self.azar.choice(usuarios),
+                        fecha_pedido=self._fecha(),
+                        direccion_envio='Calle Falsa 123, Ciudad de México',
+                        subtotal=subtotal,
+                        impuestos=impuestos,
+                        total_final=subtotal + impuestos,
+                        estado=self.azar.choices(('pendiente', 'pagado', 'enviado'), weights=(1, 3, 6))[0],
+                    ))
+                    lineas_por_pedido.append(lineas)
+
+                with transaction.atomic():
+                    ids = self._crear(Pedido, pedidos)
+                    ItemPedido.objects.bulk_create([
+                        ItemPedido(pedido_id=pedido_id, libro_id=libro_id, cantidad=cantidad, precio_unitario=precio)
+                        for pedido_id, lineas in zip(ids, lineas_por_pedido)
+                        for libro_id, cantidad, precio in lineas
+                    ], batch_size=self.lote)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from tienda.limpieza_medios import IMAGENES
+from tienda.miniaturas import generar_miniaturas
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas WebP/JPEG que falten para las imágenes ya subidas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help="Regenera aunque ya existan.")
+
+    def handle(self, *args, **options):
+        total = 0
+        errores = 0
+        for modelo, nombre_campo in IMAGENES:
+            registros = (
+                modelo.objects.exclude(**{nombre_campo: ''}).exclude(**{f'{nombre_campo}__isnull': True})
+                .only('id', nombre_campo).iterator(chunk_size=500)
+            )
+            for registro in registros:
+                campo = getattr(registro, nombre_campo)
+                try:
+                    total += generar_miniaturas(campo, forzar=options['forzar'])
+                except (OSError, ValueError) as error:
+                    errores += 1
+                    self.stderr.write(f"{campo.name}: {error}")
+
+        self.stdout.write(self.style.SUCCESS(f"Miniaturas generadas: {total} (errores: {errores})."))
@@ -0,0 +1,62 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.importacion import TAMANO_LOTE_IMPORTACION, importar_catalogo, leer_filas
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa libros desde un CSV o JSONL (uno por línea) del proveedor. Columnas: titulo, autor, "
+        "coleccion, proveedor, precio, stock, descripcion, es_recomendado. Un libro se identifica por "
+        "titulo + autor: si existe se actualizan las columnas que traiga la fila, si no se crea."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo, o '-' para leer de la entrada estándar.")
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help="Por defecto se deduce de la extensión.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_IMPORTACION, help="Filas por transacción.")
+        parser.add_argument('--max-errores', type=int, default=20, help="Errores de fila que se muestran.")
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        formato = options['formato']
+        if not formato:
+            extension = os.path.splitext(ruta)[1].lower()
+            if extension not in ('.csv', '.jsonl'):
+                raise CommandError("No se pudo deducir el formato; usa --formato csv|jsonl.")
+            formato = extension[1:]
+
+        def progreso(resumen, segundos):
+            self.stdout.write(
+                f"{resumen['leidas']} filas ({resumen['creados']} nuevas, {resumen['actualizados']} actualizadas, "
+                f"{resumen['errores']} con error) — {resumen['leidas'] / max(segundos, 1e-9):.0f} filas/s"
+            )
+
+        mostrados = 0
+
+        def error(numero, excepcion):
+            nonlocal mostrados
+            if mostrados < options['max_errores']:
+                self.stderr.write(f"Fila {numero}: {excepcion}")
+            mostrados += 1
+
+        try:
+            archivo = sys.stdin if ruta == '-' else open(ruta, newline='', encoding='utf-8-sig')
+        except OSError as excepcion:
+            raise CommandError(f"No se pudo abrir {ruta}: {excepcion}")
+
+        with archivo:
+            resumen = importar_catalogo(
+                leer_filas(archivo, formato),
+                tamano_lote=options['lote'],
+                al_terminar_lote=progreso,
+                al_fallar_fila=error,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {resumen['creados']} libros nuevos, {resumen['actualizados']} actualizados, "
+            f"{resumen['errores']} filas con error, en {resumen['segundos']:.2f} s "
+            f"({resumen['leidas'] / max(resumen['segundos'], 1e-9):.0f} filas/s)."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tienda.servicios import TAMANO_LOTE_RESERVAS, liberar_reservas_vencidas
+
+
+class Command(BaseCommand):
+    help = "Borra las reservas de carrito vencidas (pensado para correr cada pocos minutos con cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_RESERVAS, help="Reservas por DELETE.")
+
+    def handle(self, *args, **options):
+        liberadas = liberar_reservas_vencidas(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Reservas liberadas: {liberadas}."))
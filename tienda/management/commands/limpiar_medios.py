@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from tienda.limpieza_medios import MARGEN_RECOLECCION, TAMANO_LOTE_MEDIOS, recolectar_medios
+
+
+class Command(BaseCommand):
+    help = "Borra las imágenes subidas (y sus miniaturas) que ya no usa ningún registro."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_MEDIOS, help="Archivos por tanda de borrado.")
+        parser.add_argument('--margen', type=int, default=MARGEN_RECOLECCION,
+                            help="Segundos desde la última modificación antes de poder borrar un archivo.")
+        parser.add_argument('--simular', action='store_true', help="Solo informa lo que borraría.")
+
+    def handle(self, *args, **options):
+        revisados, borrados, liberados = recolectar_medios(
+            tamano_lote=options['lote'], margen=options['margen'], simular=options['simular'],
+        )
+        accion = "Se borrarían" if options['simular'] else "Borrados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{accion} {borrados} de {revisados} archivos ({liberados / 1024 / 1024:.1f} MB)."
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.limpieza_medios import IMAGENES, TAMANO_LOTE_MEDIOS, migrar_a_contenido
+from tienda.medios import AlmacenPorContenido
+
+
+class Command(BaseCommand):
+    help = "Pasa las imágenes ya subidas a nombres por contenido (sin duplicados) y reescribe sus rutas en la base."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_MEDIOS, help="Registros por bulk_update.")
+        parser.add_argument('--sin-miniaturas', action='store_true', help="No genera las miniaturas de los nombres nuevos.")
+
+    def handle(self, *args, **options):
+        for modelo, nombre_campo in IMAGENES:
+            if not isinstance(modelo._meta.get_field(nombre_campo).storage, AlmacenPorContenido):
+                # Con otro almacenamiento save() solo crearía otra copia con sufijo
+                raise CommandError("STORAGES['default'] debe ser tienda.medios.AlmacenPorContenido.")
+        reescritos, faltantes = migrar_a_contenido(
+            tamano_lote=options['lote'], miniaturas=not options['sin_miniaturas'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Registros reescritos: {reescritos} (archivos faltantes: {faltantes}). "
+            "Los originales se borran con limpiar_medios."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tienda.servicios import reconciliar_calificaciones
+
+
+class Command(BaseCommand):
+    help = "Recalcula num_resenas / suma / promedio de cada libro desde las reseñas y corrige desfases."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help="Libros por bulk_update.")
+
+    def handle(self, *args, **options):
+        corregidos = reconciliar_calificaciones(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Libros corregidos: {corregidos}."))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda import busqueda
+from tienda.models import Libro
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero el índice FTS5 de búsqueda de libros."
+
+    def handle(self, *args, **options):
+        if not busqueda.disponible():
+            raise CommandError("El índice de búsqueda solo existe con SQLite (FTS5).")
+
+        inicio = time.perf_counter()
+        busqueda.reconstruir_indice()
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice reconstruido: {Libro.objects.count()} libros en {segundos:.2f} s."
+        ))
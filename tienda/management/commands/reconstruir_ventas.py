@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from tienda.ventas import reconstruir_ventas
+
+
+def _fecha(valor):
+    return datetime.date.fromisoformat(valor)
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes diarios de ventas desde Pedido/ItemPedido (todo, o un rango de fechas)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help="AAAA-MM-DD, inclusive.")
+        parser.add_argument('--hasta', type=_fecha, help="AAAA-MM-DD, inclusive.")
+
+    def handle(self, *args, **options):
+        diarias, por_libro = reconstruir_ventas(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Resúmenes reconstruidos: {diarias} filas por día y estado, {por_libro} por día y libro."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tienda.enrutador import sincronizar_replicas
+
+
+class Command(BaseCommand):
+    help = "Copia la base SQLite primaria sobre cada réplica local configurada en DB_REPLICAS."
+
+    def handle(self, *args, **options):
+        copiadas = sincronizar_replicas()
+        if not copiadas:
+            self.stdout.write("No hay réplicas SQLite configuradas (DB_REPLICAS).")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Réplicas actualizadas: {', '.join(copiadas)}."))
@@ -0,0 +1,209 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+# Nombres direccionados por contenido (<hash>.jpg): lo que hay detrás de un nombre no
+# cambia nunca, así que se cachea un año sin revalidar
+NOMBRE_POR_CONTENIDO = re.compile(r'^(?P<hash>[0-9a-f]{32})\.[0-9a-z]+$')
+CACHE_POR_CONTENIDO = 'public, max-age=31536000, immutable'
+# El resto puede reemplazarse con el mismo nombre (las miniaturas <hash>-320.webp se
+# reescriben con generar_miniaturas --forzar): se revalida con ETag / Last-Modified
+CACHE_MEDIOS = 'public, max-age=3600'
+
+ENVIOS_DELEGADOS = ('x-sendfile', 'x-accel-redirect')
+
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangoNoSatisfacible(Exception):
+    pass
+
+
+# ==========================================
+# ALMACENAMIENTO POR CONTENIDO
+# ==========================================
+
+def es_por_contenido(nombre):
+    return NOMBRE_POR_CONTENIDO.match(posixpath.basename(nombre)) is not None
+
+
+def nombre_por_contenido(nombre, contenido):
+    # autores/gabo.JPG -> autores/3f/3fa1...c9.jpg (SHA-256 del contenido, 32 hex).
+    # El subdirectorio de dos letras evita carpetas con cientos de miles de archivos.
+    resumen = hashlib.sha256()
+    for trozo in contenido.chunks():
+        resumen.update(trozo)
+    contenido.seek(0)
+    huella = resumen.hexdigest()[:32]
+    extension = posixpath.splitext(nombre)[1].lower()
+    return posixpath.join(posixpath.dirname(nombre), huella[:2], huella + extension)
+
+
+class AlmacenPorContenido(FileSystemStorage):
+    # Cada subida se guarda con el hash de su contenido: la misma imagen subida dos
+    # veces es un solo archivo (no más gabo.jpg + gabo_M6u2BFA.jpg) y detrás de una
+    # URL nunca cambia el contenido. Lo que deja de estar referenciado lo borra
+    # recolectar_medios (manage.py limpiar_medios).
+    def __init__(self, **kwargs):
+        # Dos subidas simultáneas de la misma imagen escriben los mismos bytes
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # Las miniaturas derivan su nombre del original (ver miniaturas.ruta_miniatura) y
+        # se regeneran en su lugar. Las subidas nunca caen en miniaturas/: su carpeta
+        # es la del upload_to.
+        if posixpath.basename(posixpath.dirname(name)) == 'miniaturas':
+            return super().save(name, content, max_length)
+
+        name = nombre_por_contenido(str(name).replace('\\', '/'), content)
+        if self.exists(name):
+            # Ya estaba: no se escribe de nuevo. Se renueva la fecha para que la
+            # recolección (que respeta un margen desde la última modificación) no lo
+            # borre antes de que se guarde el registro que lo va a usar.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+# ==========================================
+# RANGOS (Range / If-Range)
+# ==========================================
+
+def rango_pedido(cabecera, tamano):
+    # (inicio, fin) inclusivos de "bytes=a-b", "bytes=a-" o "bytes=-n". None para
+    # servir el archivo completo (sin Range, mal formado o varios rangos)
+    coincidencia = _RANGO.match(cabecera.strip()) if cabecera else None
+    if not coincidencia or coincidencia.groups() == ('', ''):
+        return None
+    desde, hasta = coincidencia.groups()
+    if not desde:
+        # Los últimos n bytes
+        if int(hasta) == 0:
+            raise RangoNoSatisfacible()
+        return max(tamano - int(hasta), 0), tamano - 1
+    inicio = int(desde)
+    if hasta and int(hasta) < inicio:
+        return None
+    if inicio >= tamano:
+        raise RangoNoSatisfacible()
+    return inicio, min(int(hasta), tamano - 1) if hasta else tamano - 1
+
+
+def _rango_vigente(request, etag, modificado):
+    # If-Range: el rango solo vale si el cliente tiene la misma versión del archivo
+    condicion = request.headers.get('If-Range')
+    return not condicion or condicion in (etag, http_date(modificado))
+
+
+class _Tramo:
+    # Vista de solo lectura de [inicio, fin] de un archivo abierto. Conserva fileno()
+    # y tell(): gunicorn y compañía envían con sendfile desde la posición actual
+    # hasta Content-Length, sin copiar los bytes por Python.
+    def __init__(self, archivo, inicio, fin):
+        archivo.seek(inicio)
+        self._archivo = archivo
+        self._restante = fin - inicio + 1
+        self.name = archivo.name
+
+    def read(self, tamano=-1):
+        if tamano < 0 or tamano > self._restante:
+            tamano = self._restante
+        datos = self._archivo.read(tamano)
+        self._restante -= len(datos)
+        return datos
+
+    def tell(self):
+        return self._archivo.tell()
+
+    def seekable(self):
+        return False
+
+    def fileno(self):
+        return self._archivo.fileno()
+
+    def close(self):
+        self._archivo.close()
+
+
+# ==========================================
+# RESPUESTA
+# ==========================================
+
+def _cabeceras(respuesta, etag, modificado, por_contenido):
+    respuesta['ETag'] = etag
+    respuesta['Last-Modified'] = http_date(modificado)
+    respuesta['Cache-Control'] = CACHE_POR_CONTENIDO if por_contenido else CACHE_MEDIOS
+    respuesta['Accept-Ranges'] = 'bytes'
+    return respuesta
+
+
+def _delegada(nombre, ruta, tipo):
+    # Solo cabeceras: el servidor web (Apache / nginx) lee y envía el archivo,
+    # y atiende él mismo los Range
+    respuesta = HttpResponse(content_type=tipo)
+    if settings.MEDIA_ENVIO == 'x-accel-redirect':
+        respuesta['X-Accel-Redirect'] = settings.MEDIA_ENVIO_PREFIJO + quote(nombre)
+    else:
+        respuesta['X-Sendfile'] = str(ruta)
+    return respuesta
+
+
+def respuesta_medio(request, nombre):
+    try:
+        ruta = Path(safe_join(settings.MEDIA_ROOT, nombre))
+    except SuspiciousFileOperation:
+        raise Http404()
+    if not ruta.is_file():
+        raise Http404()
+
+    estado = ruta.stat()
+    modificado = int(estado.st_mtime)
+    por_contenido = NOMBRE_POR_CONTENIDO.match(ruta.name) is not None and ruta.parent.name != 'miniaturas'
+    etag = quote_etag(ruta.stem if por_contenido else f'{estado.st_mtime_ns:x}-{estado.st_size:x}')
+
+    # 304 / 412 sin abrir el archivo
+    condicional = get_conditional_response(request, etag=etag, last_modified=modificado)
+    if condicional is not None:
+        return _cabeceras(condicional, etag, modificado, por_contenido)
+
+    tipo = mimetypes.guess_type(ruta.name)[0] or 'application/octet-stream'
+    if settings.MEDIA_ENVIO in ENVIOS_DELEGADOS:
+        return _cabeceras(_delegada(nombre, ruta, tipo), etag, modificado, por_contenido)
+
+    try:
+        rango = rango_pedido(request.headers.get('Range'), estado.st_size)
+    except RangoNoSatisfacible:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{estado.st_size}'
+        return _cabeceras(respuesta, etag, modificado, por_contenido)
+
+    archivo = ruta.open('rb')
+    if rango is None or not _rango_vigente(request, etag, modificado):
+        # Con wsgi.file_wrapper el servidor WSGI lo envía con sendfile (sin copias)
+        respuesta = FileResponse(archivo, content_type=tipo)
+    else:
+        inicio, fin = rango
+        respuesta = FileResponse(_Tramo(archivo, inicio, fin), status=206, content_type=tipo)
+        respuesta['Content-Length'] = fin - inicio + 1
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+    del respuesta['Content-Disposition']
+    return _cabeceras(respuesta, etag, modificado, por_contenido)
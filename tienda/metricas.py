@@ -0,0 +1,164 @@
+import os
+import threading
+from collections import Counter
+from time import perf_counter
+
+from django.conf import settings
+
+
+# Límites superiores (segundos) de los buckets del histograma de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Valores por defecto de METRICAS_CONSULTA_LENTA_MS y METRICAS_UMBRAL_REPETIDAS
+CONSULTA_LENTA_MS = 100
+UMBRAL_CONSULTAS_REPETIDAS = 5
+
+
+class _MetricaVista:
+    def __init__(self):
+        self.peticiones = 0
+        self.buckets = [0] * len(BUCKETS_LATENCIA)
+        self.segundos = 0.0
+        self.consultas = 0
+        self.max_consultas = 0
+        self.segundos_db = 0.0
+        self.bytes = 0
+
+    def agregar(self, segundos, consultas, segundos_db, tamano):
+        self.peticiones += 1
+        self.segundos += segundos
+        for posicion, limite in enumerate(BUCKETS_LATENCIA):
+            if segundos <= limite:
+                self.buckets[posicion] += 1
+                break
+        self.consultas += consultas
+        self.max_consultas = max(self.max_consultas, consultas)
+        self.segundos_db += segundos_db
+        self.bytes += tamano
+
+
+# Métricas del proceso: con varios workers cada uno lleva las suyas. En Prometheus cada
+# serie lleva la etiqueta proceso (pid), así un scrape que cae en otro worker no hace
+# subir y bajar el mismo contador; se suman con sum without (proceso) (rate(...)).
+_metricas = {}
+_candado = threading.Lock()
+
+
+def registrar(vista, segundos, consultas, segundos_db, tamano):
+    with _candado:
+        _metricas.setdefault(vista, _MetricaVista()).agregar(segundos, consultas, segundos_db, tamano)
+
+
+def reiniciar():
+    with _candado:
+        _metricas.clear()
+
+
+def resumen():
+    # Lista de dicts por vista, de la que más tiempo total consume a la que menos
+    with _candado:
+        copia = {vista: vars(metrica).copy() for vista, metrica in _metricas.items()}
+
+    filas = []
+    for vista, datos in copia.items():
+        peticiones = datos['peticiones']
+        filas.append({
+            'vista': vista,
+            'peticiones': peticiones,
+            'segundos_total': datos['segundos'],
+            'media_ms': datos['segundos'] / peticiones * 1000,
+            'p95_ms': _percentil_histograma(datos['buckets'], peticiones, 0.95) * 1000,
+            'consultas_media': datos['consultas'] / peticiones,
+            'max_consultas': datos['max_consultas'],
+            'db_media_ms': datos['segundos_db'] / peticiones * 1000,
+            'bytes_media': datos['bytes'] / peticiones,
+            'buckets': datos['buckets'],
+            'consultas': datos['consultas'],
+            'segundos_db': datos['segundos_db'],
+            'bytes': datos['bytes'],
+        })
+    return sorted(filas, key=lambda fila: fila['segundos_total'], reverse=True)
+
+
+def _percentil_histograma(buckets, total, fraccion):
+    # Aproximado: el límite del primer bucket que acumula la fracción pedida
+    acumulado = 0
+    for limite, cantidad in zip(BUCKETS_LATENCIA, buckets):
+        acumulado += cantidad
+        if acumulado >= total * fraccion:
+            return limite
+    return float('inf')
+
+
+# ==========================================
+# CONSULTAS DE UNA PETICIÓN
+# ==========================================
+
+class ContadorConsultas:
+    # Se instala con connection.execute_wrapper(); funciona con DEBUG apagado
+    def __init__(self):
+        self.lenta_ms = getattr(settings, 'METRICAS_CONSULTA_LENTA_MS', CONSULTA_LENTA_MS)
+        # La misma consulta (mismo SQL, distintos parámetros) repetida en una petición suele ser un N+1
+        self.umbral_repetidas = getattr(settings, 'METRICAS_UMBRAL_REPETIDAS', UMBRAL_CONSULTAS_REPETIDAS)
+        self.total = 0
+        self.segundos = 0.0
+        self.lentas = []
+        self.por_sql = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = perf_counter() - inicio
+            self.total += 1
+            self.segundos += duracion
+            self.por_sql[sql] += 1
+            if duracion * 1000 >= self.lenta_ms:
+                self.lentas.append((duracion, sql))
+
+    def repetidas(self):
+        return [(sql, veces) for sql, veces in self.por_sql.most_common() if veces >= self.umbral_repetidas]
+
+
+# ==========================================
+# FORMATO PROMETHEUS
+# ==========================================
+
+def _etiqueta(vista):
+    return vista.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _etiquetas(fila, proceso):
+    return f'vista="{_etiqueta(fila["vista"])}",proceso="{proceso}"'
+
+
+def texto_prometheus():
+    # El pid se lee aquí y no al importar: con --preload los workers nacen de un fork
+    proceso = os.getpid()
+    lineas = [
+        '# HELP tienda_peticion_segundos Latencia de las peticiones por vista.',
+        '# TYPE tienda_peticion_segundos histogram',
+    ]
+    filas = resumen()
+    for fila in filas:
+        etiquetas = _etiquetas(fila, proceso)
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS_LATENCIA, fila['buckets']):
+            acumulado += cantidad
+            lineas.append(f'tienda_peticion_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+        lineas.append(f'tienda_peticion_segundos_bucket{{{etiquetas},le="+Inf"}} {fila["peticiones"]}')
+        lineas.append(f'tienda_peticion_segundos_sum{{{etiquetas}}} {fila["segundos_total"]}')
+        lineas.append(f'tienda_peticion_segundos_count{{{etiquetas}}} {fila["peticiones"]}')
+
+    contadores = (
+        ('tienda_consultas_total', 'Consultas SQL ejecutadas por vista.', 'consultas'),
+        ('tienda_db_segundos_total', 'Tiempo en la base de datos por vista.', 'segundos_db'),
+        ('tienda_respuesta_bytes_total', 'Bytes de respuesta enviados por vista.', 'bytes'),
+    )
+    for nombre, ayuda, clave in contadores:
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} counter')
+        for fila in filas:
+            lineas.append(f'{nombre}{{{_etiquetas(fila, proceso)}}} {fila[clave]}')
+    return '\n'.join(lineas) + '\n'
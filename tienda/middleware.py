@@ -0,0 +1,81 @@
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metricas
+from .enrutador import lecturas_en_replica
+from .estaticos import nombres_con_hash, respuesta_estatico
+
+logger = logging.getLogger('tienda.metricas')
+
+
+class EstaticosMiddleware:
+    # Sirve STATIC_ROOT (lo que deja construir_estaticos) sin pasar por sesión,
+    # métricas ni réplicas: la variante .br/.gz que acepte el cliente y caché de un
+    # año para los nombres con hash. Con DEBUG runserver ya sirve los estáticos.
+    def __init__(self, get_response):
+        if not settings.SERVIR_ESTATICOS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefijo = settings.STATIC_URL
+        self.con_hash = nombres_con_hash()
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefijo):
+            respuesta = respuesta_estatico(request, request.path_info[len(self.prefijo):], self.con_hash)
+            if respuesta is not None:
+                return respuesta
+        return self.get_response(request)
+
+
+class MetricasMiddleware:
+    # Latencia, consultas, tiempo en base y tamaño de respuesta por nombre de URL
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        contador = metricas.ContadorConsultas()
+        inicio = perf_counter()
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(contador))
+            respuesta = self.get_response(request)
+        segundos = perf_counter() - inicio
+
+        coincidencia = request.resolver_match
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        # En streaming no se conoce el tamaño sin consumir la respuesta
+        tamano = 0 if respuesta.streaming else len(respuesta.content)
+        metricas.registrar(vista, segundos, contador.total, contador.segundos, tamano)
+
+        for duracion, sql in contador.lentas:
+            logger.warning("Consulta lenta en %s (%.0f ms): %s", vista, duracion * 1000, sql)
+        for sql, veces in contador.repetidas():
+            logger.warning("Consulta repetida %d veces en %s (¿N+1?): %s", veces, vista, sql)
+        return respuesta
+
+
+# Cookie que manda las lecturas de un cliente al primario justo después de que escribió
+COOKIE_PRIMARIO = 'leer_primario'
+
+
+class ReplicasMiddleware:
+    # GET/HEAD leen de las réplicas (ver tienda.enrutador). Cualquier escritura fija el
+    # resto de la petición al primario, y la cookie hace lo mismo con las siguientes
+    # peticiones del cliente durante REPLICA_FIJAR_SEGUNDOS.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        activar = request.method in ('GET', 'HEAD') and COOKIE_PRIMARIO not in request.COOKIES
+        with lecturas_en_replica(activar) as estado:
+            respuesta = self.get_response(request)
+        if estado.escribio:
+            respuesta.set_cookie(
+                COOKIE_PRIMARIO, '1', max_age=settings.REPLICA_FIJAR_SEGUNDOS, httponly=True, samesite='Lax',
+            )
+        return respuesta
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+CREAR_INDICE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tienda_libro_fts USING fts5(
+        titulo, descripcion, autor, coleccion,
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+LLENAR_INDICE = """
+    INSERT INTO tienda_libro_fts (rowid, titulo, descripcion, autor, coleccion)
+    SELECT l.id, l.titulo, l.descripcion, a.nombre, c.nombre
+    FROM tienda_libro l
+    JOIN tienda_autor a ON a.id = l.autor_id
+    JOIN tienda_coleccion c ON c.id = l.coleccion_id
+"""
+
+
+def crear_indice(apps, schema_editor):
+    # FTS5 solo existe en SQLite; en otros motores la búsqueda usa LIKE
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREAR_INDICE)
+    schema_editor.execute(LLENAR_INDICE)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS tienda_libro_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0002_proveedor_alter_pedido_direccion_envio_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
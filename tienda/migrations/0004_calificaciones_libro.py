@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 14:15
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def calcular_calificaciones(apps, schema_editor):
+    Libro = apps.get_model('tienda', 'Libro')
+    Resena = apps.get_model('tienda', 'Resena')
+    totales = Resena.objects.values('libro_id').annotate(num=Count('id'), suma=Sum('calificacion'))
+    for fila in totales.iterator():
+        Libro.objects.filter(id=fila['libro_id']).update(
+            num_resenas=fila['num'],
+            suma_calificaciones=fila['suma'],
+            promedio_calificacion=fila['suma'] / fila['num'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0003_indice_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='num_resenas',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de reseñas'),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='promedio_calificacion',
+            field=models.FloatField(default=0, editable=False, verbose_name='Calificación promedio'),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='suma_calificaciones',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='libro',
+            index=models.Index(fields=['-promedio_calificacion', '-num_resenas', 'id'], name='libro_orden_calificacion'),
+        ),
+        migrations.RunPython(calcular_calificaciones, migrations.RunPython.noop),
+    ]
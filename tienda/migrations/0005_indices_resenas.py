@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0004_calificaciones_libro'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(fields=['-fecha', '-id'], name='resena_orden_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(fields=['libro', '-fecha', '-id'], name='resena_libro_fecha'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 6.0 on 2026-10-18 14:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def calcular_ventas(apps, schema_editor):
+    # Igual que ventas.reconstruir_ventas(), con los modelos históricos
+    Pedido = apps.get_model('tienda', 'Pedido')
+    ItemPedido = apps.get_model('tienda', 'ItemPedido')
+    VentaDiaria = apps.get_model('tienda', 'VentaDiaria')
+    VentaDiariaLibro = apps.get_model('tienda', 'VentaDiariaLibro')
+
+    pedidos = (
+        Pedido.objects.annotate(dia=TruncDate('fecha_pedido')).values('dia', 'estado')
+        .annotate(num=Count('id'), st=Sum('subtotal'), imp=Sum('impuestos'), tot=Sum('total_final')).order_by()
+    )
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(fecha=f['dia'], estado=f['estado'], pedidos=f['num'], subtotal=f['st'], impuestos=f['imp'], total=f['tot'])
+        for f in pedidos
+    ], batch_size=1000)
+
+    items = (
+        ItemPedido.objects.annotate(dia=TruncDate('pedido__fecha_pedido'))
+        .values('dia', 'pedido__estado', 'libro_id', 'libro__coleccion_id')
+        .annotate(
+            unidades=Sum('cantidad'),
+            ingresos=Sum(F('cantidad') * F('precio_unitario'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+            num=Count('id'),
+        ).order_by()
+    )
+    VentaDiariaLibro.objects.bulk_create([
+        VentaDiariaLibro(
+            fecha=f['dia'], estado=f['pedido__estado'], libro_id=f['libro_id'], coleccion_id=f['libro__coleccion_id'],
+            unidades=f['unidades'], ingresos=f['ingresos'], lineas=f['num'],
+        )
+        for f in items
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0006_indice_pedidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente de Pago'), ('pagado', 'Pagado'), ('enviado', 'Enviado')], max_length=20)),
+                ('pedidos', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('impuestos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado'), name='venta_diaria_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaLibro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente de Pago'), ('pagado', 'Pagado'), ('enviado', 'Enviado')], max_length=20)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('lineas', models.IntegerField(default=0)),
+                ('coleccion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.coleccion')),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.libro')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado', 'libro'), name='venta_diaria_libro_unica')],
+            },
+        ),
+        migrations.RunPython(calcular_ventas, migrations.RunPython.noop),
+    ]
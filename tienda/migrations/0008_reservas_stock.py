@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0007_ventas_diarias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('expira', models.DateTimeField()),
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reserva', to='tienda.itemcarrito')),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='tienda.libro')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['libro', 'expira'], name='reserva_libro_expira'), models.Index(fields=['expira'], name='reserva_expira')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0008_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autor',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='coleccion',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='resena',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
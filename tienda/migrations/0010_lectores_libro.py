@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 14:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def calcular_lectores(apps, schema_editor):
+    # Igual que servicios.reconstruir_lectores(), con los modelos históricos
+    ItemPedido = apps.get_model('tienda', 'ItemPedido')
+    Resena = apps.get_model('tienda', 'Resena')
+    LectorLibro = apps.get_model('tienda', 'LectorLibro')
+
+    lectores = {}
+    for par in ItemPedido.objects.values_list('pedido__usuario_id', 'libro_id').distinct():
+        lectores[par] = LectorLibro(usuario_id=par[0], libro_id=par[1], compro=True)
+    for par in Resena.objects.values_list('usuario_id', 'libro_id').distinct():
+        lectores.setdefault(par, LectorLibro(usuario_id=par[0], libro_id=par[1])).resenado = True
+    LectorLibro.objects.bulk_create(lectores.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0009_marcas_actualizacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LectorLibro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('compro', models.BooleanField(default=False)),
+                ('resenado', models.BooleanField(default=False)),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.libro')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'libro'), name='lector_libro_unico')],
+            },
+        ),
+        migrations.RunPython(calcular_lectores, migrations.RunPython.noop),
+    ]
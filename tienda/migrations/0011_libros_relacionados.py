@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 14:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0010_lectores_libro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibroRelacionado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('veces', models.PositiveIntegerField()),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relacionados', to='tienda.libro')),
+                ('relacionado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relacionado_en', to='tienda.libro')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('libro', 'posicion'), name='libro_relacionado_posicion')],
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+# Anchos generados para cada imagen (1x y 2x de las tarjetas)
+ANCHOS_MINIATURA = (160, 320, 640)
+
+# Formato -> (extensión, opciones de Pillow)
+FORMATOS_MINIATURA = {
+    'WEBP': ('webp', {'quality': 80, 'method': 6}),
+    'JPEG': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Rutas que ya se comprobó que existen en disco (los nombres de las subidas no se reutilizan)
+_existentes = set()
+
+
+def ruta_miniatura(nombre, ancho, formato):
+    # libros/portada.jpg -> libros/miniaturas/portada-320.webp
+    carpeta, archivo = posixpath.split(nombre)
+    base = posixpath.splitext(archivo)[0]
+    extension = FORMATOS_MINIATURA[formato][0]
+    return posixpath.join(carpeta, 'miniaturas', f'{base}-{ancho}.{extension}')
+
+
+def miniaturas_listas(campo):
+    ruta = ruta_miniatura(campo.name, ANCHOS_MINIATURA[-1], 'JPEG')
+    if ruta in _existentes:
+        return True
+    if campo.storage.exists(ruta):
+        _existentes.add(ruta)
+        return True
+    return False
+
+
+def _para_webp(imagen):
+    if imagen.mode in ('RGB', 'RGBA'):
+        return imagen
+    return imagen.convert('RGBA' if 'A' in imagen.getbands() or 'transparency' in imagen.info else 'RGB')
+
+
+def _a_rgb(imagen):
+    # JPEG no admite transparencia: se pone un fondo blanco
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def generar_miniaturas(campo, forzar=False):
+    # `campo` es el FieldFile de un ImageField (libro.imagen, autor.foto, perfil.foto)
+    if not campo or not campo.name:
+        return 0
+    if not forzar and miniaturas_listas(campo):
+        return 0
+
+    almacen = campo.storage
+    with almacen.open(campo.name, 'rb') as archivo:
+        original = ImageOps.exif_transpose(Image.open(archivo))
+        original.load()
+
+    generadas = 0
+    for ancho in ANCHOS_MINIATURA:
+        copia = original.copy()
+        if copia.width > ancho:
+            alto = round(copia.height * ancho / copia.width)
+            copia = copia.resize((ancho, alto), Image.LANCZOS)
+
+        for formato, (extension, opciones) in FORMATOS_MINIATURA.items():
+            imagen = _para_webp(copia) if formato == 'WEBP' else _a_rgb(copia)
+            buffer = BytesIO()
+            imagen.save(buffer, format=formato, **opciones)
+
+            ruta = ruta_miniatura(campo.name, ancho, formato)
+            if almacen.exists(ruta):
+                almacen.delete(ruta)
+            almacen.save(ruta, ContentFile(buffer.getvalue()))
+            generadas += 1
+
+    _existentes.add(ruta_miniatura(campo.name, ANCHOS_MINIATURA[-1], 'JPEG'))
+    return generadas
@@ -1,8 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 
 
 
@@ -10,6 +8,8 @@ class Autor(models.Model):
     nombre = models.CharField(max_length=100, verbose_name="Nombre Completo")
     foto = models.ImageField(upload_to='autores/', verbose_name="Foto del Autor", null=True, blank=True)
     biografia = models.TextField(verbose_name="Biografía", blank=True)
+    # Última modificación, para el ETag y Last-Modified de la API (ver tienda/api.py)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.nombre
@@ -19,6 +19,7 @@ class Coleccion(models.Model):
     descripcion = models.TextField(verbose_name="Descripción breve")
     icono = models.CharField(max_length=10, default="📚", verbose_name="Icono (Emoji)")
     color_fondo = models.CharField(max_length=100, default="#800000", verbose_name="Color Hex o CSS")
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.nombre
@@ -34,6 +35,10 @@ class Proveedor(models.Model):
 
 
 
+# Columnas de Libro que mantienen las señales de Resena (ver Libro.save)
+CAMPOS_CALIFICACION = ('num_resenas', 'suma_calificaciones', 'promedio_calificacion')
+
+
 class Libro(models.Model):
     titulo = models.CharField(max_length=200, verbose_name="Título")
     
@@ -48,9 +53,61 @@ class Libro(models.Model):
     imagen = models.ImageField(upload_to='libros/', verbose_name="Imagen del libro", null=True, blank=True)
     es_recomendado = models.BooleanField(default=False, verbose_name="¿Es recomendado?")
 
+    # Agregados de reseñas, mantenidos por las señales de Resena (ver servicios.ajustar_calificaciones)
+    num_resenas = models.PositiveIntegerField(default=0, editable=False, verbose_name="Número de reseñas")
+    suma_calificaciones = models.PositiveIntegerField(default=0, editable=False)
+    promedio_calificacion = models.FloatField(default=0, editable=False, verbose_name="Calificación promedio")
+
+    # Última modificación; de aquí salen el ETag y Last-Modified de la API (ver tienda/api.py).
+    # Los UPDATE masivos no pasan por auto_now y lo asignan a mano.
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-promedio_calificacion', '-num_resenas', 'id'], name='libro_orden_calificacion'),
+        ]
+
     def __str__(self):
         return self.titulo
 
+    def save(self, *args, **kwargs):
+        # Los agregados de reseñas solo los cambia un UPDATE con F() (ajustar_calificaciones,
+        # reconciliar_calificaciones). Un save() completo desde un formulario o el admin
+        # escribiría los valores que leyó y pisaría una reseña publicada mientras tanto.
+        if not self._state.adding and not kwargs.get('force_insert'):
+            campos = kwargs.get('update_fields')
+            if campos is None:
+                diferidos = self.get_deferred_fields()
+                campos = [
+                    campo.name for campo in self._meta.concrete_fields
+                    if not campo.primary_key and campo.attname not in diferidos
+                ]
+            campos = [campo for campo in campos if campo not in CAMPOS_CALIFICACION]
+            # auto_now solo se escribe si `actualizado` está en update_fields: sin él la
+            # API seguiría dando el mismo ETag y los clientes revalidarían a un 304 viejo
+            if campos and 'actualizado' not in campos:
+                campos.append('actualizado')
+            kwargs['update_fields'] = campos
+        super().save(*args, **kwargs)
+
+
+
+class LibroRelacionado(models.Model):
+    # "Quienes compraron este libro también compraron": los libros que más veces aparecen
+    # en los mismos pedidos que `libro`. Lo recalcula manage.py calcular_relacionados.
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='relacionados')
+    relacionado = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='relacionado_en')
+    posicion = models.PositiveSmallIntegerField()
+    veces = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['libro', 'posicion'], name='libro_relacionado_posicion'),
+        ]
+
+    def __str__(self):
+        return f"libro {self.libro_id} -> {self.relacionado_id} ({self.veces})"
+
 
 
 class Perfil(models.Model):
@@ -84,6 +141,23 @@ class ItemCarrito(models.Model):
     def subtotal(self):
         return self.libro.precio * self.cantidad
 
+class Reserva(models.Model):
+    # Unidades apartadas para un item del carrito hasta `expira` (ver servicios.reservar)
+    item = models.OneToOneField(ItemCarrito, on_delete=models.CASCADE, related_name='reserva')
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Suma de reservas vigentes por libro, y barrido de vencidas
+            models.Index(fields=['libro', 'expira'], name='reserva_libro_expira'),
+            models.Index(fields=['expira'], name='reserva_expira'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x libro {self.libro_id} hasta {self.expira}"
+
 
 
 class Pedido(models.Model):
@@ -104,6 +178,12 @@ class Pedido(models.Model):
     
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
 
+    class Meta:
+        # Panel de pedidos y exportaciones por rango de fechas
+        indexes = [
+            models.Index(fields=['-fecha_pedido', '-id'], name='pedido_orden_fecha'),
+        ]
+
     def __str__(self):
         return f"Pedido #{self.id} - {self.usuario.username}"
 
@@ -117,6 +197,42 @@ class ItemPedido(models.Model):
         return f"{self.cantidad} x {self.libro.titulo}"
 
 
+# Resúmenes diarios de ventas, mantenidos por tienda/ventas.py. El panel de ventas
+# lee solo de aquí, sin recorrer Pedido ni ItemPedido.
+class VentaDiaria(models.Model):
+    fecha = models.DateField()
+    estado = models.CharField(max_length=20, choices=Pedido.ESTADOS)
+    pedidos = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    impuestos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'estado'], name='venta_diaria_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado}: {self.pedidos} pedidos"
+
+class VentaDiariaLibro(models.Model):
+    fecha = models.DateField()
+    estado = models.CharField(max_length=20, choices=Pedido.ESTADOS)
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='+')
+    coleccion = models.ForeignKey(Coleccion, on_delete=models.CASCADE, related_name='+')
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    lineas = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'estado', 'libro'], name='venta_diaria_libro_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado} libro {self.libro_id}: {self.unidades}"
+
+
 
 class Resena(models.Model):
     libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='resenas')
@@ -130,18 +246,31 @@ class Resena(models.Model):
     ], verbose_name="Calificación")
     comentario = models.TextField(verbose_name="Tu opinión")
     fecha = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # El feed de reseñas se pagina por (fecha, id), global y por libro
+        indexes = [
+            models.Index(fields=['-fecha', '-id'], name='resena_orden_fecha'),
+            models.Index(fields=['libro', '-fecha', '-id'], name='resena_libro_fecha'),
+        ]
 
     def __str__(self):
         return f"{self.usuario.username} - {self.libro.titulo}"
 
+class LectorLibro(models.Model):
+    # Una fila por usuario y libro que compró o reseñó. Responde "¿puede opinar?" con
+    # una búsqueda en el índice único (ver servicios.estado_lector); la mantienen
+    # confirmar_pedido y las señales de ItemPedido y Resena.
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    libro = models.ForeignKey(Libro, on_delete=models.CASCADE, related_name='+')
+    compro = models.BooleanField(default=False)
+    resenado = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'libro'], name='lector_libro_unico'),
+        ]
 
-@receiver(post_save, sender=User)
-def crear_datos_usuario(sender, instance, created, **kwargs):
-    if created:
-        Carrito.objects.create(usuario=instance)
-        Perfil.objects.create(usuario=instance)
-
-@receiver(post_save, sender=User)
-def guardar_datos_usuario(sender, instance, **kwargs):
-    instance.perfil.save()
\ No newline at end of file
+    def __str__(self):
+        return f"usuario {self.usuario_id} / libro {self.libro_id}"
@@ -0,0 +1,54 @@
+from django.db import connection, transaction
+
+from .cache_etiquetas import invalidar_al_confirmar
+from .consultas import ESTADOS_COBRADOS
+from .models import ItemPedido, LibroRelacionado, Pedido
+
+
+RELACIONADOS_POR_LIBRO = 8
+TAMANO_LOTE_RELACIONADOS = 5000
+
+# Matriz de co-ocurrencia dispersa: una fila por par de libros distintos que aparecen
+# en el mismo pedido cobrado, con cuántos pedidos los tienen a ambos. La base hace el
+# JOIN y el GROUP BY (usa el índice de pedido_id); a Python solo llegan los pares.
+SQL_PARES = f"""
+    SELECT a.libro_id, b.libro_id, COUNT(DISTINCT a.pedido_id) AS veces
+    FROM {ItemPedido._meta.db_table} a
+    JOIN {ItemPedido._meta.db_table} b ON b.pedido_id = a.pedido_id AND b.libro_id <> a.libro_id
+    JOIN {Pedido._meta.db_table} p ON p.id = a.pedido_id
+    WHERE p.estado IN ({', '.join(['%s'] * len(ESTADOS_COBRADOS))})
+    GROUP BY a.libro_id, b.libro_id
+    HAVING COUNT(DISTINCT a.pedido_id) >= %s
+    ORDER BY a.libro_id, veces DESC, b.libro_id
+"""
+
+
+def pares_comprados_juntos(minimo=1, tamano_lote=TAMANO_LOTE_RELACIONADOS):
+    # (libro_id, otro_libro_id, veces), agrupados por libro y del más al menos frecuente
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_PARES, [*ESTADOS_COBRADOS, minimo])
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                return
+            yield from filas
+
+
+def calcular_relacionados(top=RELACIONADOS_POR_LIBRO, minimo=1, tamano_lote=TAMANO_LOTE_RELACIONADOS):
+    # Se queda con los `top` primeros de cada libro y reemplaza la tabla completa en una
+    # transacción (las páginas nunca ven la tabla a medio llenar). Devuelve
+    # (libros con relacionados, filas guardadas).
+    nuevos = []
+    libro_actual, posicion = None, 0
+    for libro_id, otro_id, veces in pares_comprados_juntos(minimo, tamano_lote):
+        if libro_id != libro_actual:
+            libro_actual, posicion = libro_id, 0
+        if posicion < top:
+            nuevos.append(LibroRelacionado(libro_id=libro_id, relacionado_id=otro_id, posicion=posicion, veces=veces))
+            posicion += 1
+
+    with transaction.atomic():
+        LibroRelacionado.objects.all().delete()
+        LibroRelacionado.objects.bulk_create(nuevos, batch_size=tamano_lote)
+        invalidar_al_confirmar('relacionados')
+    return len({fila.libro_id for fila in nuevos}), len(nuevos)
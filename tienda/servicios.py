@@ -0,0 +1,346 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from . import ventas
+from .cache_etiquetas import invalidar_al_confirmar
+from .models import Libro, Carrito, ItemCarrito, Perfil, Pedido, ItemPedido, Resena, Reserva, LectorLibro
+
+
+TASA_IMPUESTO = Decimal('0.16')
+
+TAMANO_LOTE_RESERVAS = 1000
+
+# "¿Compró / reseñó este libro?" por usuario y libro (ver estado_lector)
+SEGUNDOS_CACHE_LECTOR = 3600
+
+
+class CarritoVacio(Exception):
+    pass
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, libro):
+        self.libro = libro
+        super().__init__(f"No hay suficiente stock de {libro}.")
+
+
+def items_de_carrito(carrito):
+    return list(carrito.items.select_related('libro'))
+
+
+def calcular_totales(items):
+    subtotal = sum((item.libro.precio * item.cantidad for item in items), Decimal('0'))
+    impuestos = subtotal * TASA_IMPUESTO
+    return subtotal, impuestos, subtotal + impuestos
+
+
+def _cantidad_pedida(cantidades):
+    return Case(
+        *[When(id=libro_id, then=Value(cantidad)) for libro_id, cantidad in cantidades.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _apartado_por_otros(carrito, ahora):
+    # Unidades de cada libro que tienen reservadas (y vigentes) otros carritos
+    otras = (
+        Reserva.objects.filter(libro=OuterRef('pk'), expira__gt=ahora)
+        .exclude(item__carrito=carrito)
+        .values('libro').annotate(total=Sum('cantidad')).values('total')
+    )
+    return Coalesce(Subquery(otras, output_field=IntegerField()), 0)
+
+
+def _descontar_stock(cantidades, carrito, ahora):
+    # Un solo UPDATE condicional para todo el carrito:
+    #   UPDATE libro SET stock = stock - <pedido>
+    #   WHERE id IN (...) AND stock >= <pedido> + <reservado por otros carritos>
+    # Si alguna fila no se actualiza es que le faltó stock. Las reservas propias se
+    # convierten en venta en la misma transacción (se borran con el carrito).
+    pedida = _cantidad_pedida(cantidades)
+    actualizados = Libro.objects.filter(
+        id__in=cantidades, stock__gte=pedida + _apartado_por_otros(carrito, ahora)
+    ).update(stock=F('stock') - pedida, actualizado=ahora)
+    return actualizados == len(cantidades)
+
+
+@transaction.atomic
+def confirmar_pedido(usuario, carrito, direccion_envio, metodo_pago):
+    # Se vuelve a leer el carrito dentro de la transacción; el número de consultas
+    # no depende de cuántos libros tenga.
+    items = items_de_carrito(carrito)
+    if not items:
+        raise CarritoVacio()
+
+    cantidades = {}
+    for item in items:
+        cantidades[item.libro_id] = cantidades.get(item.libro_id, 0) + item.cantidad
+
+    ahora = timezone.now()
+    punto = transaction.savepoint()
+    if not _descontar_stock(cantidades, carrito, ahora):
+        # Se deshace el UPDATE parcial antes de averiguar qué libro faltó
+        transaction.savepoint_rollback(punto)
+        faltante = Libro.objects.filter(
+            id__in=cantidades, stock__lt=_cantidad_pedida(cantidades) + _apartado_por_otros(carrito, ahora)
+        ).values_list('titulo', flat=True).first()
+        raise StockInsuficiente(faltante)
+    transaction.savepoint_commit(punto)
+
+    # El stock (y la etiqueta AGOTADO) se ve en la ficha y en las tarjetas: las páginas
+    # que muestran estos libros llevan libro:<id>
+    invalidar_al_confirmar(*[f'libro:{libro_id}' for libro_id in cantidades])
+
+    subtotal, impuestos, total = calcular_totales(items)
+    pedido = Pedido.objects.create(
+        usuario=usuario,
+        direccion_envio=direccion_envio,
+        metodo_pago=metodo_pago,
+        subtotal=subtotal,
+        impuestos=impuestos,
+        total_final=total,
+        estado='pagado'
+    )
+
+    ItemPedido.objects.bulk_create([
+        ItemPedido(pedido=pedido, libro=item.libro, cantidad=item.cantidad, precio_unitario=item.libro.precio)
+        for item in items
+    ])
+    # bulk_create no dispara señales: las líneas se suman al resumen de ventas aquí
+    ventas.sumar_lineas(pedido, [
+        (item.libro_id, item.libro.coleccion_id, item.cantidad, item.libro.precio) for item in items
+    ])
+
+    marcar_comprados(usuario.id, cantidades)
+
+    ItemCarrito.objects.filter(carrito=carrito).delete()
+    return pedido
+
+
+# ==========================================
+# PERFIL Y CARRITO DEL USUARIO (SE CREAN AL USARLOS)
+# ==========================================
+# Registrarse o iniciar sesión no escribe nada en estas tablas: el carrito aparece
+# al agregar el primer libro y el perfil al guardarlo por primera vez.
+
+def carrito_de(usuario, crear=False):
+    # Sin crear: el carrito existente o None (ver el carrito no lo crea)
+    if crear:
+        return Carrito.objects.get_or_create(usuario=usuario)[0]
+    return Carrito.objects.filter(usuario=usuario).first()
+
+
+def perfil_de(usuario, crear=False):
+    # Sin crear: el perfil guardado o uno vacío sin guardar, para mostrar y editar
+    if crear:
+        return Perfil.objects.get_or_create(usuario=usuario)[0]
+    return Perfil.objects.filter(usuario=usuario).first() or Perfil(usuario=usuario)
+
+
+# ==========================================
+# RESERVAS DE STOCK DEL CARRITO
+# ==========================================
+
+def _vencimiento(ahora):
+    return ahora + timedelta(minutes=settings.RESERVA_MINUTOS)
+
+
+def disponible_para_venta(libro, excluir_item=None, ahora=None):
+    # Stock menos lo que otros carritos tienen apartado y vigente
+    reservas = Reserva.objects.filter(libro=libro, expira__gt=ahora or timezone.now())
+    if excluir_item is not None:
+        reservas = reservas.exclude(item=excluir_item)
+    return libro.stock - (reservas.aggregate(total=Sum('cantidad'))['total'] or 0)
+
+
+@transaction.atomic
+def reservar(carrito, libro_id, delta=1):
+    # Suma `delta` unidades al item del carrito (o lo crea) y deja apartado el total
+    # por RESERVA_MINUTOS. Se bloquea la fila del libro para que dos clientes no
+    # aparten la misma última unidad (en SQLite, que no tiene bloqueo por fila, lo
+    # hace transaction_mode IMMEDIATE). Devuelve el item, o None si quedó en cero.
+    libro = Libro.objects.select_for_update().only('id', 'titulo', 'stock', 'precio').get(id=libro_id)
+    item = ItemCarrito.objects.filter(carrito=carrito, libro=libro).first()
+    if item is not None:
+        item.libro = libro
+    cantidad = (item.cantidad if item else 0) + delta
+
+    if cantidad <= 0:
+        if item is not None:
+            item.delete()  # la reserva se va en cascada
+        return None
+
+    ahora = timezone.now()
+    if delta < 0:
+        # Devolver unidades nunca falla; tampoco alarga una reserva ya vencida
+        item.cantidad = cantidad
+        item.save(update_fields=['cantidad'])
+        Reserva.objects.filter(item=item).update(cantidad=cantidad)
+        return item
+
+    if cantidad > disponible_para_venta(libro, excluir_item=item, ahora=ahora):
+        raise StockInsuficiente(libro.titulo)
+
+    if item is None:
+        item = ItemCarrito.objects.create(carrito=carrito, libro=libro, cantidad=cantidad)
+    else:
+        item.cantidad = cantidad
+        item.save(update_fields=['cantidad'])
+    item.reserva, _ = Reserva.objects.update_or_create(
+        item=item, defaults={'libro': libro, 'cantidad': cantidad, 'expira': _vencimiento(ahora)}
+    )
+    return item
+
+
+def resumen_carrito(usuario):
+    # Unidades y total del carrito en una sola consulta (para el contador y la API)
+    totales = ItemCarrito.objects.filter(carrito__usuario=usuario).aggregate(
+        unidades=Sum('cantidad'), total=Sum(F('cantidad') * F('libro__precio')),
+    )
+    return totales['unidades'] or 0, Decimal(totales['total'] or 0).quantize(Decimal('0.01'))
+
+
+def renovar_reservas(carrito):
+    # Quien sigue activo en el carrito o el checkout conserva lo apartado. Las ya
+    # vencidas no se renuevan: ese stock pudo pasar a otro cliente.
+    ahora = timezone.now()
+    return Reserva.objects.filter(item__carrito=carrito, expira__gt=ahora).update(expira=_vencimiento(ahora))
+
+
+def liberar_reservas_vencidas(tamano_lote=TAMANO_LOTE_RESERVAS):
+    # Borra por lotes para no bloquear la tabla con un DELETE enorme
+    ahora = timezone.now()
+    liberadas = 0
+    while True:
+        ids = list(Reserva.objects.filter(expira__lte=ahora).values_list('id', flat=True)[:tamano_lote])
+        if not ids:
+            return liberadas
+        liberadas += Reserva.objects.filter(id__in=ids).delete()[0]
+
+
+# ==========================================
+# LIBROS COMPRADOS Y RESEÑADOS POR USUARIO
+# ==========================================
+
+def _clave_lector(usuario_id, libro_id):
+    return f'lector:{usuario_id}:{libro_id}'
+
+
+def _olvidar_lectores(usuario_id, libro_ids):
+    claves = [_clave_lector(usuario_id, libro_id) for libro_id in libro_ids]
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def estado_lector(usuario_id, libro_id):
+    # (compró, ya reseñó). Desde la caché, o una búsqueda en el índice único de LectorLibro
+    clave = _clave_lector(usuario_id, libro_id)
+    estado = cache.get(clave)
+    if estado is None:
+        estado = LectorLibro.objects.filter(usuario_id=usuario_id, libro_id=libro_id).values_list(
+            'compro', 'resenado'
+        ).first() or (False, False)
+        cache.set(clave, estado, SEGUNDOS_CACHE_LECTOR)
+    return estado
+
+
+def marcar_comprados(usuario_id, libro_ids):
+    # Checkout: un solo INSERT ... ON CONFLICT que no toca `resenado`
+    LectorLibro.objects.bulk_create(
+        [LectorLibro(usuario_id=usuario_id, libro_id=libro_id, compro=True) for libro_id in libro_ids],
+        update_conflicts=True, unique_fields=['usuario', 'libro'], update_fields=['compro'],
+    )
+    _olvidar_lectores(usuario_id, libro_ids)
+
+
+def actualizar_lectores(usuario_id, libro_ids):
+    # Recalcula las filas de esos libros desde ItemPedido y Resena (ediciones y borrados
+    # sueltos, vía señales)
+    libro_ids = set(libro_ids)
+    compras = set(ItemPedido.objects.filter(pedido__usuario_id=usuario_id, libro_id__in=libro_ids)
+                  .values_list('libro_id', flat=True))
+    resenas = set(Resena.objects.filter(usuario_id=usuario_id, libro_id__in=libro_ids)
+                  .values_list('libro_id', flat=True))
+    LectorLibro.objects.filter(usuario_id=usuario_id, libro_id__in=libro_ids - compras - resenas).delete()
+    LectorLibro.objects.bulk_create(
+        [
+            LectorLibro(usuario_id=usuario_id, libro_id=libro_id, compro=libro_id in compras, resenado=libro_id in resenas)
+            for libro_id in compras | resenas
+        ],
+        update_conflicts=True, unique_fields=['usuario', 'libro'], update_fields=['compro', 'resenado'],
+    )
+    _olvidar_lectores(usuario_id, libro_ids)
+
+
+def reconstruir_lectores(tamano_lote=1000):
+    # Para cargas masivas que no pasan por señales (generar_datos). Devuelve cuántas filas quedaron.
+    lectores = {}
+    for par in ItemPedido.objects.values_list('pedido__usuario_id', 'libro_id').distinct().iterator():
+        lectores[par] = LectorLibro(usuario_id=par[0], libro_id=par[1], compro=True)
+    for par in Resena.objects.values_list('usuario_id', 'libro_id').distinct().iterator():
+        lectores.setdefault(par, LectorLibro(usuario_id=par[0], libro_id=par[1])).resenado = True
+    with transaction.atomic():
+        anteriores = set(LectorLibro.objects.values_list('usuario_id', 'libro_id').iterator())
+        LectorLibro.objects.all().delete()
+        LectorLibro.objects.bulk_create(lectores.values(), batch_size=tamano_lote)
+    # Se descartan de la caché los pares que existían antes y los de ahora
+    cache.delete_many([_clave_lector(usuario_id, libro_id) for usuario_id, libro_id in anteriores | set(lectores)])
+    return len(lectores)
+
+
+# ==========================================
+# CALIFICACIONES DE LIBROS
+# ==========================================
+
+def ajustar_calificaciones(libro_id, delta_num, delta_suma):
+    # Un UPDATE atómico; en SQL el lado derecho usa los valores previos de la fila,
+    # así que el promedio se calcula con los totales ya ajustados.
+    num_nuevo = F('num_resenas') + delta_num
+    suma_nueva = F('suma_calificaciones') + delta_suma
+    Libro.objects.filter(id=libro_id).update(
+        actualizado=timezone.now(),
+        num_resenas=num_nuevo,
+        suma_calificaciones=suma_nueva,
+        promedio_calificacion=Case(
+            When(num_resenas__lte=-delta_num, then=Value(0.0)),
+            default=Cast(suma_nueva, FloatField()) / num_nuevo,
+            output_field=FloatField(),
+        ),
+    )
+
+
+def reconciliar_calificaciones(tamano_lote=1000):
+    # Recalcula los agregados desde las reseñas y corrige solo los libros desfasados.
+    # Devuelve cuántos libros se corrigieron.
+    reales = {
+        fila['libro_id']: (fila['num'], fila['suma'])
+        for fila in Resena.objects.values('libro_id').annotate(num=Count('id'), suma=Sum('calificacion')).iterator()
+    }
+
+    corregidos = 0
+    lote = []
+    campos = ['num_resenas', 'suma_calificaciones', 'promedio_calificacion', 'actualizado']
+    ahora = timezone.now()
+    libros = Libro.objects.only('id', 'num_resenas', 'suma_calificaciones', 'promedio_calificacion')
+    for libro in libros.iterator(chunk_size=tamano_lote):
+        num, suma = reales.get(libro.id, (0, 0))
+        promedio = suma / num if num else 0.0
+        if (libro.num_resenas, libro.suma_calificaciones) != (num, suma) or abs(libro.promedio_calificacion - promedio) > 1e-9:
+            libro.num_resenas, libro.suma_calificaciones, libro.promedio_calificacion = num, suma, promedio
+            libro.actualizado = ahora
+            lote.append(libro)
+        if len(lote) >= tamano_lote:
+            Libro.objects.bulk_update(lote, campos)
+            corregidos += len(lote)
+            lote = []
+
+    if lote:
+        Libro.objects.bulk_update(lote, campos)
+        corregidos += len(lote)
+    return corregidos
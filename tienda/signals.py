@@ -0,0 +1,270 @@
+import logging
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import busqueda, ventas
+from .cache_etiquetas import etiquetas_listados, invalidar_al_confirmar
+from .miniaturas import generar_miniaturas
+from .servicios import actualizar_lectores, ajustar_calificaciones
+from .models import Libro, Autor, Coleccion, Perfil, Proveedor, Resena, Pedido, ItemPedido
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# ÍNDICE DE BÚSQUEDA (FTS5)
+# ==========================================
+
+@receiver(post_save, sender=Libro)
+def indexar_libro(sender, instance, **kwargs):
+    busqueda.indexar_libro(instance.id)
+
+@receiver(post_delete, sender=Libro)
+def desindexar_libro(sender, instance, **kwargs):
+    busqueda.quitar_libro(instance.id)
+
+@receiver(post_save, sender=Autor)
+def reindexar_autor(sender, instance, created, **kwargs):
+    if not created:
+        busqueda.indexar_autor(instance.id)
+
+@receiver(post_save, sender=Coleccion)
+def reindexar_coleccion(sender, instance, created, **kwargs):
+    if not created:
+        busqueda.indexar_coleccion(instance.id)
+
+
+# ==========================================
+# MARCAS DE ACTUALIZACIÓN (ETAG DE LA API)
+# ==========================================
+# La API muestra el nombre del autor y de la colección dentro de cada libro: si
+# cambian, esos libros cuentan como modificados.
+
+@receiver(post_save, sender=Autor)
+def tocar_libros_autor(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        Libro.objects.filter(autor_id=instance.id).update(actualizado=instance.actualizado)
+
+@receiver(post_save, sender=Coleccion)
+def tocar_libros_coleccion(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        Libro.objects.filter(coleccion_id=instance.id).update(actualizado=instance.actualizado)
+
+
+# ==========================================
+# MINIATURAS DE IMÁGENES
+# ==========================================
+
+@receiver(post_save, sender=Libro)
+@receiver(post_save, sender=Autor)
+@receiver(post_save, sender=Perfil)
+def crear_miniaturas(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    campo = instance.imagen if sender is Libro else instance.foto
+    try:
+        generar_miniaturas(campo)
+    except (OSError, ValueError):
+        # Una imagen ilegible no debe impedir guardar el registro; se muestra la original
+        logger.exception("No se pudieron generar miniaturas de %s", campo.name)
+
+
+# ==========================================
+# INVALIDACIÓN DE CACHÉ POR ETIQUETAS
+# ==========================================
+
+@receiver(pre_save, sender=Libro)
+def recordar_libro_anterior(sender, instance, raw=False, **kwargs):
+    # Para saber de qué listados sale el libro si cambia de colección, autor o recomendado
+    instance._listados_anteriores = None
+    if instance.pk and not raw:
+        instance._listados_anteriores = (
+            Libro.objects.filter(pk=instance.pk).values('coleccion_id', 'autor_id', 'es_recomendado').first()
+        )
+
+@receiver(post_save, sender=Libro)
+@receiver(post_delete, sender=Libro)
+def invalidar_cache_libro(sender, instance, created=None, **kwargs):
+    # Editar un libro (precio, stock, título...) solo invalida las páginas que lo muestran.
+    # Los listados se invalidan enteros solo si el libro entra o sale de ellos.
+    etiquetas = {f'libro:{instance.id}'}
+    actuales = etiquetas_listados(instance.coleccion_id, instance.autor_id, instance.es_recomendado)
+    anterior = getattr(instance, '_listados_anteriores', None)
+    if created is not False or anterior is None:
+        # Alta o baja: cambian también las novedades y los conteos por autor
+        etiquetas.update(actuales, ['libros'])
+    else:
+        previas = etiquetas_listados(**anterior)
+        if previas != actuales:
+            etiquetas.update(previas, actuales)
+        if anterior['autor_id'] != instance.autor_id:
+            etiquetas.add('libros')
+    invalidar_al_confirmar(*etiquetas)
+
+@receiver(post_save, sender=Autor)
+@receiver(post_delete, sender=Autor)
+def invalidar_cache_autor(sender, instance, **kwargs):
+    invalidar_al_confirmar(f'autor:{instance.id}', 'autores')
+
+@receiver(post_save, sender=Coleccion)
+@receiver(post_delete, sender=Coleccion)
+def invalidar_cache_coleccion(sender, instance, **kwargs):
+    # También refresca el menú de colecciones (context_processors.py)
+    invalidar_al_confirmar('colecciones')
+
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def invalidar_cache_proveedor(sender, instance, **kwargs):
+    invalidar_al_confirmar(f'proveedor:{instance.id}')
+
+@receiver(post_save, sender=Resena)
+@receiver(post_delete, sender=Resena)
+def invalidar_cache_resenas(sender, instance, **kwargs):
+    # El promedio aparece en la ficha y en las tarjetas (libro:<id>), y ordena el
+    # catálogo por mejor valorados
+    etiquetas = [f'resenas:libro:{instance.libro_id}', f'libro:{instance.libro_id}', 'calificaciones']
+    anterior = getattr(instance, '_anterior', None)
+    if anterior and anterior['libro_id'] != instance.libro_id:
+        etiquetas += [f'resenas:libro:{anterior["libro_id"]}', f'libro:{anterior["libro_id"]}']
+    invalidar_al_confirmar(*etiquetas)
+
+
+# ==========================================
+# CALIFICACIONES AGREGADAS EN LIBRO
+# ==========================================
+
+@receiver(pre_save, sender=Resena)
+def recordar_resena_anterior(sender, instance, raw=False, **kwargs):
+    # Al editar (p. ej. desde editar_resena_admin) hace falta saber qué había antes
+    instance._anterior = None
+    if instance.pk and not raw:
+        instance._anterior = Resena.objects.filter(pk=instance.pk).values('libro_id', 'usuario_id', 'calificacion').first()
+
+@receiver(post_save, sender=Resena)
+def sumar_calificacion(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_anterior', None)
+    if anterior is None:
+        ajustar_calificaciones(instance.libro_id, 1, instance.calificacion)
+    elif anterior['libro_id'] != instance.libro_id:
+        ajustar_calificaciones(anterior['libro_id'], -1, -anterior['calificacion'])
+        ajustar_calificaciones(instance.libro_id, 1, instance.calificacion)
+    elif anterior['calificacion'] != instance.calificacion:
+        ajustar_calificaciones(instance.libro_id, 0, instance.calificacion - anterior['calificacion'])
+
+@receiver(post_delete, sender=Resena)
+def restar_calificacion(sender, instance, **kwargs):
+    ajustar_calificaciones(instance.libro_id, -1, -instance.calificacion)
+
+
+# ==========================================
+# RESÚMENES DIARIOS DE VENTAS
+# ==========================================
+# Las altas masivas (confirmar_pedido crea los ItemPedido con bulk_create) llaman a
+# ventas.sumar_lineas directamente.
+
+@receiver(pre_save, sender=Pedido)
+def recordar_pedido_anterior(sender, instance, raw=False, using=None, **kwargs):
+    # Se mueve desde lo que dice la base, no desde el pedido que se leyó antes. Dentro
+    # de una transacción la fila queda bloqueada hasta el COMMIT: dos cambios de estado
+    # simultáneos no pueden partir del mismo estado anterior (en SQLite lo asegura
+    # transaction_mode IMMEDIATE, ver settings).
+    instance._anterior = None
+    if instance.pk and not raw:
+        consulta = Pedido.objects.using(using).filter(pk=instance.pk)
+        if transaction.get_connection(using).in_atomic_block:
+            consulta = consulta.select_for_update()
+        instance._anterior = consulta.only('fecha_pedido', 'estado', 'subtotal', 'impuestos', 'total_final').first()
+
+@receiver(post_save, sender=Pedido)
+def actualizar_ventas_pedido(sender, instance, created, raw=False, **kwargs):
+    # cambiar_estado_pedido y editar_pedido_completo pasan por aquí
+    if raw:
+        return
+    anterior = getattr(instance, '_anterior', None)
+    if anterior is None:
+        ventas.sumar_pedido(instance)
+        return
+    campos = ('estado', 'subtotal', 'impuestos', 'total_final')
+    if ventas.dia_de(anterior) != ventas.dia_de(instance) or any(
+        getattr(anterior, campo) != getattr(instance, campo) for campo in campos
+    ):
+        ventas.mover_pedido(anterior, instance)
+
+@receiver(pre_delete, sender=Pedido)
+def restar_ventas_pedido(sender, instance, **kwargs):
+    # Antes de borrar: después ya no quedan sus líneas para saber qué restar
+    instance._lineas = ventas.lineas_de_pedido(instance.id)
+    ventas.sumar_pedido(instance, -1)
+    ventas.sumar_lineas(instance, instance._lineas, -1)
+
+def _borrado_directo(origin, modelo):
+    # True si se borró la fila misma (o un queryset de su modelo), no en cascada
+    return isinstance(origin, modelo) or (isinstance(origin, QuerySet) and origin.model is modelo)
+
+def _pedido_actual(pedido_id):
+    # Fecha y estado tal como están en la base (el pedido en memoria puede estar desactualizado)
+    return Pedido.objects.only('fecha_pedido', 'estado', 'usuario').get(id=pedido_id)
+
+@receiver(pre_save, sender=ItemPedido)
+def recordar_item_anterior(sender, instance, raw=False, **kwargs):
+    instance._anterior = None
+    if instance.pk and not raw:
+        instance._anterior = ItemPedido.objects.filter(pk=instance.pk).values_list(
+            'libro_id', 'libro__coleccion_id', 'cantidad', 'precio_unitario'
+        ).first()
+
+@receiver(post_save, sender=ItemPedido)
+def actualizar_ventas_item(sender, instance, raw=False, **kwargs):
+    # Ediciones de líneas sueltas (p. ej. el inline del admin de Django)
+    if raw:
+        return
+    anterior = getattr(instance, '_anterior', None)
+    pedido = _pedido_actual(instance.pedido_id)
+    if anterior:
+        ventas.sumar_lineas(pedido, [anterior], -1)
+    coleccion_id = Libro.objects.values_list('coleccion_id', flat=True).get(id=instance.libro_id)
+    ventas.sumar_lineas(pedido, [(instance.libro_id, coleccion_id, instance.cantidad, instance.precio_unitario)])
+    actualizar_lectores(pedido.usuario_id, {instance.libro_id, anterior[0] if anterior else instance.libro_id})
+
+@receiver(post_delete, sender=ItemPedido)
+def restar_ventas_item(sender, instance, origin=None, **kwargs):
+    # Solo si se borró la línea misma. Si cae en cascada por su pedido, ya la restó
+    # restar_ventas_pedido; si cae por su libro, los resúmenes de ese libro también se borran.
+    if _borrado_directo(origin, ItemPedido):
+        pedido = _pedido_actual(instance.pedido_id)
+        coleccion_id = Libro.objects.values_list('coleccion_id', flat=True).get(id=instance.libro_id)
+        ventas.sumar_lineas(pedido, [(instance.libro_id, coleccion_id, instance.cantidad, instance.precio_unitario)], -1)
+        actualizar_lectores(pedido.usuario_id, [instance.libro_id])
+
+
+# ==========================================
+# LIBROS COMPRADOS Y RESEÑADOS (LectorLibro)
+# ==========================================
+# El checkout llama a servicios.marcar_comprados. Los borrados en cascada por un
+# usuario o un libro se llevan también sus filas de LectorLibro, así que aquí solo
+# se recalcula cuando se borró el pedido o la reseña misma.
+
+@receiver(post_delete, sender=Pedido)
+def actualizar_lectores_pedido(sender, instance, origin=None, **kwargs):
+    lineas = getattr(instance, '_lineas', None)
+    if lineas and _borrado_directo(origin, Pedido):
+        actualizar_lectores(instance.usuario_id, {linea[0] for linea in lineas})
+
+@receiver(post_save, sender=Resena)
+def actualizar_lector_resena(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actualizar_lectores(instance.usuario_id, [instance.libro_id])
+    anterior = getattr(instance, '_anterior', None)
+    if anterior and (anterior['usuario_id'], anterior['libro_id']) != (instance.usuario_id, instance.libro_id):
+        actualizar_lectores(anterior['usuario_id'], [anterior['libro_id']])
+
+@receiver(post_delete, sender=Resena)
+def quitar_lector_resena(sender, instance, origin=None, **kwargs):
+    if _borrado_directo(origin, Resena):
+        actualizar_lectores(instance.usuario_id, [instance.libro_id])
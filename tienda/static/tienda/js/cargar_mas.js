@@ -0,0 +1,38 @@
+// Botón "Cargar más" con scroll infinito (ver tienda/_cargar_mas.html). Cada botón
+// lleva el endpoint JSON, el id del contenedor y el cursor de la siguiente página.
+(function() {
+    function activar(boton) {
+        let cargando = false;
+
+        function cargarMas() {
+            if (cargando || !boton.dataset.siguiente) return;
+            cargando = true;
+            boton.textContent = 'Cargando...';
+
+            const separador = boton.dataset.url.includes('?') ? '&' : '?';
+            fetch(boton.dataset.url + separador + 'despues=' + encodeURIComponent(boton.dataset.siguiente))
+                .then(respuesta => respuesta.json())
+                .then(datos => {
+                    document.getElementById(boton.dataset.destino).insertAdjacentHTML('beforeend', datos.html);
+                    boton.dataset.siguiente = datos.siguiente || '';
+                    if (!datos.siguiente) boton.parentElement.remove();
+                })
+                .catch(() => { boton.dataset.error = 'si'; })
+                .finally(() => {
+                    cargando = false;
+                    boton.textContent = 'Cargar más reseñas';
+                });
+        }
+
+        boton.addEventListener('click', cargarMas);
+
+        // Se carga solo al acercarse al final de la lista
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(entradas => {
+                if (entradas[0].isIntersecting && !boton.dataset.error) cargarMas();
+            }, { rootMargin: '200px' }).observe(boton);
+        }
+    }
+
+    document.querySelectorAll('.cargar-mas').forEach(activar);
+})();
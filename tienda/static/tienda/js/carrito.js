@@ -0,0 +1,72 @@
+// Botones del carrito sin recargar la página. Cualquier enlace con data-carrito-api hace
+// POST a esa URL (API JSON) y actualiza el contador, el total y la línea. Si no hay
+// JavaScript o falta la cookie CSRF, el enlace sigue funcionando como siempre.
+(function() {
+    function cookie(nombre) {
+        const par = document.cookie.split('; ').find(fila => fila.startsWith(nombre + '='));
+        return par ? decodeURIComponent(par.split('=')[1]) : null;
+    }
+
+    function avisar(texto, tipo) {
+        const avisos = document.getElementById('avisos-carrito');
+        const aviso = document.createElement('div');
+        aviso.className = 'alert alert-' + tipo;
+        aviso.style.marginTop = '20px';
+        aviso.textContent = texto;
+        avisos.replaceChildren(aviso);
+        setTimeout(() => aviso.remove(), 4000);
+    }
+
+    function actualizar(datos) {
+        document.getElementById('contador-carrito').textContent = datos.carrito.unidades || '';
+        const total = document.getElementById('total-carrito');
+        if (!total) return;  // fuera de la página del carrito solo cambia el contador
+
+        if (!datos.carrito.unidades) {
+            window.location.reload();  // carrito vacío: se muestra el aviso de la página
+            return;
+        }
+        total.textContent = '$' + datos.carrito.total;
+        if (!datos.item) return;
+        const fila = document.querySelector('[data-item="' + datos.item.id + '"]');
+        fila.querySelector('.cantidad-item').textContent = datos.item.cantidad;
+        fila.querySelector('.subtotal-item').textContent = '$' + datos.item.subtotal;
+        if (datos.item.apartado_hasta) {
+            const apartado = fila.querySelector('.apartado-item');
+            apartado.textContent = 'Apartado hasta las ' + datos.item.apartado_hasta;
+            apartado.style.color = '#2e7d32';
+        }
+    }
+
+    document.addEventListener('click', evento => {
+        const enlace = evento.target.closest('a[data-carrito-api]');
+        const token = cookie('csrftoken');
+        if (!enlace || evento.defaultPrevented || !token) return;
+        evento.preventDefault();
+        if (enlace.dataset.enviando) return;
+        enlace.dataset.enviando = 'si';
+
+        fetch(enlace.dataset.carritoApi, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': token },
+            credentials: 'same-origin',
+        })
+            .then(respuesta => respuesta.json().then(datos => ({ respuesta, datos })))
+            .then(({ respuesta, datos }) => {
+                if (respuesta.status === 401) {
+                    window.location.href = datos.login;
+                } else if (!respuesta.ok) {
+                    avisar(datos.error, 'warning');
+                } else {
+                    if (!datos.item) {
+                        const fila = enlace.closest('[data-item]');
+                        if (fila) fila.remove();
+                    }
+                    actualizar(datos);
+                    avisar(datos.mensaje, 'success');
+                }
+            })
+            .catch(() => { window.location.href = enlace.href; })
+            .finally(() => { delete enlace.dataset.enviando; });
+    });
+})();
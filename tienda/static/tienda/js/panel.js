@@ -0,0 +1,74 @@
+// Cada pestaña pide su tabla al servidor la primera vez que se abre
+function cargarPanel(seccion, url) {
+    const contenedor = seccion.querySelector('.panel-contenido');
+    contenedor.innerHTML = '<p style="color: #888;">Cargando...</p>';
+    seccion.dataset.cargando = 'si';
+    fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(respuesta => {
+            // Con la sesión vencida user_passes_test redirige al inicio: eso no es el panel
+            if (respuesta.redirected) throw new Error('sesion');
+            if (!respuesta.ok) throw new Error(respuesta.status);
+            return respuesta.text();
+        })
+        .then(html => {
+            contenedor.innerHTML = html;
+            seccion.dataset.cargado = 'si';
+        })
+        .catch(error => {
+            // Sin marcar como cargada: al volver a abrir la pestaña se reintenta
+            const mensaje = error.message === 'sesion'
+                ? 'Tu sesión expiró. <a href="">Recarga la página</a> para volver a entrar.'
+                : 'No se pudo cargar la sección.';
+            contenedor.innerHTML = `<p style="color: #dc3545;">${mensaje}</p>`;
+        })
+        .finally(() => { delete seccion.dataset.cargando; });
+}
+
+function mostrarSeccion(id) {
+
+    document.querySelectorAll('.seccion-panel').forEach(div => div.style.display = 'none');
+
+    const seccion = document.getElementById(id);
+    seccion.style.display = 'block';
+
+    if (seccion.dataset.url && !seccion.dataset.cargado && !seccion.dataset.cargando) {
+        cargarPanel(seccion, seccion.dataset.url + window.location.search);
+    }
+
+    document.querySelectorAll('.menu-btn').forEach(btn => btn.classList.remove('active'));
+
+    const btnActivo = document.querySelector(`button[onclick="mostrarSeccion('${id}')"]`);
+    if(btnActivo) btnActivo.classList.add('active');
+}
+
+// Paginación y filtros dentro de un panel: se recarga solo ese panel
+document.addEventListener('click', function(evento) {
+    const enlace = evento.target.closest('.panel-link');
+    if (enlace) {
+        evento.preventDefault();
+        cargarPanel(enlace.closest('.seccion-panel'), enlace.href);
+    }
+});
+
+document.addEventListener('submit', function(evento) {
+    const form = evento.target.closest('form.panel-filtro');
+    if (form) {
+        evento.preventDefault();
+        const parametros = new URLSearchParams(new FormData(form));
+        cargarPanel(form.closest('.seccion-panel'), form.action + '?' + parametros.toString());
+    }
+});
+
+document.addEventListener("DOMContentLoaded", function() {
+
+    const urlParams = new URLSearchParams(window.location.search);
+    const tabActiva = urlParams.get('tab');
+
+    if (tabActiva && document.getElementById(tabActiva)) {
+
+        mostrarSeccion(tabActiva);
+    } else {
+
+        mostrarSeccion('resumen');
+    }
+});
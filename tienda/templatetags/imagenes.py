@@ -0,0 +1,45 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from tienda.miniaturas import ANCHOS_MINIATURA, miniaturas_listas, ruta_miniatura
+
+register = template.Library()
+
+
+def _srcset(campo, formato):
+    return ', '.join(
+        f"{campo.storage.url(ruta_miniatura(campo.name, ancho, formato))} {ancho}w"
+        for ancho in ANCHOS_MINIATURA
+    )
+
+
+# Uso: {% imagen_responsiva libro.imagen alt=libro.titulo sizes="(max-width: 600px) 100vw, 300px" %}
+# Emite un <picture> con WebP y JPEG en varios anchos. Si las miniaturas todavía
+# no existen (p. ej. antes de correr generar_miniaturas) usa la imagen original.
+@register.simple_tag
+def imagen_responsiva(campo, alt='', sizes='100vw', clase='', estilo='', lazy=True):
+    if not campo:
+        return ''
+
+    atributos = [('alt', alt)]
+    if clase:
+        atributos.append(('class', clase))
+    if estilo:
+        atributos.append(('style', estilo))
+    if lazy:
+        atributos.append(('loading', 'lazy'))
+    atributos.append(('decoding', 'async'))
+    extra = format_html_join('', ' {}="{}"', atributos)
+
+    if not miniaturas_listas(campo):
+        return format_html('<img src="{}"{}>', campo.url, extra)
+
+    return format_html(
+        '<picture class="imagen-responsiva">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        '</picture>',
+        _srcset(campo, 'WEBP'), sizes,
+        campo.storage.url(ruta_miniatura(campo.name, ANCHOS_MINIATURA[1], 'JPEG')),
+        _srcset(campo, 'JPEG'), sizes, extra,
+    )
@@ -1,3 +1,929 @@
-from django.test import TestCase
+import copy
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, closing
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
 
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
 
+from . import metricas, servicios
+from .admin import PaginadorEstimado
+from .busqueda import PAGINA_MAXIMA_BUSQUEDA
+from .cache_etiquetas import cache_publica
+from .consultas import ORDEN_RESENAS, TAMANO_PAGINA_CATALOGO, paginar_por_cursor
+from .enrutador import EnrutadorReplicas, lecturas_en_replica, replicas
+from .forms import LibroForm
+from .importacion import importar_catalogo
+from .medios import CACHE_MEDIOS, CACHE_POR_CONTENIDO
+from .models import (
+    Autor, Carrito, Coleccion, ItemCarrito, ItemPedido, Libro, Pedido, Reserva, Resena, VentaDiaria, VentaDiariaLibro,
+)
+from .servicios import (
+    StockInsuficiente, confirmar_pedido, estado_lector, liberar_reservas_vencidas, renovar_reservas, reservar,
+)
+from .ventas import reconstruir_ventas
+
+
+def crear_libros(cantidad=1, **datos):
+    autor = Autor.objects.create(nombre='Autor')
+    coleccion = Coleccion.objects.create(nombre='Colección', descripcion='')
+    return [
+        Libro.objects.create(
+            titulo=f'Libro {numero}', autor=autor, coleccion=coleccion, descripcion='',
+            **{'precio': Decimal('10.00'), 'stock': 5, **datos},
+        )
+        for numero in range(cantidad)
+    ]
+
+
+# ==========================================
+# AGREGADOS DE RESEÑAS
+# ==========================================
+
+class CalificacionesTests(TestCase):
+    def setUp(self):
+        self.libro = crear_libros()[0]
+        self.usuario = User.objects.create_user('lector', password='clave-segura-123')
+
+    def test_editar_libro_mientras_se_publica_una_resena(self):
+        # El formulario lee el libro antes de que llegue la reseña y guarda después
+        leido = Libro.objects.get(id=self.libro.id)
+        Resena.objects.create(libro=self.libro, usuario=self.usuario, calificacion=4, comentario='Bueno')
+
+        form = LibroForm({
+            'titulo': 'Título nuevo', 'autor': leido.autor_id, 'coleccion': leido.coleccion_id,
+            'precio': '12.00', 'stock': 3, 'descripcion': 'x',
+        }, instance=leido)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        libro = Libro.objects.get(id=self.libro.id)
+        self.assertEqual(libro.titulo, 'Título nuevo')
+        self.assertEqual((libro.num_resenas, libro.suma_calificaciones, libro.promedio_calificacion), (1, 4, 4.0))
+
+    def test_save_con_update_fields_no_escribe_los_agregados(self):
+        leido = Libro.objects.get(id=self.libro.id)
+        Resena.objects.create(libro=self.libro, usuario=self.usuario, calificacion=5, comentario='Muy bueno')
+        leido.stock = 1
+        leido.save(update_fields=['stock', 'num_resenas'])
+
+        libro = Libro.objects.get(id=self.libro.id)
+        self.assertEqual((libro.stock, libro.num_resenas), (1, 1))
+
+
+# ==========================================
+# IMPORTACIÓN DE CATÁLOGO
+# ==========================================
+
+class ImportacionTests(TestCase):
+    def test_precio_no_finito_se_reporta_y_se_salta(self):
+        filas = [
+            {'titulo': 'Uno', 'autor': 'A', 'coleccion': 'C', 'precio': 'NaN'},
+            {'titulo': 'Dos', 'autor': 'A', 'coleccion': 'C', 'precio': 'Infinity'},
+            {'titulo': 'Tres', 'autor': 'A', 'coleccion': 'C', 'precio': 'sNaN'},
+            {'titulo': 'Cuatro', 'autor': 'A', 'coleccion': 'C', 'precio': '1e30'},
+            {'titulo': 'Cinco', 'autor': 'A', 'coleccion': 'C', 'precio': '9.99'},
+        ]
+        fallidas = []
+        resumen = importar_catalogo(filas, al_fallar_fila=lambda numero, error: fallidas.append(numero))
+
+        self.assertEqual(resumen['creados'], 1)
+        self.assertEqual(fallidas, [1, 2, 3, 4])
+        self.assertEqual(Libro.objects.get().precio, Decimal('9.99'))
+
+
+# ==========================================
+# CACHÉ DE PÁGINAS POR ETIQUETAS
+# ==========================================
+
+class CachePaginasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.libros = crear_libros(TAMANO_PAGINA_CATALOGO + 5)
+        self.otra = Coleccion.objects.create(nombre='Otra', descripcion='')
+
+    def _estado(self, url):
+        return self.client.get(url)['X-Cache']
+
+    def _guardar(self, libro):
+        with self.captureOnCommitCallbacks(execute=True):
+            libro.save()
+
+    def test_editar_un_libro_solo_invalida_las_paginas_que_lo_muestran(self):
+        primera, otra_coleccion = '/libros/', f'/libros/?coleccion={self.otra.id}'
+        for url in (primera, otra_coleccion):
+            self.client.get(url)
+
+        # El último libro no está en la primera página (orden por id)
+        ultimo = self.libros[-1]
+        ultimo.precio = Decimal('99.00')
+        self._guardar(ultimo)
+        self.assertEqual(self._estado(primera), 'HIT')
+        self.assertEqual(self._estado(otra_coleccion), 'HIT')
+
+        primero = self.libros[0]
+        primero.stock = 0
+        self._guardar(primero)
+        self.assertEqual(self._estado(primera), 'MISS')
+        self.assertEqual(self._estado(otra_coleccion), 'HIT')
+
+        # Cambiar de colección lo saca de un listado y lo mete en el otro
+        primero.coleccion = self.otra
+        self._guardar(primero)
+        self.assertEqual(self._estado(otra_coleccion), 'MISS')
+        self.assertIn(primero.titulo, self.client.get(otra_coleccion).content.decode())
+
+    def test_la_pagina_guardada_conserva_las_cabeceras(self):
+        @cache_publica()
+        def vista(request):
+            respuesta = HttpResponse('hola', content_type='text/plain; charset=utf-8')
+            respuesta['Content-Language'] = 'es'
+            respuesta['Vary'] = 'Accept-Language'
+            return respuesta
+
+        def pedir():
+            request = RequestFactory().get('/prueba/')
+            request.user = AnonymousUser()
+            request._messages = CookieStorage(request)
+            return vista(request)
+
+        self.assertEqual(pedir()['X-Cache'], 'MISS')
+        guardada = pedir()
+        self.assertEqual(guardada['X-Cache'], 'HIT')
+        self.assertEqual(guardada['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual((guardada['Content-Language'], guardada['Vary']), ('es', 'Accept-Language'))
+
+
+# ==========================================
+# PAGINACIÓN POR CURSOR
+# ==========================================
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        libros = crear_libros(11)
+        usuario = User.objects.create_user('lector')
+        Resena.objects.bulk_create([
+            Resena(libro=libro, usuario=usuario, calificacion=5, comentario='') for libro in libros
+        ])
+        # Varias reseñas con la misma fecha: el id desempata
+        ahora = timezone.now()
+        for numero, resena in enumerate(Resena.objects.order_by('id')):
+            Resena.objects.filter(id=resena.id).update(fecha=ahora - datetime.timedelta(days=numero // 4))
+        self.esperado = list(Resena.objects.order_by(*ORDEN_RESENAS).values_list('id', flat=True))
+
+    def _pagina(self, **cursor):
+        return paginar_por_cursor(Resena.objects.all(), ORDEN_RESENAS, tamano=3, **cursor)
+
+    def test_hacia_adelante_y_hacia_atras_con_fechas_repetidas(self):
+        paginas = [self._pagina()]
+        while paginas[-1].hay_siguiente:
+            paginas.append(self._pagina(despues=paginas[-1].cursor_siguiente))
+        self.assertEqual([resena.id for pagina in paginas for resena in pagina], self.esperado)
+        self.assertFalse(paginas[0].hay_anterior)
+
+        atras = [paginas[-1]]
+        while atras[-1].hay_anterior:
+            atras.append(self._pagina(antes=atras[-1].cursor_anterior))
+        self.assertEqual([resena.id for pagina in reversed(atras) for resena in pagina], self.esperado)
+        self.assertEqual([resena.id for resena in atras[-1]], self.esperado[:3])
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        for cursor in ('basura', 'WyJ4IiwgMV0', 'WzFd'):
+            self.assertEqual([resena.id for resena in self._pagina(despues=cursor)], self.esperado[:3])
+
+
+# ==========================================
+# CHECKOUT
+# ==========================================
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.libros = crear_libros(2, stock=2)
+        self.usuario = User.objects.create_user('cliente')
+        self.carrito = Carrito.objects.create(usuario=self.usuario)
+
+    def _agregar(self, libro, cantidad):
+        ItemCarrito.objects.create(carrito=self.carrito, libro=libro, cantidad=cantidad)
+
+    def _confirmar(self):
+        return confirmar_pedido(self.usuario, self.carrito, 'Calle 1', 'tarjeta')
+
+    def _stock(self):
+        return list(Libro.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_el_stock_llega_a_cero(self):
+        self._agregar(self.libros[0], 2)
+        pedido = self._confirmar()
+
+        self.assertEqual(self._stock(), [0, 2])
+        self.assertEqual(pedido.total_final, Decimal('23.20'))
+        self.assertFalse(ItemCarrito.objects.filter(carrito=self.carrito).exists())
+        self.assertEqual(VentaDiariaLibro.objects.get(libro=self.libros[0]).unidades, 2)
+
+    def test_no_se_vende_mas_de_lo_que_hay(self):
+        self._agregar(self.libros[0], 3)
+        with self.assertRaises(StockInsuficiente):
+            self._confirmar()
+        self.assertEqual(self._stock(), [2, 2])
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_lo_apartado_por_otro_carrito_no_se_vende(self):
+        otro = Carrito.objects.create(usuario=User.objects.create_user('otro'))
+        reservar(otro, self.libros[0].id)
+        self._agregar(self.libros[0], 2)
+        with self.assertRaises(StockInsuficiente):
+            self._confirmar()
+        self.assertEqual(self._stock(), [2, 2])
+
+    def test_si_falta_un_libro_no_se_descuenta_ninguno(self):
+        self._agregar(self.libros[0], 1)
+        self._agregar(self.libros[1], 5)
+        with self.assertRaises(StockInsuficiente) as error:
+            self._confirmar()
+
+        self.assertEqual(error.exception.libro, self.libros[1].titulo)
+        self.assertEqual(self._stock(), [2, 2])
+        self.assertEqual(ItemCarrito.objects.filter(carrito=self.carrito).count(), 2)
+        self.assertFalse(Pedido.objects.exists() or VentaDiaria.objects.exists())
+
+
+# ==========================================
+# LIBROS COMPRADOS Y RESEÑADOS POR USUARIO
+# ==========================================
+
+class LectoresTests(TestCase):
+    # Cada paso lee antes el estado para que quede en caché: el cambio debe olvidarlo
+    # al confirmarse la transacción
+    def setUp(self):
+        cache.clear()
+        self.libro = crear_libros()[0]
+        self.usuario = User.objects.create_user('lector')
+
+    def _estado(self):
+        return estado_lector(self.usuario.id, self.libro.id)
+
+    def _confirmado(self, funcion, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return funcion(*args, **kwargs)
+
+    def _comprar(self):
+        carrito = Carrito.objects.create(usuario=self.usuario)
+        ItemCarrito.objects.create(carrito=carrito, libro=self.libro, cantidad=1)
+        return self._confirmado(confirmar_pedido, self.usuario, carrito, 'Calle 1', 'tarjeta')
+
+    def _resenar(self):
+        return self._confirmado(
+            Resena.objects.create, libro=self.libro, usuario=self.usuario, calificacion=5, comentario='',
+        )
+
+    def test_compra_resena_y_borrados(self):
+        self.assertEqual(self._estado(), (False, False))
+        pedido = self._comprar()
+        self.assertEqual(self._estado(), (True, False))
+
+        resena = self._resenar()
+        self.assertEqual(self._estado(), (True, True))
+        self._confirmado(resena.delete)
+        self.assertEqual(self._estado(), (True, False))
+
+        self._confirmado(pedido.delete)
+        self.assertEqual(self._estado(), (False, False))
+
+    def test_borrar_las_lineas_del_pedido_deja_la_resena(self):
+        pedido = self._comprar()
+        self._resenar()
+        self.assertEqual(self._estado(), (True, True))
+        self._confirmado(pedido.items.all().delete)
+        self.assertEqual(self._estado(), (False, True))
+
+
+# ==========================================
+# RESERVAS DE STOCK DEL CARRITO
+# ==========================================
+
+class ReservasTests(TestCase):
+    def setUp(self):
+        self.libro = crear_libros(stock=2)[0]
+        self.carritos = [
+            Carrito.objects.create(usuario=User.objects.create_user(nombre)) for nombre in ('ana', 'beto')
+        ]
+
+    def test_dos_carritos_no_apartan_mas_que_el_stock(self):
+        primero, segundo = self.carritos
+        reservar(primero, self.libro.id)
+        reservar(segundo, self.libro.id)
+        for carrito in self.carritos:
+            with self.assertRaises(StockInsuficiente):
+                reservar(carrito, self.libro.id)
+
+        apartadas = ItemCarrito.objects.filter(libro=self.libro).values_list('reserva__cantidad', flat=True)
+        self.assertEqual(sorted(apartadas), [1, 1])
+
+    def test_una_reserva_vencida_libera_el_stock(self):
+        primero, segundo = self.carritos
+        reservar(primero, self.libro.id, delta=2)
+        with self.assertRaises(StockInsuficiente):
+            reservar(segundo, self.libro.id)
+
+        Reserva.objects.filter(item__carrito=primero).update(expira=timezone.now() - datetime.timedelta(seconds=1))
+        reservar(segundo, self.libro.id, delta=2)
+        # La vencida no se renueva: ese stock ya es del otro carrito
+        self.assertEqual(renovar_reservas(primero), 0)
+        with self.assertRaises(StockInsuficiente):
+            reservar(primero, self.libro.id)
+
+        self.assertEqual(liberar_reservas_vencidas(), 1)
+        self.assertEqual(list(Reserva.objects.values_list('item__carrito', 'cantidad')), [(segundo.id, 2)])
+
+
+@skipUnless(connection.vendor == 'sqlite', "Prueba el bloqueo de SQLite (transaction_mode)")
+class ReservasConcurrentesTests(TransactionTestCase):
+    # La base de pruebas de SQLite vive en memoria y no bloquea como un archivo: se
+    # copia a uno temporal y cada hilo abre allí su propia conexión.
+    def setUp(self):
+        self.libro = crear_libros(stock=1)[0]
+        self.carritos = [
+            Carrito.objects.create(usuario=User.objects.create_user(f'cliente{numero}')) for numero in range(4)
+        ]
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta)
+        self.archivo = str(Path(carpeta, 'concurrencia.sqlite3'))
+        connection.ensure_connection()
+        with closing(sqlite3.connect(self.archivo)) as destino:
+            connection.connection.backup(destino)
+
+    def test_reservas_simultaneas_no_apartan_mas_que_el_stock(self):
+        barrera = threading.Barrier(len(self.carritos))
+        resultados = []
+        original = servicios.disponible_para_venta
+
+        def disponible_lento(*args, **kwargs):
+            # Entre leer lo disponible y escribir la reserva: aquí se cruzarían
+            disponible = original(*args, **kwargs)
+            time.sleep(0.05)
+            return disponible
+
+        def reservar_en_hilo(carrito):
+            barrera.wait()
+            try:
+                reservar(carrito, self.libro.id)
+                resultados.append('reservado')
+            except StockInsuficiente:
+                resultados.append('sin stock')
+            except Exception as error:
+                resultados.append(repr(error))
+            finally:
+                connection.close()
+
+        nombre = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = self.archivo
+        try:
+            with mock.patch.object(servicios, 'disponible_para_venta', disponible_lento):
+                hilos = [threading.Thread(target=reservar_en_hilo, args=(carrito,)) for carrito in self.carritos]
+                for hilo in hilos:
+                    hilo.start()
+                for hilo in hilos:
+                    hilo.join()
+        finally:
+            connection.settings_dict['NAME'] = nombre
+
+        self.assertEqual(sorted(resultados), ['reservado'] + ['sin stock'] * 3)
+        with closing(sqlite3.connect(self.archivo)) as base:
+            apartadas = base.execute('SELECT SUM(cantidad) FROM tienda_reserva').fetchone()[0]
+        self.assertEqual(apartadas, 1)
+
+
+# ==========================================
+# RESÚMENES DIARIOS DE VENTAS
+# ==========================================
+
+def resumen_ventas():
+    diarias = VentaDiaria.objects.exclude(pedidos=0).values_list('fecha', 'estado', 'pedidos', 'total')
+    por_libro = VentaDiariaLibro.objects.values_list('fecha', 'estado', 'libro_id', 'unidades', 'ingresos')
+    return sorted(diarias), sorted(por_libro)
+
+
+class VentasTests(TestCase):
+    def setUp(self):
+        self.libros = crear_libros(2)
+        self.admin = User.objects.create_user('admin', password='clave-segura-123', is_staff=True)
+        self.client.force_login(self.admin)
+        self.pedido = self._pedido(Decimal('30.00'))
+        self._pedido(Decimal('10.00'))
+
+    def _pedido(self, total):
+        pedido = Pedido.objects.create(usuario=self.admin, direccion_envio='Calle 1', total_final=total)
+        for libro in self.libros:
+            ItemPedido.objects.create(pedido=pedido, libro=libro, cantidad=2, precio_unitario=libro.precio)
+        return pedido
+
+    def assertCoincideConReconstruir(self):
+        incremental = resumen_ventas()
+        reconstruir_ventas()
+        self.assertEqual(incremental, resumen_ventas())
+
+    def test_cambios_de_estado_y_borrado(self):
+        for estado in ('pagado', 'enviado'):
+            self.client.post(f'/pedido/estado/{self.pedido.id}/', {'nuevo_estado': estado})
+            self.assertCoincideConReconstruir()
+        self.assertEqual(Pedido.objects.get(id=self.pedido.id).estado, 'enviado')
+
+        self.client.post(f'/pedido/eliminar/{self.pedido.id}/')
+        self.assertFalse(Pedido.objects.filter(id=self.pedido.id).exists())
+        self.assertCoincideConReconstruir()
+
+    def test_dos_cambios_desde_el_mismo_pedido_leido(self):
+        # Dos administradores abren el mismo pedido pendiente y cada uno lo cambia
+        primero, segundo = Pedido.objects.get(id=self.pedido.id), Pedido.objects.get(id=self.pedido.id)
+        primero.estado = 'pagado'
+        primero.save()
+        segundo.estado = 'enviado'
+        segundo.save()
+
+        self.assertCoincideConReconstruir()
+        estados = VentaDiaria.objects.exclude(pedidos=0).values_list('estado', 'pedidos')
+        self.assertEqual(sorted(estados), [('enviado', 1), ('pendiente', 1)])
+
+
+# ==========================================
+# FEED DE RESEÑAS
+# ==========================================
+
+class FeedResenasTests(TestCase):
+    def setUp(self):
+        self.libro = crear_libros()[0]
+        Autor.objects.bulk_create([Autor(nombre=f'Otro autor {numero}') for numero in range(50)])
+
+    def test_el_filtro_por_autor_solo_carga_el_elegido(self):
+        contenido = self.client.get('/resenas/').content.decode()
+        self.assertNotIn('Otro autor', contenido)
+
+        contenido = self.client.get(f'/resenas/?autor={self.libro.autor_id}').content.decode()
+        self.assertIn(f'name="autor" value="{self.libro.autor_id}"', contenido)
+        self.assertNotIn('Otro autor', contenido)
+
+    def test_ids_invalidos_se_ignoran(self):
+        for valor in ('abc', '²', '99999999999999999999999'):
+            self.assertEqual(self.client.get('/resenas/', {'autor': valor, 'libro': valor}).status_code, 200)
+
+
+# ==========================================
+# BÚSQUEDA
+# ==========================================
+
+class BusquedaTests(TestCase):
+    def test_pagina_enorme_no_desborda_el_offset(self):
+        crear_libros()
+        for pagina in ('99999999999999999999999', '-5', 'x', '1' * 5000):
+            respuesta = self.client.get('/buscar/', {'q': 'Libro', 'pagina': pagina})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertLessEqual(respuesta.context['numero'], PAGINA_MAXIMA_BUSQUEDA)
+
+
+# ==========================================
+# DASHBOARD ADMIN
+# ==========================================
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.libro = crear_libros()[0]
+        self.admin = User.objects.create_user('admin', password='clave-segura-123', is_staff=True)
+        self.client.force_login(self.admin)
+        Pedido.objects.create(usuario=self.admin, direccion_envio='Calle 1', total_final=Decimal('5.00'))
+        Resena.objects.create(libro=self.libro, usuario=self.admin, calificacion=3, comentario='Regular')
+
+    def test_el_resumen_no_cuenta_las_tablas_en_cada_visita(self):
+        self.client.get('/panel-admin/')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/panel-admin/')
+        self.assertFalse([consulta['sql'] for consulta in consultas if 'COUNT(' in consulta['sql']])
+        self.assertEqual(
+            [respuesta.context[clave] for clave in ('total_pedidos', 'total_usuarios', 'total_libros', 'total_resenas')],
+            [1, 1, 1, 1],
+        )
+
+    def test_filtros_del_panel_de_resenas_ignoran_ids_invalidos(self):
+        for valor in ('abc', '1.5', '99999999999999999999999'):
+            respuesta = self.client.get('/panel-admin/panel/resenas/', {'filtro_libro': valor, 'filtro_autor': valor})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(len(respuesta.context['pagina']), 1)
+        respuesta = self.client.get('/panel-admin/panel/resenas/', {'filtro_libro': self.libro.id + 1})
+        self.assertEqual(len(respuesta.context['pagina']), 0)
+
+
+# ==========================================
+# ARCHIVOS SUBIDOS (MEDIA)
+# ==========================================
+
+class MediosTests(TestCase):
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz)
+        ajustes = override_settings(MEDIA_ROOT=self.raiz)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _escribir(self, nombre, contenido=b'imagen'):
+        ruta = Path(self.raiz, nombre)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(contenido)
+
+    def test_solo_los_nombres_por_contenido_son_inmutables(self):
+        huella = 'ab' * 16
+        self._escribir(f'libros/ab/{huella}.jpg')
+        self._escribir(f'libros/ab/miniaturas/{huella}-320.webp')
+        self._escribir(f'libros/ab/miniaturas/{huella}.webp')
+
+        self.assertEqual(self.client.get(f'/media/libros/ab/{huella}.jpg')['Cache-Control'], CACHE_POR_CONTENIDO)
+        for miniatura in (f'{huella}-320.webp', f'{huella}.webp'):
+            respuesta = self.client.get(f'/media/libros/ab/miniaturas/{miniatura}')
+            self.assertEqual(respuesta['Cache-Control'], CACHE_MEDIOS)
+
+    def test_la_miniatura_regenerada_cambia_de_etag(self):
+        nombre = f'libros/ab/miniaturas/{"ab" * 16}-320.webp'
+        self._escribir(nombre, b'v1')
+        anterior = self.client.get(f'/media/{nombre}')['ETag']
+        self._escribir(nombre, b'version 2')
+        self.assertNotEqual(self.client.get(f'/media/{nombre}')['ETag'], anterior)
+
+    def _rango(self, nombre, rango, **cabeceras):
+        return self.client.get(f'/media/{nombre}', HTTP_RANGE=rango, **cabeceras)
+
+    def test_las_urls_de_media_las_sirve_servir_medio(self):
+        self.assertEqual(resolve('/media/libros/portada.jpg').url_name, 'servir_medio')
+
+    def test_rangos(self):
+        self._escribir('libros/archivo.bin', b'0123456789')
+
+        parcial = self._rango('libros/archivo.bin', 'bytes=2-5')
+        self.assertEqual(parcial.status_code, 206)
+        self.assertEqual(parcial['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(parcial.streaming_content), b'2345')
+
+        final = self._rango('libros/archivo.bin', 'bytes=-3')
+        self.assertEqual((final.status_code, final['Content-Range']), (206, 'bytes 7-9/10'))
+        self.assertEqual(b''.join(final.streaming_content), b'789')
+
+        fuera = self._rango('libros/archivo.bin', 'bytes=20-')
+        self.assertEqual((fuera.status_code, fuera['Content-Range']), (416, 'bytes */10'))
+
+    def test_if_range_con_otra_version_devuelve_el_archivo_completo(self):
+        self._escribir('libros/archivo.bin', b'0123456789')
+        etag = self.client.get('/media/libros/archivo.bin')['ETag']
+
+        vigente = self._rango('libros/archivo.bin', 'bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual(vigente.status_code, 206)
+        viejo = self._rango('libros/archivo.bin', 'bytes=0-1', HTTP_IF_RANGE='"otra-version"')
+        self.assertEqual(viejo.status_code, 200)
+        self.assertEqual(b''.join(viejo.streaming_content), b'0123456789')
+
+    @override_settings(MEDIA_ENVIO='x-accel-redirect', MEDIA_ENVIO_PREFIJO='/media-interna/')
+    def test_envio_delegado_a_nginx(self):
+        huella = 'cd' * 16
+        self._escribir(f'libros/cd/{huella}.jpg')
+        respuesta = self.client.get(f'/media/libros/cd/{huella}.jpg')
+
+        self.assertEqual(respuesta['X-Accel-Redirect'], f'/media-interna/libros/cd/{huella}.jpg')
+        self.assertEqual(respuesta['Cache-Control'], CACHE_POR_CONTENIDO)
+        self.assertEqual((respuesta['Content-Type'], respuesta.content), ('image/jpeg', b''))
+
+    def test_subidas_identicas_son_un_solo_archivo(self):
+        primero = default_storage.save('libros/portada.JPG', ContentFile(b'misma imagen'))
+        segundo = default_storage.save('libros/otra_portada.jpg', ContentFile(b'misma imagen'))
+        distinto = default_storage.save('libros/portada.jpg', ContentFile(b'otra imagen'))
+
+        self.assertEqual(primero, segundo)
+        self.assertNotEqual(primero, distinto)
+        self.assertRegex(primero, r'^libros/([0-9a-f]{2})/\1[0-9a-f]{30}\.jpg$')
+        self.assertEqual(len(list(Path(self.raiz, 'libros').rglob('*.jpg'))), 2)
+
+
+# ==========================================
+# API JSON (V1)
+# ==========================================
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.libros = crear_libros(5)
+        self.otra = Coleccion.objects.create(nombre='Otra', descripcion='')
+        Libro.objects.filter(id=self.libros[0].id).update(coleccion=self.otra, stock=0)
+
+    def test_detalle_revalida_con_304_hasta_que_el_libro_cambia(self):
+        url = f'/api/v1/libros/{self.libros[1].id}/'
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        etag = respuesta['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        libro = Libro.objects.get(id=self.libros[1].id)
+        libro.stock = 1
+        libro.save(update_fields=['stock'])
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.json()['stock'], 1)
+
+    def test_listado_revalida_con_304(self):
+        respuesta = self.client.get('/api/v1/libros/')
+        self.assertEqual(self.client.get('/api/v1/libros/', HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        Libro.objects.get(id=self.libros[2].id).save()
+        self.assertEqual(self.client.get('/api/v1/libros/', HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+    def test_campos_y_filtros(self):
+        datos = self.client.get('/api/v1/libros/', {'campos': 'id,titulo', 'coleccion': self.otra.id}).json()
+        self.assertEqual(datos['resultados'], [{'id': self.libros[0].id, 'titulo': self.libros[0].titulo}])
+
+        ids = [libro['id'] for libro in self.client.get('/api/v1/libros/', {'stock': 'disponible'}).json()['resultados']]
+        self.assertEqual(ids, [libro.id for libro in self.libros[1:]])
+        agotados = self.client.get('/api/v1/libros/', {'stock': 'agotado', 'campos': 'id'}).json()['resultados']
+        self.assertEqual(agotados, [{'id': self.libros[0].id}])
+
+    def test_parametros_invalidos_dan_400(self):
+        for parametros in (
+            {'campos': 'titulo,clave'}, {'coleccion': 'abc'}, {'stock': 'muchos'},
+            {'orden': 'azar'}, {'limite': '0'}, {'limite': '1000'},
+        ):
+            respuesta = self.client.get('/api/v1/libros/', parametros)
+            self.assertEqual(respuesta.status_code, 400, parametros)
+            self.assertIn('error', respuesta.json())
+        self.assertEqual(self.client.get('/api/v1/pedidos/').status_code, 404)
+
+    def test_paginacion_por_cursor(self):
+        url, vistos = '/api/v1/libros/?limite=2&campos=id', []
+        while url:
+            datos = self.client.get(url).json()
+            vistos += [libro['id'] for libro in datos['resultados']]
+            url = datos['siguiente']
+        self.assertEqual(vistos, [libro.id for libro in self.libros])
+
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+
+@override_settings(METRICAS_TOKEN='secreto-de-prueba')
+class MetricasPrometheusTests(TestCase):
+    url = '/panel-admin/metricas/prometheus/'
+
+    def setUp(self):
+        metricas.reiniciar()
+        metricas.registrar('index', 0.02, 3, 0.01, 512)
+
+    def test_sin_credenciales_o_con_otro_token_da_403(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        for cabecera in ('Bearer otro', 'Bearer secreto-de-prueba-mas', 'secreto-de-prueba', 'Bearer ñ'):
+            self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=cabecera).status_code, 403)
+
+    @override_settings(METRICAS_TOKEN='')
+    def test_sin_token_configurado_solo_entra_el_staff(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_con_token_devuelve_las_series_por_proceso(self):
+        respuesta = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer secreto-de-prueba')
+        self.assertEqual(respuesta.status_code, 200)
+        texto = respuesta.content.decode()
+        etiquetas = f'vista="index",proceso="{os.getpid()}"'
+        self.assertIn(f'tienda_peticion_segundos_count{{{etiquetas}}} 1', texto)
+        self.assertIn(f'tienda_peticion_segundos_bucket{{{etiquetas},le="0.025"}} 1', texto)
+        self.assertIn(f'tienda_consultas_total{{{etiquetas}}} 3', texto)
+
+
+# ==========================================
+# RÉPLICAS DE LECTURA
+# ==========================================
+
+class EnrutadorReplicasTests(TransactionTestCase):
+    # Una segunda conexión SQLite a la misma base de pruebas hace de réplica. Se agrega
+    # al iniciar la clase: '__all__' la incluye, un alias fijo fallaría antes (el runner
+    # revisa los alias al arrancar)
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        replica = copy.deepcopy(connections['default'].settings_dict)
+        settings.DATABASES['replica_pruebas'] = replica  # el mismo dict que connections.settings
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_pruebas'].close()
+        del connections['replica_pruebas']
+        del settings.DATABASES['replica_pruebas']
+
+    def setUp(self):
+        cache.clear()
+        self.libro = crear_libros()[0]
+        self.enrutador = EnrutadorReplicas()
+
+    def _consultas(self, funcion):
+        # (consultas al primario, consultas a las réplicas); con DB_REPLICAS puede haber más de una
+        capturas = {alias: CaptureQueriesContext(connections[alias]) for alias in settings.DATABASES}
+        with ExitStack() as pila:
+            for captura in capturas.values():
+                pila.enter_context(captura)
+            funcion()
+        primario = len(capturas.pop('default'))
+        return primario, sum(len(captura) for captura in capturas.values())
+
+    def test_los_get_leen_de_la_replica(self):
+        primario, replica = self._consultas(lambda: self.client.get('/libros/'))
+        self.assertGreater(replica, 0)
+        self.assertEqual(primario, 0)
+
+    def test_una_escritura_fija_el_resto_de_la_peticion_al_primario(self):
+        with lecturas_en_replica():
+            self.assertIn(self.enrutador.db_for_read(Libro), replicas())
+            Libro.objects.filter(id=self.libro.id).update(stock=4)
+            self.assertEqual(self.enrutador.db_for_read(Libro), 'default')
+            self.assertEqual(self._consultas(lambda: Libro.objects.get(id=self.libro.id)), (1, 0))
+
+    def test_el_get_que_escribe_deja_la_cookie_y_la_siguiente_lee_del_primario(self):
+        self.client.force_login(User.objects.create_user('cliente'))
+        respuesta = self.client.get(f'/carrito/agregar/{self.libro.id}/')
+        self.assertIn('leer_primario', respuesta.cookies)
+
+        cache.clear()
+        primario, replica = self._consultas(lambda: self.client.get('/libros/'))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primario, 0)
+
+    def test_post_y_tablas_solo_primario(self):
+        self.assertEqual(self._consultas(lambda: self.client.post('/login/', {'username': 'x'}))[1], 0)
+        with lecturas_en_replica():
+            for modelo in (User, Session, Carrito, ItemCarrito, Reserva, Pedido, ItemPedido):
+                self.assertEqual(self.enrutador.db_for_read(modelo), 'default', modelo)
+            self.assertIn(self.enrutador.db_for_read(Resena), replicas())
+        self.assertEqual(self.enrutador.db_for_read(Libro), 'default')  # fuera de una petición
+        self.assertFalse(self.enrutador.allow_migrate('replica_pruebas', 'tienda'))
+
+
+# ==========================================
+# API JSON DEL CARRITO
+# ==========================================
+
+class ApiCarritoTests(TestCase):
+    def setUp(self):
+        self.libro = crear_libros(stock=2)[0]
+        self.usuario = User.objects.create_user('cliente')
+
+    def _post(self, accion, id_):
+        return self.client.post(f'/api/carrito/{accion}/{id_}/')
+
+    def test_sin_sesion_da_401_con_la_url_de_login(self):
+        respuesta = self._post('agregar', self.libro.id)
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(respuesta.json()['login'], '/login/')
+
+    def test_solo_acepta_post(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(f'/api/carrito/agregar/{self.libro.id}/').status_code, 405)
+        self.assertFalse(ItemCarrito.objects.exists())
+
+    def test_agregar_sumar_restar_y_eliminar(self):
+        self.client.force_login(self.usuario)
+        datos = self._post('agregar', self.libro.id).json()
+        item_id = datos['item']['id']
+        self.assertEqual((datos['item']['cantidad'], datos['item']['subtotal']), (1, '10.00'))
+        self.assertIsNotNone(datos['item']['apartado_hasta'])
+        self.assertEqual(datos['carrito'], {'unidades': 1, 'total': '10.00'})
+
+        datos = self._post('sumar', item_id).json()
+        self.assertEqual(datos['carrito'], {'unidades': 2, 'total': '20.00'})
+
+        respuesta = self._post('sumar', item_id)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertIn('error', respuesta.json())
+
+        datos = self._post('restar', item_id).json()
+        self.assertEqual((datos['item']['cantidad'], datos['carrito']['unidades']), (1, 1))
+
+        datos = self._post('eliminar', item_id).json()
+        self.assertEqual((datos['item'], datos['carrito']), (None, {'unidades': 0, 'total': '0.00'}))
+
+    def test_agotado_da_409(self):
+        otro = Carrito.objects.create(usuario=User.objects.create_user('otro'))
+        reservar(otro, self.libro.id, delta=2)
+        self.client.force_login(self.usuario)
+        self.assertEqual(self._post('agregar', self.libro.id).status_code, 409)
+
+    def test_no_se_tocan_items_de_otro_carrito(self):
+        otro = Carrito.objects.create(usuario=User.objects.create_user('otro'))
+        item = reservar(otro, self.libro.id)
+        self.client.force_login(self.usuario)
+        for accion in ('sumar', 'restar', 'eliminar'):
+            self.assertEqual(self._post(accion, item.id).status_code, 404)
+        self.assertEqual(ItemCarrito.objects.get(id=item.id).cantidad, 1)
+
+
+# ==========================================
+# EXPORTACIÓN DE PEDIDOS
+# ==========================================
+
+class ExportacionTests(TestCase):
+    def setUp(self):
+        self.libro = crear_libros()[0]
+        self.cliente = User.objects.create_user('cliente', email='c@ejemplo.com')
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        # Pedidos al final del 10 de marzo, al empezar el 11 y el 12 (hora local)
+        fechas = [(10, 23, 'pagado'), (11, 0, 'enviado'), (12, 12, 'pagado')]
+        self.pedidos = []
+        for dia, hora, estado in fechas:
+            pedido = Pedido.objects.create(
+                usuario=self.cliente, direccion_envio='Calle 1', total_final=Decimal('11.60'), estado=estado,
+            )
+            ItemPedido.objects.create(pedido=pedido, libro=self.libro, cantidad=1, precio_unitario=Decimal('10.00'))
+            fecha = timezone.make_aware(datetime.datetime(2026, 3, dia, hora, 30))
+            Pedido.objects.filter(id=pedido.id).update(fecha_pedido=fecha)
+            self.pedidos.append(pedido.id)
+
+    def _exportar(self, formato='csv', **parametros):
+        return self.client.get(f'/pedidos/exportar.{formato}', parametros)
+
+    def _ids_csv(self, respuesta):
+        filas = list(csv.DictReader(io.StringIO(b''.join(respuesta.streaming_content).decode())))
+        return [int(fila['pedido']) for fila in filas]
+
+    def test_solo_staff(self):
+        self.assertEqual(self._exportar().status_code, 302)
+        self.client.force_login(self.cliente)
+        self.assertEqual(self._exportar().status_code, 302)
+
+    def test_csv_y_jsonl(self):
+        self.client.force_login(self.admin)
+        respuesta = self._exportar()
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(respuesta['Content-Disposition'], 'attachment; filename="pedidos.csv"')
+        self.assertEqual(self._ids_csv(respuesta), self.pedidos)
+
+        respuesta = self._exportar('jsonl')
+        lineas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual([linea['pedido'] for linea in lineas], self.pedidos)
+        self.assertEqual(
+            (lineas[0]['email'], lineas[0]['titulo'], lineas[0]['precio_unitario']),
+            ('c@ejemplo.com', self.libro.titulo, '10.00'),
+        )
+        self.assertEqual(self._exportar('xml').status_code, 404)
+
+    def test_filtros_de_fecha_inclusivos_y_estado(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self._ids_csv(self._exportar(hasta='2026-03-10')), self.pedidos[:1])
+        self.assertEqual(self._ids_csv(self._exportar(desde='2026-03-11', hasta='2026-03-11')), self.pedidos[1:2])
+        self.assertEqual(self._ids_csv(self._exportar(desde='2026-03-11')), self.pedidos[1:])
+        self.assertEqual(self._ids_csv(self._exportar(estado='pagado')), [self.pedidos[0], self.pedidos[2]])
+
+    def test_filtros_invalidos_dan_400(self):
+        self.client.force_login(self.admin)
+        for parametros in ({'desde': '2026-13-01'}, {'hasta': 'ayer'}, {'estado': 'perdido'}):
+            self.assertEqual(self._exportar(**parametros).status_code, 400, parametros)
+
+
+# ==========================================
+# ADMIN DE TABLAS GRANDES
+# ==========================================
+
+class PaginadorEstimadoTests(TestCase):
+    def setUp(self):
+        libros = crear_libros(5)
+        # Con un hueco en los ids el estimado de SQLite (el mayor id) cuenta de más
+        libros[2].delete()
+
+    def _conteo(self, consulta):
+        return PaginadorEstimado(consulta.order_by('id'), 2).count
+
+    @mock.patch('tienda.admin.UMBRAL_CONTEO_ESTIMADO', 3)
+    def test_estimado_solo_sin_filtros_y_desde_el_umbral(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._conteo(Libro.objects.all()), 5)
+        self.assertFalse([consulta for consulta in consultas if 'COUNT(' in consulta['sql']])
+
+        self.assertEqual(self._conteo(Libro.objects.filter(stock__gt=0)), 4)
+
+    @mock.patch('tienda.admin.UMBRAL_CONTEO_ESTIMADO', 10)
+    def test_bajo_el_umbral_cuenta_exacto(self):
+        self.assertEqual(self._conteo(Libro.objects.all()), 4)
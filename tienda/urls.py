@@ -1,19 +1,20 @@
 from django.urls import path
 from . import views
-from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     # --- 1. PÁGINAS PÚBLICAS ---
     path('', views.index, name='index'),
     path('libros/', views.catalogo, name='catalogo'),
+    path('buscar/', views.buscar, name='buscar'),
     path('libro/<int:libro_id>/', views.detalle_libro, name='detalle_libro'),
+    path('libro/<int:libro_id>/resenas/', views.resenas_libro, name='resenas_libro'),
     
     path('autores/', views.lista_autores, name='lista_autores'),
     path('autor/<int:autor_id>/', views.detalle_autor, name='detalle_autor'),
     
     path('colecciones/', views.lista_generos, name='lista_generos'),
     path('resenas/', views.resenas, name='resenas'),
+    path('resenas/mas/', views.resenas_mas, name='resenas_mas'),
 
     # --- 2. USUARIO Y SESIÓN ---
     path('registro/', views.registro, name='registro'),
@@ -27,11 +28,19 @@ urlpatterns = [
     path('carrito/sumar/<int:item_id>/', views.sumar_cantidad, name='sumar_cantidad'),
     path('carrito/restar/<int:item_id>/', views.restar_cantidad, name='restar_cantidad'),
     path('carrito/eliminar/<int:item_id>/', views.eliminar_del_carrito, name='eliminar_del_carrito'),
+    path('api/carrito/agregar/<int:libro_id>/', views.api_agregar_al_carrito, name='api_agregar_al_carrito'),
+    path('api/carrito/sumar/<int:item_id>/', views.api_sumar_cantidad, name='api_sumar_cantidad'),
+    path('api/carrito/restar/<int:item_id>/', views.api_restar_cantidad, name='api_restar_cantidad'),
+    path('api/carrito/eliminar/<int:item_id>/', views.api_eliminar_del_carrito, name='api_eliminar_del_carrito'),
     path('checkout/', views.procesar_pedido, name='procesar_pedido'),
     path('pedido-confirmado/<int:pedido_id>/', views.pedido_exitoso, name='pedido_exitoso'),
 
     # --- 4. PANEL DE ADMINISTRACIÓN ---
     path('panel-admin/', views.dashboard_admin, name='dashboard_admin'),
+    path('panel-admin/ventas/', views.panel_ventas, name='panel_ventas'),
+    path('panel-admin/panel/<slug:seccion>/', views.panel_dashboard, name='panel_dashboard'),
+    path('panel-admin/metricas/', views.metricas_admin, name='metricas_admin'),
+    path('panel-admin/metricas/prometheus/', views.metricas_prometheus, name='metricas_prometheus'),
 
     # --- 5. CRUD: LIBROS ---
     path('libro/crear/', views.crear_libro, name='crear_libro'),
@@ -59,6 +68,7 @@ urlpatterns = [
     path('pedido/editar-admin/<int:pedido_id>/', views.editar_pedido_completo, name='editar_pedido_completo'),
     path('pedido/detalle/<int:pedido_id>/', views.detalle_pedido_admin, name='detalle_pedido_admin'),
     path('pedido/eliminar/<int:pedido_id>/', views.eliminar_pedido, name='eliminar_pedido'),
+    path('pedidos/exportar.<str:formato>', views.exportar_pedidos, name='exportar_pedidos'),
 
     # --- 10. CRUD: USUARIOS (ADMIN) ---
     path('usuario/crear-admin/', views.crear_usuario_admin, name='crear_usuario_admin'),
@@ -70,8 +80,8 @@ urlpatterns = [
     path('resena/crear-admin/', views.crear_resena_admin, name='crear_resena_admin'),
     path('resena/editar-admin/<int:resena_id>/', views.editar_resena_admin, name='editar_resena_admin'),
     path('resena/eliminar/<int:resena_id>/', views.eliminar_resena, name='eliminar_resena'),
-]
 
-# Configuración para servir imágenes en modo DEBUG
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # --- 12. API JSON DE SOLO LECTURA (v1) ---
+    path('api/v1/<str:recurso>/', views.api_listado, name='api_listado'),
+    path('api/v1/<str:recurso>/<int:pk>/', views.api_detalle, name='api_detalle'),
+]
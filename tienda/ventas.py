@@ -0,0 +1,170 @@
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ItemPedido, Pedido, VentaDiaria, VentaDiariaLibro
+
+
+TAMANO_LOTE_VENTAS = 2000
+
+_DECIMAL = DecimalField(max_digits=14, decimal_places=2)
+
+
+def dia_de(pedido):
+    return timezone.localdate(pedido.fecha_pedido)
+
+
+# ==========================================
+# ACTUALIZACIÓN INCREMENTAL
+# ==========================================
+# Cada cambio suma (signo=1) o resta (signo=-1) su aporte. Primero se asegura que
+# la fila exista (ignore_conflicts) y luego se incrementa con F(): dos pedidos
+# simultáneos del mismo día no se pisan.
+
+def sumar_pedido(pedido, signo=1):
+    fecha, estado = dia_de(pedido), pedido.estado
+    VentaDiaria.objects.bulk_create([VentaDiaria(fecha=fecha, estado=estado)], ignore_conflicts=True)
+    VentaDiaria.objects.filter(fecha=fecha, estado=estado).update(
+        pedidos=F('pedidos') + signo,
+        subtotal=F('subtotal') + signo * (pedido.subtotal or 0),
+        impuestos=F('impuestos') + signo * (pedido.impuestos or 0),
+        total=F('total') + signo * (pedido.total_final or 0),
+    )
+
+
+def lineas_de_pedido(pedido_id):
+    # (libro_id, coleccion_id, cantidad, precio_unitario) de cada ItemPedido
+    return list(
+        ItemPedido.objects.filter(pedido_id=pedido_id)
+        .values_list('libro_id', 'libro__coleccion_id', 'cantidad', 'precio_unitario')
+    )
+
+
+def _por_libro(valores, posicion, campo):
+    return Case(
+        *[When(libro_id=libro_id, then=Value(fila[posicion])) for libro_id, fila in valores.items()],
+        output_field=campo,
+    )
+
+
+def sumar_lineas(pedido, lineas, signo=1):
+    # Un pedido cae en un solo día y estado: todas sus líneas se aplican con un
+    # único UPDATE (CASE por libro), sin importar cuántos libros tenga.
+    acumulado = {}
+    for libro_id, coleccion_id, cantidad, precio in lineas:
+        unidades, ingresos, num, _ = acumulado.get(libro_id, (0, Decimal('0'), 0, coleccion_id))
+        acumulado[libro_id] = (
+            unidades + signo * cantidad, ingresos + signo * cantidad * precio, num + signo, coleccion_id,
+        )
+    if not acumulado:
+        return
+
+    fecha, estado = dia_de(pedido), pedido.estado
+    VentaDiariaLibro.objects.bulk_create([
+        VentaDiariaLibro(fecha=fecha, estado=estado, libro_id=libro_id, coleccion_id=fila[3])
+        for libro_id, fila in acumulado.items()
+    ], ignore_conflicts=True)
+
+    filas = VentaDiariaLibro.objects.filter(fecha=fecha, estado=estado, libro_id__in=acumulado)
+    filas.update(
+        unidades=F('unidades') + _por_libro(acumulado, 0, IntegerField()),
+        ingresos=F('ingresos') + _por_libro(acumulado, 1, _DECIMAL),
+        lineas=F('lineas') + _por_libro(acumulado, 2, IntegerField()),
+    )
+    if signo < 0:
+        filas.filter(lineas__lte=0).delete()
+
+
+def mover_pedido(anterior, actual):
+    # Cambió el estado, la fecha o los montos de un pedido ya guardado
+    sumar_pedido(anterior, -1)
+    sumar_pedido(actual, 1)
+    if (dia_de(anterior), anterior.estado) != (dia_de(actual), actual.estado):
+        lineas = lineas_de_pedido(actual.id)
+        sumar_lineas(anterior, lineas, -1)
+        sumar_lineas(actual, lineas, 1)
+
+
+# ==========================================
+# RECONSTRUCCIÓN COMPLETA
+# ==========================================
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _filtro_fechas(campo, desde, hasta):
+    filtro = {}
+    if desde:
+        filtro[f'{campo}__gte'] = _inicio_del_dia(desde)
+    if hasta:
+        filtro[f'{campo}__lt'] = _inicio_del_dia(hasta + datetime.timedelta(days=1))
+    return filtro
+
+
+def _insertar_por_lotes(modelo, filas, tamano_lote):
+    lote = []
+    insertadas = 0
+    for fila in filas:
+        lote.append(modelo(**fila))
+        if len(lote) >= tamano_lote:
+            modelo.objects.bulk_create(lote)
+            insertadas += len(lote)
+            lote = []
+    if lote:
+        modelo.objects.bulk_create(lote)
+        insertadas += len(lote)
+    return insertadas
+
+
+@transaction.atomic
+def reconstruir_ventas(desde=None, hasta=None, tamano_lote=TAMANO_LOTE_VENTAS):
+    # Borra los resúmenes del rango (fechas inclusive; sin rango, todos) y los vuelve
+    # a calcular con dos GROUP BY. Devuelve (filas de VentaDiaria, filas de VentaDiariaLibro).
+    rango = {}
+    if desde:
+        rango['fecha__gte'] = desde
+    if hasta:
+        rango['fecha__lte'] = hasta
+    VentaDiaria.objects.filter(**rango).delete()
+    VentaDiariaLibro.objects.filter(**rango).delete()
+
+    dia = TruncDate('fecha_pedido', tzinfo=timezone.get_current_timezone())
+    pedidos = (
+        Pedido.objects.filter(**_filtro_fechas('fecha_pedido', desde, hasta))
+        .annotate(dia=dia).values('dia', 'estado')
+        .annotate(num=Count('id'), suma_subtotal=Sum('subtotal'), suma_impuestos=Sum('impuestos'), suma_total=Sum('total_final'))
+        .order_by()
+    )
+    diarias = _insertar_por_lotes(VentaDiaria, (
+        {
+            'fecha': fila['dia'], 'estado': fila['estado'], 'pedidos': fila['num'],
+            'subtotal': fila['suma_subtotal'], 'impuestos': fila['suma_impuestos'], 'total': fila['suma_total'],
+        }
+        for fila in pedidos.iterator(chunk_size=tamano_lote)
+    ), tamano_lote)
+
+    dia_item = TruncDate('pedido__fecha_pedido', tzinfo=timezone.get_current_timezone())
+    items = (
+        ItemPedido.objects.filter(**_filtro_fechas('pedido__fecha_pedido', desde, hasta))
+        .annotate(dia=dia_item).values('dia', 'pedido__estado', 'libro_id', 'libro__coleccion_id')
+        .annotate(
+            suma_unidades=Sum('cantidad'),
+            suma_ingresos=Sum(F('cantidad') * F('precio_unitario'), output_field=_DECIMAL),
+            num=Count('id'),
+        )
+        .order_by()
+    )
+    por_libro = _insertar_por_lotes(VentaDiariaLibro, (
+        {
+            'fecha': fila['dia'], 'estado': fila['pedido__estado'], 'libro_id': fila['libro_id'],
+            'coleccion_id': fila['libro__coleccion_id'], 'unidades': fila['suma_unidades'],
+            'ingresos': fila['suma_ingresos'], 'lineas': fila['num'],
+        }
+        for fila in items.iterator(chunk_size=tamano_lote)
+    ), tamano_lote)
+    return diarias, por_libro
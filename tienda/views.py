@@ -1,13 +1,26 @@
+import hmac
 from decimal import Decimal
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import Count
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
 
 # IMPORTACIÓN DE TODOS LOS MODELOS
-from .models import Libro, Carrito, ItemCarrito, Pedido, ItemPedido, Perfil, Autor, Coleccion, Resena, Proveedor
+from .models import Libro, ItemCarrito, Pedido, Autor, Coleccion, Resena, Proveedor
 
 # IMPORTACIÓN DE TODOS LOS FORMULARIOS
 from .forms import (
@@ -15,44 +28,139 @@ from .forms import (
     PedidoAdminForm, UsuarioAdminForm, ResenaAdminForm, PedidoCrearForm, ProveedorForm
 )
 
+# CONSULTAS Y SERVICIOS
+from .consultas import (
+    ESTADOS_COBRADOS, ORDEN_CATALOGO, ORDENES_CATALOGO, ORDEN_RESENAS, PANELES_DASHBOARD, RANGOS_VENTAS,
+    TAMANO_PAGINA_CATALOGO, TAMANO_PAGINA_PANEL, TAMANO_PAGINA_RESENAS,
+    entero_id, libros_catalogo, libros_relacionados, paginar_por_cursor, relacionados_de_carrito,
+    resenas_publicas, resumen_ventas, totales_dashboard
+)
+from .busqueda import PAGINA_MAXIMA_BUSQUEDA, buscar_libros
+from .api import (
+    RECURSOS_API, VERSION_API, ParametroInvalido, consulta_api, pagina_api, serializar, version_listado,
+    version_objeto,
+)
+from . import metricas
+from .exportacion import FORMATOS_EXPORTACION, FiltroInvalido, filas_pedidos, filtros_exportacion
+from .cache_etiquetas import cache_publica, clave_version, etiquetar, etiquetas_de_libros
+from .medios import respuesta_medio
+from .context_processors import obtener_menu_colecciones
+from .servicios import (
+    CarritoVacio, StockInsuficiente, calcular_totales, carrito_de, confirmar_pedido, estado_lector,
+    items_de_carrito, perfil_de, renovar_reservas, reservar, resumen_carrito,
+)
+
 # ==========================================
 # 1. VISTAS PÚBLICAS (CLIENTE)
 # ==========================================
 
+# Etiquetas de caché de toda grilla de libros (ver cache_etiquetas.py): las tarjetas
+# muestran el autor y la colección. Cada vista agrega las de su filtro y libro:<id>.
+ETIQUETAS_LISTADO = ('autores', 'colecciones')
+
+def _version_grilla(request, etiquetas, *listas):
+    # Etiqueta la página con las de la grilla y devuelve la clave de su {% cache %}
+    etiquetas = etiquetas_de_libros(
+        request, [*ETIQUETAS_LISTADO, *etiquetas], lambda: [libro.id for lista in listas for libro in lista],
+    )
+    etiquetar(request, *etiquetas)
+    return clave_version(etiquetas)
+
+@cache_publica(*ETIQUETAS_LISTADO)
 def index(request):
-    recomendados = Libro.objects.filter(es_recomendado=True)[:4]
+    recomendados = Libro.objects.filter(es_recomendado=True).select_related('autor')[:4]
     novedades = Libro.objects.all().order_by('-id')[:4]
     return render(request, 'tienda/index.html', {
         'recomendados': recomendados,
-        'novedades': novedades
+        'novedades': novedades,
+        # Las novedades cambian con cada alta o baja ('libros')
+        'version_cache': _version_grilla(request, ['recomendados', 'libros'], recomendados, novedades)
     })
 
+@cache_publica(*ETIQUETAS_LISTADO)
 def catalogo(request):
-    libros = Libro.objects.all()
-    colecciones = Coleccion.objects.all()
+    coleccion = request.GET.get('coleccion', '')
+    if coleccion and entero_id(coleccion) is None:
+        # Igual que ?coleccion= en la API
+        return HttpResponseBadRequest("coleccion debe ser un id numérico.")
+    colecciones = obtener_menu_colecciones()
     
-    coleccion_id = request.GET.get('coleccion')
-    if coleccion_id:
-        libros = libros.filter(coleccion__id=coleccion_id)
-        
+    libros = libros_catalogo(
+        coleccion_id=entero_id(coleccion),
+        recomendados=bool(request.GET.get('recomendados')),
+    )
+    orden = request.GET.get('orden', '')
+    pagina = paginar_por_cursor(
+        libros, ORDENES_CATALOGO.get(orden, ORDEN_CATALOGO),
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+    )
+
+    # Filtros actuales sin el cursor, para armar los enlaces de página
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
+    filtros.pop('antes', None)
+    # ...y sin el orden, para los enlaces que lo cambian
+    filtros_sin_orden = filtros.copy()
+    filtros_sin_orden.pop('orden', None)
+
+    # Qué libros entran en este listado
+    etiquetas = []
+    if entero_id(coleccion):
+        etiquetas.append(f'coleccion:{entero_id(coleccion)}')
     if request.GET.get('recomendados'):
-        libros = libros.filter(es_recomendado=True)
+        etiquetas.append('recomendados')
+    if not etiquetas:
+        etiquetas.append('libros')
+    if orden in ORDENES_CATALOGO:
+        etiquetas.append('calificaciones')
 
     return render(request, 'tienda/catalogo.html', {
-        'libros': libros, 
-        'colecciones': colecciones
+        'libros': pagina, 
+        'pagina': pagina,
+        'filtros': filtros.urlencode(),
+        'filtros_sin_orden': filtros_sin_orden.urlencode(),
+        'orden': orden,
+        'colecciones': colecciones,
+        'version_cache': _version_grilla(request, etiquetas, pagina)
+    })
+
+def buscar(request):
+    texto = request.GET.get('q', '').strip()
+    try:
+        numero = min(max(int(request.GET.get('pagina', 1)), 1), PAGINA_MAXIMA_BUSQUEDA)
+    except (ValueError, OverflowError):
+        numero = 1
+
+    libros = []
+    if texto:
+        # Se pide un libro de más para saber si existe otra página
+        libros = buscar_libros(
+            texto, libros_catalogo(),
+            limite=TAMANO_PAGINA_CATALOGO + 1,
+            desplazamiento=(numero - 1) * TAMANO_PAGINA_CATALOGO,
+        )
+
+    return render(request, 'tienda/buscar.html', {
+        'libros': libros[:TAMANO_PAGINA_CATALOGO],
+        'q': texto,
+        'numero': numero,
+        'hay_siguiente': len(libros) > TAMANO_PAGINA_CATALOGO and numero < PAGINA_MAXIMA_BUSQUEDA
     })
 
+@cache_publica()
 def detalle_libro(request, libro_id):
-    libro = get_object_or_404(Libro, id=libro_id)
-    resenas = libro.resenas.all().order_by('-fecha')
+    libro = get_object_or_404(Libro.objects.select_related('autor', 'coleccion', 'proveedor'), id=libro_id)
+    etiquetar(request, f'libro:{libro.id}', f'autor:{libro.autor_id}', f'resenas:libro:{libro.id}', 'relacionados')
+    if libro.proveedor_id:
+        etiquetar(request, f'proveedor:{libro.proveedor_id}')
+    resenas = paginar_por_cursor(resenas_publicas(libro_id=libro.id), ORDEN_RESENAS, tamano=TAMANO_PAGINA_RESENAS)
     
     puede_comentar = False
     ya_comento = False
     
     if request.user.is_authenticated:
-        compro_libro = ItemPedido.objects.filter(pedido__usuario=request.user, libro=libro).exists()
-        ya_comento = Resena.objects.filter(usuario=request.user, libro=libro).exists()
+        compro_libro, ya_comento = estado_lector(request.user.id, libro.id)
         if compro_libro and not ya_comento:
             puede_comentar = True
 
@@ -68,9 +176,13 @@ def detalle_libro(request, libro_id):
     else:
         form = ResenaForm()
 
+    relacionados = list(libros_relacionados(libro.id))
+    etiquetar(request, *[f'libro:{otro.id}' for otro in relacionados])
     return render(request, 'tienda/detalle_libro.html', {
         'libro': libro,
         'resenas': resenas,
+        'url_mas_resenas': reverse('resenas_libro', args=[libro.id]),
+        'relacionados': relacionados,
         'puede_comentar': puede_comentar,
         'ya_comento': ya_comento,
         'form': form
@@ -78,40 +190,81 @@ def detalle_libro(request, libro_id):
 
 
 
+@cache_publica('autores', 'libros')
 def lista_autores(request):
-    autores = Autor.objects.all().order_by('nombre')
+    autores = Autor.objects.annotate(num_libros=Count('libros')).order_by('nombre')
     return render(request, 'tienda/autores.html', {'autores': autores})
 
+@cache_publica()
 def detalle_autor(request, autor_id):
     autor = get_object_or_404(Autor, id=autor_id)
-    libros = autor.libros.all()
+    # autor:<id> también cambia cuando uno de sus libros se crea, se borra o cambia de autor
+    libros = list(autor.libros.all())
+    etiquetar(request, f'autor:{autor.id}', *[f'libro:{libro.id}' for libro in libros])
     return render(request, 'tienda/detalle_autor.html', {'autor': autor, 'libros': libros})
 
+@cache_publica()
 def lista_generos(request):
-    colecciones = Coleccion.objects.all()
+    colecciones = obtener_menu_colecciones()
     return render(request, 'tienda/generos.html', {'colecciones': colecciones})
 
+def _filtros_resenas(request):
+    # Solo ids numéricos; cualquier otra cosa se ignora
+    filtros = {}
+    for parametro in ('libro', 'autor', 'coleccion'):
+        valor = entero_id(request.GET.get(parametro))
+        if valor is not None:
+            filtros[f'{parametro}_id'] = valor
+    return filtros
+
+def _pagina_resenas(request, resenas):
+    return paginar_por_cursor(
+        resenas, ORDEN_RESENAS,
+        despues=request.GET.get('despues'),
+        tamano=TAMANO_PAGINA_RESENAS,
+    )
+
+def _json_resenas(request, pagina, plantilla):
+    # "Cargar más": el HTML de la página ya armado y el cursor de la siguiente
+    return JsonResponse({
+        'html': render_to_string(plantilla, {'resenas': pagina}, request=request),
+        'siguiente': pagina.cursor_siguiente,
+    })
+
 def resenas(request):
-    
-    lista_resenas = Resena.objects.all().order_by('-fecha')
-    libros = Libro.objects.all().order_by('titulo')
-    autores = Autor.objects.all().order_by('nombre')
-    colecciones = Coleccion.objects.all().order_by('nombre')
-
-    if request.GET.get('libro'):
-        lista_resenas = lista_resenas.filter(libro_id=request.GET.get('libro'))
-    if request.GET.get('autor'):
-        lista_resenas = lista_resenas.filter(libro__autor_id=request.GET.get('autor'))
-    if request.GET.get('coleccion'):
-        lista_resenas = lista_resenas.filter(libro__coleccion_id=request.GET.get('coleccion'))
+    filtros = _filtros_resenas(request)
+    pagina = _pagina_resenas(request, resenas_publicas(**filtros))
+
+    # Para los filtros por libro y autor no se lista todo el catálogo: solo el elegido
+    # (se llega con ?libro= o ?autor= desde su ficha)
+    libro_filtrado = autor_filtrado = None
+    if 'libro_id' in filtros:
+        libro_filtrado = Libro.objects.only('id', 'titulo').filter(id=filtros['libro_id']).first()
+    if 'autor_id' in filtros:
+        autor_filtrado = Autor.objects.only('id', 'nombre').filter(id=filtros['autor_id']).first()
+
+    parametros = request.GET.copy()
+    parametros.pop('despues', None)
 
     return render(request, 'tienda/resenas.html', {
-        'resenas': lista_resenas,
-        'libros': libros,
-        'autores': autores,
-        'colecciones': colecciones
+        'resenas': pagina,
+        'pagina': pagina,
+        'url_mas_resenas': f"{reverse('resenas_mas')}?{parametros.urlencode()}",
+        'libro_filtrado': libro_filtrado,
+        'autor_filtrado': autor_filtrado,
+        'colecciones': obtener_menu_colecciones()
     })
 
+def resenas_mas(request):
+    pagina = _pagina_resenas(request, resenas_publicas(**_filtros_resenas(request)))
+    return _json_resenas(request, pagina, 'tienda/_resenas_feed.html')
+
+@cache_publica()
+def resenas_libro(request, libro_id):
+    etiquetar(request, f'resenas:libro:{libro_id}')
+    pagina = _pagina_resenas(request, resenas_publicas(libro_id=libro_id))
+    return _json_resenas(request, pagina, 'tienda/_resenas_libro.html')
+
 
 # ==========================================
 # 2. AUTENTICACIÓN Y PERFIL
@@ -151,7 +304,8 @@ def logout_view(request):
 
 @login_required(login_url='login')
 def mi_perfil(request):
-    perfil, created = Perfil.objects.get_or_create(usuario=request.user)
+    # Solo se crea el perfil cuando el usuario lo guarda
+    perfil = perfil_de(request.user, crear=request.method == 'POST')
     if request.method == 'POST':
         form = PerfilForm(request.POST, request.FILES, instance=perfil)
         if form.is_valid():
@@ -162,7 +316,7 @@ def mi_perfil(request):
         form = PerfilForm(instance=perfil)
     
     mis_pedidos = Pedido.objects.filter(usuario=request.user).order_by('-fecha_pedido')
-    return render(request, 'tienda/mi_perfil.html', {'form': form, 'pedidos': mis_pedidos})
+    return render(request, 'tienda/mi_perfil.html', {'form': form, 'perfil': perfil, 'pedidos': mis_pedidos})
 
 
 # ==========================================
@@ -174,17 +328,15 @@ def agregar_al_carrito(request, libro_id):
         messages.warning(request, "Debes iniciar sesión para comprar.")
         return redirect('login')
 
-    libro = get_object_or_404(Libro, id=libro_id)
-    if libro.stock <= 0:
-        messages.error(request, "Producto agotado.")
+    libro = get_object_or_404(Libro.objects.only('id', 'titulo'), id=libro_id)
+    carrito = carrito_de(request.user, crear=True)
+    try:
+        item = reservar(carrito, libro.id)
+    except StockInsuficiente:
+        messages.error(request, "Producto agotado (o apartado en otros carritos).")
         return redirect('catalogo')
 
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-    item, created = ItemCarrito.objects.get_or_create(carrito=carrito, libro=libro)
-    
-    if not created:
-        item.cantidad += 1
-        item.save()
+    if item.cantidad > 1:
         messages.success(request, f"Se agregó otra unidad de {libro.titulo}.")
     else:
         messages.success(request, f"¡{libro.titulo} agregado al carrito!")
@@ -193,33 +345,33 @@ def agregar_al_carrito(request, libro_id):
 
 @login_required(login_url='login')
 def ver_carrito(request):
-    try:
-        carrito = Carrito.objects.get(usuario=request.user)
-        items = carrito.items.all()
-    except Carrito.DoesNotExist:
-        items = []
-        carrito = None
-    return render(request, 'tienda/carrito.html', {'carrito': carrito, 'items': items})
+    carrito = carrito_de(request.user)
+    items = []
+    if carrito is not None:
+        # Mientras el cliente mira su carrito conserva lo que tiene apartado
+        renovar_reservas(carrito)
+        items = list(carrito.items.select_related('libro__autor', 'reserva'))
+    # El total sale de los items ya cargados (carrito.total volvería a consultarlos)
+    total = sum((item.subtotal for item in items), Decimal('0'))
+    relacionados = relacionados_de_carrito([item.libro_id for item in items]) if items else []
+    return render(request, 'tienda/carrito.html', {
+        'carrito': carrito, 'items': items, 'total': total, 'ahora': timezone.now(), 'relacionados': relacionados,
+    })
 
 @login_required(login_url='login')
 def restar_cantidad(request, item_id):
-    item = get_object_or_404(ItemCarrito, id=item_id)
-    if item.carrito.usuario == request.user:
-        if item.cantidad > 1:
-            item.cantidad -= 1
-            item.save()
-        else:
-            item.delete()
+    item = get_object_or_404(ItemCarrito.objects.select_related('carrito'), id=item_id)
+    if item.carrito.usuario_id == request.user.id:
+        reservar(item.carrito, item.libro_id, -1)
     return redirect('ver_carrito')
 
 @login_required(login_url='login')
 def sumar_cantidad(request, item_id):
-    item = get_object_or_404(ItemCarrito, id=item_id)
-    if item.carrito.usuario == request.user:
-        if item.cantidad < item.libro.stock:
-            item.cantidad += 1
-            item.save()
-        else:
+    item = get_object_or_404(ItemCarrito.objects.select_related('carrito'), id=item_id)
+    if item.carrito.usuario_id == request.user.id:
+        try:
+            reservar(item.carrito, item.libro_id)
+        except StockInsuficiente:
             messages.warning(request, "No hay más stock disponible.")
     return redirect('ver_carrito')
 
@@ -230,48 +382,108 @@ def eliminar_del_carrito(request, item_id):
         item.delete()
     return redirect('ver_carrito')
 
+# --- API JSON del carrito (los botones la usan con fetch; los enlaces de arriba
+# quedan para navegadores sin JavaScript) ---
+
+def _json_carrito(request, item, mensaje, status=200):
+    # Línea modificada (None si se quitó) + contador y total del carrito
+    unidades, total = resumen_carrito(request.user)
+    linea = None
+    if item is not None:
+        reserva = getattr(item, 'reserva', None)
+        linea = {
+            'id': item.id,
+            'libro_id': item.libro_id,
+            'cantidad': item.cantidad,
+            'subtotal': str(item.subtotal),
+            'apartado_hasta': timezone.localtime(reserva.expira).strftime('%H:%M') if reserva else None,
+        }
+    return JsonResponse(
+        {'mensaje': mensaje, 'item': linea, 'carrito': {'unidades': unidades, 'total': str(total)}},
+        status=status,
+    )
+
+
+def _api_carrito(vista):
+    # Solo POST y con sesión; sin sesión se responde 401 con la URL de login
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method != 'POST':
+            return JsonResponse({'error': "Método no permitido."}, status=405)
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'error': "Debes iniciar sesión para comprar.", 'login': reverse('login')}, status=401,
+            )
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+def _item_propio(request, item_id):
+    return get_object_or_404(ItemCarrito.objects.select_related('carrito'), id=item_id, carrito__usuario=request.user)
+
+
+@_api_carrito
+def api_agregar_al_carrito(request, libro_id):
+    libro = get_object_or_404(Libro.objects.only('id', 'titulo'), id=libro_id)
+    carrito = carrito_de(request.user, crear=True)
+    try:
+        item = reservar(carrito, libro.id)
+    except StockInsuficiente:
+        return JsonResponse({'error': "Producto agotado (o apartado en otros carritos)."}, status=409)
+    if item.cantidad > 1:
+        return _json_carrito(request, item, f"Se agregó otra unidad de {libro.titulo}.")
+    return _json_carrito(request, item, f"¡{libro.titulo} agregado al carrito!")
+
+
+@_api_carrito
+def api_sumar_cantidad(request, item_id):
+    item = _item_propio(request, item_id)
+    try:
+        item = reservar(item.carrito, item.libro_id)
+    except StockInsuficiente:
+        return JsonResponse({'error': "No hay más stock disponible."}, status=409)
+    return _json_carrito(request, item, "Cantidad actualizada.")
+
+
+@_api_carrito
+def api_restar_cantidad(request, item_id):
+    item = _item_propio(request, item_id)
+    item = reservar(item.carrito, item.libro_id, -1)
+    return _json_carrito(request, item, "Cantidad actualizada." if item else "Libro quitado del carrito.")
+
+
+@_api_carrito
+def api_eliminar_del_carrito(request, item_id):
+    _item_propio(request, item_id).delete()
+    return _json_carrito(request, None, "Libro quitado del carrito.")
+
+
 @login_required(login_url='login')
 def procesar_pedido(request):
-    carrito = get_object_or_404(Carrito, usuario=request.user)
-    items = carrito.items.all()
+    carrito = carrito_de(request.user)
+    items = items_de_carrito(carrito) if carrito is not None else []
     
     if not items:
         return redirect('catalogo')
 
-    subtotal = carrito.total
-    tasa_impuesto = Decimal('0.16')
-    monto_impuestos = subtotal * tasa_impuesto
-    total_a_pagar = subtotal + monto_impuestos
+    subtotal, monto_impuestos, total_a_pagar = calcular_totales(items)
 
     if request.method == 'POST':
-        for item in items:
-            if item.cantidad > item.libro.stock:
-                messages.error(request, f"No hay suficiente stock de {item.libro.titulo}.")
-                return redirect('ver_carrito')
-
-        nuevo_pedido = Pedido.objects.create(
-            usuario=request.user,
-            direccion_envio=request.POST.get('direccion'),
-            metodo_pago=request.POST.get('metodo_pago'),
-            subtotal=subtotal,
-            impuestos=monto_impuestos,
-            total_final=total_a_pagar,
-            estado='pagado'
-        )
-
-        for item in items:
-            ItemPedido.objects.create(
-                pedido=nuevo_pedido,
-                libro=item.libro,
-                cantidad=item.cantidad,
-                precio_unitario=item.libro.precio
+        try:
+            nuevo_pedido = confirmar_pedido(
+                request.user, carrito,
+                direccion_envio=request.POST.get('direccion'),
+                metodo_pago=request.POST.get('metodo_pago'),
             )
-            item.libro.stock -= item.cantidad
-            item.libro.save()
+        except StockInsuficiente as error:
+            messages.error(request, str(error))
+            return redirect('ver_carrito')
+        except CarritoVacio:
+            return redirect('catalogo')
 
-        items.delete() 
         return redirect('pedido_exitoso', pedido_id=nuevo_pedido.id)
 
+    renovar_reservas(carrito)
     return render(request, 'tienda/checkout.html', {
         'subtotal': subtotal, 
         'impuestos': monto_impuestos, 
@@ -297,32 +509,85 @@ def es_admin(user):
 
 @user_passes_test(es_admin, login_url='index')
 def dashboard_admin(request):
-    pedidos = Pedido.objects.all().order_by('-fecha_pedido')
-    usuarios = User.objects.filter(is_superuser=False)
-    libros = Libro.objects.all().order_by('titulo')
-    autores = Autor.objects.all().order_by('nombre')
-    colecciones = Coleccion.objects.all()
-    proveedores = Proveedor.objects.all().order_by('empresa')
-    
-    # Lógica de filtrado de reseñas en el Admin
-    resenas = Resena.objects.all().order_by('-fecha')
-    if request.GET.get('filtro_libro'):
-        resenas = resenas.filter(libro_id=request.GET.get('filtro_libro'))
-    if request.GET.get('filtro_autor'):
-        resenas = resenas.filter(libro__autor_id=request.GET.get('filtro_autor'))
-    if request.GET.get('filtro_coleccion'):
-        resenas = resenas.filter(libro__coleccion_id=request.GET.get('filtro_coleccion'))
-
-    return render(request, 'tienda/dashboard.html', {
-        'pedidos': pedidos, 
-        'usuarios': usuarios,
-        'libros': libros,
-        'autores': autores,
-        'colecciones': colecciones,
-        'resenas': resenas,
-        'proveedores': proveedores
+    # Solo el resumen; cada pestaña se carga bajo demanda desde panel_dashboard
+    return render(request, 'tienda/dashboard.html', totales_dashboard())
+
+@user_passes_test(es_admin, login_url='index')
+def panel_dashboard(request, seccion):
+    if seccion not in PANELES_DASHBOARD:
+        raise Http404("Sección no encontrada")
+
+    consulta, orden = PANELES_DASHBOARD[seccion]
+    pagina = paginar_por_cursor(
+        consulta(request.GET), orden,
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+        tamano=TAMANO_PAGINA_PANEL,
+    )
+
+    filtros = request.GET.copy()
+    filtros.pop('despues', None)
+    filtros.pop('antes', None)
+
+    contexto = {'pagina': pagina, 'filtros': filtros.urlencode(), 'seccion': seccion}
+    if seccion == 'resenas':
+        contexto['colecciones'] = Coleccion.objects.only('id', 'nombre').order_by('nombre')
+    return render(request, f'tienda/paneles/{seccion}.html', contexto)
+
+@user_passes_test(es_admin, login_url='index')
+def panel_ventas(request):
+    try:
+        dias = int(request.GET.get('dias', 30))
+    except ValueError:
+        dias = 30
+    if dias not in RANGOS_VENTAS:
+        dias = 30
+
+    estado = request.GET.get('estado', '')
+    estados = [estado] if estado in dict(Pedido.ESTADOS) else ESTADOS_COBRADOS
+
+    return render(request, 'tienda/paneles/ventas.html', {
+        'resumen': resumen_ventas(dias=dias, estados=estados),
+        'dias': dias,
+        'rangos': RANGOS_VENTAS,
+        'estado': estado,
+        'estados': Pedido.ESTADOS,
     })
 
+@user_passes_test(es_admin, login_url='index')
+def metricas_admin(request):
+    return render(request, 'tienda/metricas.html', {'filas': metricas.resumen()})
+
+def metricas_prometheus(request):
+    # Staff con sesión, o Prometheus con "Authorization: Bearer <METRICAS_TOKEN>"
+    # compare_digest: el tiempo de la comparación no delata cuántos caracteres acertó
+    token = settings.METRICAS_TOKEN
+    autorizado = es_admin(request.user) or bool(token) and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    )
+    if not autorizado:
+        return HttpResponse(status=403)
+    return HttpResponse(metricas.texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@user_passes_test(es_admin, login_url='index')
+def exportar_pedidos(request, formato):
+    # Se envía mientras se lee: ni el pedido completo ni el archivo pasan por memoria
+    if formato not in FORMATOS_EXPORTACION:
+        raise Http404("Formato no disponible")
+    try:
+        filtros = filtros_exportacion(
+            desde=request.GET.get('desde'),
+            hasta=request.GET.get('hasta'),
+            estado=request.GET.get('estado'),
+        )
+    except FiltroInvalido as error:
+        return HttpResponseBadRequest(str(error))
+
+    generar_lineas, tipo = FORMATOS_EXPORTACION[formato]
+    respuesta = StreamingHttpResponse(generar_lineas(filas_pedidos(filtros)), content_type=tipo)
+    respuesta['Content-Disposition'] = f'attachment; filename="pedidos.{formato}"'
+    return respuesta
+
 
 # ==========================================
 # 5. CRUD: PEDIDOS (ADMIN)
@@ -343,9 +608,11 @@ def crear_pedido_admin(request):
 @user_passes_test(es_admin, login_url='index')
 def cambiar_estado_pedido(request, pedido_id):
     if request.method == 'POST':
-        pedido = get_object_or_404(Pedido, id=pedido_id)
-        pedido.estado = request.POST.get('nuevo_estado')
-        pedido.save()
+        # El pedido y su movimiento en los resúmenes de ventas (señales) van juntos
+        with transaction.atomic():
+            pedido = get_object_or_404(Pedido, id=pedido_id)
+            pedido.estado = request.POST.get('nuevo_estado')
+            pedido.save()
         messages.success(request, "Estado actualizado.")
     return redirect('dashboard_admin')
 
@@ -355,7 +622,8 @@ def editar_pedido_completo(request, pedido_id):
     if request.method == 'POST':
         form = PedidoAdminForm(request.POST, instance=pedido)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             messages.success(request, f"Pedido #{pedido.id} actualizado.")
             return redirect('dashboard_admin')
     else:
@@ -372,7 +640,8 @@ def detalle_pedido_admin(request, pedido_id):
 def eliminar_pedido(request, pedido_id):
     obj = get_object_or_404(Pedido, id=pedido_id)
     if request.method == 'POST':
-        obj.delete()
+        with transaction.atomic():
+            obj.delete()
         messages.success(request, "Pedido eliminado.")
         return redirect('dashboard_admin')
     return render(request, 'tienda/confirmar_eliminar.html', {'obj': obj, 'tipo': 'Pedido', 'nombre': f"#{obj.id}"})
@@ -423,6 +692,7 @@ def ver_perfil_usuario(request, user_id):
     pedidos_usuario = Pedido.objects.filter(usuario=usuario_ver).order_by('-fecha_pedido')
     return render(request, 'tienda/perfil_usuario.html', {
         'usuario_ver': usuario_ver,
+        'perfil': perfil_de(usuario_ver),
         'pedidos_usuario': pedidos_usuario
     })
 
@@ -613,4 +883,83 @@ def eliminar_resena(request, resena_id):
         obj.delete()
         messages.success(request, "Reseña eliminada.")
         return redirect('dashboard_admin')
-    return render(request, 'tienda/confirmar_eliminar.html', {'obj': obj, 'tipo': 'Reseña', 'nombre': f"de {obj.usuario.username}"})
\ No newline at end of file
+    return render(request, 'tienda/confirmar_eliminar.html', {'obj': obj, 'tipo': 'Reseña', 'nombre': f"de {obj.usuario.username}"})
+
+# ==========================================
+# 12. API JSON DE SOLO LECTURA (v1)
+# ==========================================
+# Sin sesión ni escrituras. Cada respuesta lleva ETag y Last-Modified; el cliente
+# que los reenvía (If-None-Match / If-Modified-Since) recibe 304 si nada cambió.
+
+def _respuesta_condicional(request, etag, ultimo, construir):
+    segundos = int(ultimo.timestamp()) if ultimo else None
+    respuesta = get_conditional_response(request, etag=etag, last_modified=segundos)
+    if respuesta is None:
+        respuesta = construir()
+    respuesta['ETag'] = etag
+    if segundos is not None:
+        respuesta['Last-Modified'] = http_date(segundos)
+    # Se puede guardar, pero hay que revalidar siempre (es barato: 304)
+    respuesta['Cache-Control'] = 'public, no-cache'
+    return respuesta
+
+
+def _error_api(mensaje, status):
+    return JsonResponse({'error': mensaje}, status=status)
+
+
+@require_safe
+def api_listado(request, recurso):
+    if recurso not in RECURSOS_API:
+        return _error_api("Recurso desconocido.", 404)
+    definicion = RECURSOS_API[recurso]
+    try:
+        queryset, campos, orden = consulta_api(definicion, request.GET)
+        pagina = pagina_api(queryset, orden, request.GET)
+    except ParametroInvalido as error:
+        return _error_api(str(error), 400)
+
+    def construir():
+        siguiente = None
+        if pagina.cursor_siguiente:
+            parametros = request.GET.copy()
+            parametros['despues'] = pagina.cursor_siguiente
+            siguiente = request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+        return JsonResponse({
+            'version': VERSION_API,
+            'resultados': [serializar(definicion, objeto, campos) for objeto in pagina],
+            'siguiente': siguiente,
+        })
+
+    etag, ultimo = version_listado(recurso, queryset, request.GET)
+    return _respuesta_condicional(request, etag, ultimo, construir)
+
+
+@require_safe
+def api_detalle(request, recurso, pk):
+    if recurso not in RECURSOS_API:
+        return _error_api("Recurso desconocido.", 404)
+    definicion = RECURSOS_API[recurso]
+    try:
+        queryset, campos, orden = consulta_api(definicion, request.GET)
+    except ParametroInvalido as error:
+        return _error_api(str(error), 400)
+    objeto = queryset.filter(pk=pk).first()
+    if objeto is None:
+        return _error_api("No encontrado.", 404)
+
+    etag, ultimo = version_objeto(recurso, objeto, campos)
+    return _respuesta_condicional(
+        request, etag, ultimo,
+        lambda: JsonResponse({'version': VERSION_API, **serializar(definicion, objeto, campos)}),
+    )
+
+
+# ==========================================
+# 13. ARCHIVOS SUBIDOS (MEDIA)
+# ==========================================
+
+@require_safe
+def servir_medio(request, nombre):
+    # Portadas y fotos; con un servidor web delante, MEDIA_ENVIO le delega el envío
+    return respuesta_medio(request, nombre)
@@ -44,6 +44,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Los estáticos se responden antes que nada (solo con SERVIR_ESTATICOS)
+    'tienda.middleware.EstaticosMiddleware',
+    # Después, para que la latencia medida incluya a todos los demás
+    'tienda.middleware.MetricasMiddleware',
+    'tienda.middleware.ReplicasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,6 +71,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'tienda.context_processors.menu_colecciones',
+                'tienda.context_processors.unidades_carrito',
             ],
         },
     },
@@ -81,9 +87,61 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # SQLite ignora select_for_update(): con BEGIN IMMEDIATE cada transacción toma
+            # el bloqueo de escritura al empezar, así las que leen para decidir (reservas
+            # de stock, cambios de estado de pedidos) se ejecutan de a una.
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Réplicas de solo lectura, separadas por comas. En desarrollo sirve una copia del
+# archivo SQLite (`python manage.py sincronizar_replicas` la actualiza), p. ej.:
+#   DB_REPLICAS=db-replica.sqlite3
+# Cada réplica queda como alias replica_1, replica_2... (ver tienda.enrutador)
+for numero, nombre in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica_{numero}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / nombre.strip(),
+        # En los tests la réplica es la misma base que default
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['tienda.enrutador.EnrutadorReplicas']
+
+# Tras una escritura, las lecturas del mismo cliente van al primario durante estos
+# segundos (p. ej. el GET que sigue al redirect de un POST), por el retraso de la réplica
+REPLICA_FIJAR_SEGUNDOS = int(os.getenv('REPLICA_FIJAR_SEGUNDOS', '10'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Por defecto en memoria del proceso. Con varios workers las invalidaciones solo
+# llegan al que hizo el cambio y los demás sirven lo viejo hasta que vence la entrada
+# (SEGUNDOS_CACHE_PAGINA). En producción conviene una caché compartida, p. ej.:
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'tintayhojas'),
+    }
+}
+
+# Métricas por vista (tienda.middleware.MetricasMiddleware)
+# Las consultas más lentas que esto, en ms, se registran en el log 'tienda.metricas'
+METRICAS_CONSULTA_LENTA_MS = int(os.getenv('METRICAS_CONSULTA_LENTA_MS', '100'))
+# Misma consulta repetida tantas veces en una petición: se registra como posible N+1
+METRICAS_UMBRAL_REPETIDAS = int(os.getenv('METRICAS_UMBRAL_REPETIDAS', '5'))
+# Token para que Prometheus lea /panel-admin/metricas/prometheus/ sin sesión de staff
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
+
+# Minutos que un libro agregado al carrito queda apartado para ese cliente
+RESERVA_MINUTOS = int(os.getenv('RESERVA_MINUTOS', '15'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +179,25 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# `python manage.py construir_estaticos` copia aquí los estáticos con el hash del
+# contenido en el nombre (tienda.estaticos.AlmacenEstaticos) y sus versiones .gz/.br
+STATIC_ROOT = os.getenv('STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+# Archivos que produce el build (fuentes descargadas con --fuentes); tienen prioridad
+# sobre los de la app con el mismo nombre
+ESTATICOS_GENERADOS = BASE_DIR / 'estaticos_generados'
+STATICFILES_DIRS = [ESTATICOS_GENERADOS] if ESTATICOS_GENERADOS.is_dir() else []
+
+STORAGES = {
+    # Subidas con el hash del contenido como nombre (ver tienda.medios)
+    'default': {'BACKEND': 'tienda.medios.AlmacenPorContenido'},
+    'staticfiles': {'BACKEND': 'tienda.estaticos.AlmacenEstaticos'},
+}
+
+# Sin un servidor web delante que sirva STATIC_ROOT, Django lo sirve con
+# tienda.middleware.EstaticosMiddleware (por defecto siempre que DEBUG esté apagado)
+SERVIR_ESTATICOS = os.getenv('SERVIR_ESTATICOS', str(not DEBUG)) == 'True'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -132,4 +209,11 @@ STATIC_URL = 'static/'
 
 # Configuración para subir imágenes (Media)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Quién envía los bytes de /media/ (ver tienda.medios). Vacío: Django con FileResponse
+# (sendfile del servidor WSGI si lo tiene). Con un servidor web delante, p. ej.:
+#   MEDIA_ENVIO=x-accel-redirect   (nginx: location /media-interna/ { internal; alias .../media/; })
+#   MEDIA_ENVIO=x-sendfile         (Apache mod_xsendfile, lighttpd)
+MEDIA_ENVIO = os.getenv('MEDIA_ENVIO', '')
+MEDIA_ENVIO_PREFIJO = os.getenv('MEDIA_ENVIO_PREFIJO', '/media-interna/')
\ No newline at end of file
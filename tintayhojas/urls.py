@@ -1,13 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from tienda import views as vistas_tienda
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('tienda.urls')), # Esto conecta con tu app 'tienda'
+    # Las imágenes de los libros, autores y perfiles (con o sin DEBUG)
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:nombre>", vistas_tienda.servir_medio, name='servir_medio'),
 ]
-
-# Esto permite mostrar las imágenes de los libros
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file